@@ -0,0 +1,184 @@
+"""
+    Run several bot replicas as local processes sharing one state file, against the fake YouTrack,
+    while one replica is killed and another one paused for longer than the lease TTL,
+    and report new issues missed or notified more than once (delivery is at least once, a lease handed over
+    in the middle of a poll posts the issues of that poll twice).
+
+    python -m benchmarks.cluster
+    python -m benchmarks.cluster --replicas 4 --channels 100 --rounds 20
+"""
+import argparse
+import configparser
+import multiprocessing
+import os
+import queue
+import re
+import shutil
+import signal
+import tempfile
+import time
+from typing import Dict, List, Set, Tuple
+
+from benchmarks.fake_youtrack import FakeYoutrack, get_project_name
+from benchmarks.scenarios import BENCHMARK_CONFIG
+from util import config
+from util.config import Config
+from util.utils import get_today_timestamp
+from youtrack.youtrack_checker import YoutrackChecker
+
+ISSUE_ID_PATTERN = re.compile(r"/issue/([^|>]+)\|")
+DONE = "done"
+# tracking last check is one second ahead of the poll, keep issue creation and polls in different seconds
+SECOND_GAP_SECS = 1.2
+ROUND_TIMEOUT_SECS = 60
+
+
+def run_replica(config_file_name: str, commands: multiprocessing.Queue, results: multiprocessing.Queue):
+    """
+        A replica whose tracking polls are triggered by the commands queue instead of the scheduler clock,
+        each notified issue is reported to the results queue.
+    """
+    configuration = Config(config_file_name)
+    replica_id = configuration.configuration["cluster"]["replica_id"]
+
+    def send_message_to_channel(channel_name: str, message, coalesce: bool = False):
+        for issue_id in ISSUE_ID_PATTERN.findall(message):
+            results.put((replica_id, channel_name, issue_id))
+
+    checker = YoutrackChecker(configuration, send_message_to_channel)
+    checker.cluster.start(checker._get_cluster_channels)
+    # each round is one polling interval for the tracking cadence
+    rounds = [0]
+    checker.tracking_cadence.clock = lambda: rounds[0] * checker.tracking_interval
+    while commands.get() is not None:
+        rounds[0] += 1
+        for channel_name, module, module_schedule in list(checker._get_scheduled_jobs()):
+            if module == config.MODULE_TRACKING:
+                checker._execute_scheduled_job(channel_name, module, module_schedule)
+        results.put((replica_id, DONE, len(checker.cluster.get_owned_channels())))
+    checker.cluster.leave()
+
+
+def write_configs(directory: str, youtrack_url: str, replicas: int, lease_ttl: int) -> List[str]:
+    file_names: List[str] = []
+    for i in range(replicas):
+        settings = configparser.ConfigParser()
+        settings.read_dict(BENCHMARK_CONFIG)
+        settings["youtrack"]["base_url"] = youtrack_url
+        settings["youtrack"]["api_endpoint"] = f"{youtrack_url}/api"
+        settings["state"] = {"file_name": os.path.join(directory, "state.db"), "flush_interval": "1"}
+        settings["cluster"] = {"enabled": "yes", "replica_id": f"replica-{i}", "lease_ttl": str(lease_ttl),
+                               "heartbeat_interval": "1"}
+        file_name = os.path.join(directory, f"config-{i}.ini")
+        with open(file_name, "w") as config_file:
+            settings.write(config_file)
+        file_names.append(file_name)
+    return file_names
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local multi-replica check of channel sharding")
+    parser.add_argument("--replicas", type=int, default=3)
+    parser.add_argument("--channels", type=int, default=30)
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--issues-per-round", type=int, default=20)
+    parser.add_argument("--lease-ttl", type=int, default=4)
+    arguments = parser.parse_args()
+    if arguments.replicas < 3:
+        parser.error("at least 3 replicas are needed: one is killed and one is paused")
+
+    fake = FakeYoutrack()
+    fake.reset(0)
+    server = fake.serve()
+    directory = tempfile.mkdtemp(prefix="youtrack-slackbot-cluster-")
+    config_file_names = write_configs(directory, f"http://127.0.0.1:{server.server_port}", arguments.replicas, arguments.lease_ttl)
+
+    # channels are created once in the shared state, as a !set_query on any replica would
+    setup = Config(config_file_names[0])
+    for i in range(arguments.channels):
+        channel_name = f"cluster-{i}"
+        setup.set_module_value_for_channel(channel_name, config.CHANNEL_NAME_ENTRY, channel_name)
+        setup.set_module_value_for_channel(channel_name, config.QUERY_ENTRY, f"project: {get_project_name(i)}")
+        setup.set_module_value_for_channel(channel_name, config.POLLING_LASTCHECK, get_today_timestamp())
+        setup.set_module_value_for_channel(channel_name, config.MODULE_TRACKING, "polling")
+    setup.state.close()
+
+    context = multiprocessing.get_context("spawn")
+    results: multiprocessing.Queue = context.Queue()
+    commands: List[multiprocessing.Queue] = [context.Queue() for _ in range(arguments.replicas)]
+    processes = [context.Process(target=run_replica, args=(file_name, replica_commands, results), daemon=True)
+                 for file_name, replica_commands in zip(config_file_names, commands)]
+    for process in processes:
+        process.start()
+    time.sleep(arguments.lease_ttl)
+
+    killed, paused = arguments.replicas - 1, arguments.replicas - 2
+    live: Set[int] = set(range(arguments.replicas))
+    expected: Set[Tuple[str, str]] = set()
+    notified: Dict[Tuple[str, str], List[str]] = {}
+    for round_number in range(arguments.rounds):
+        if round_number == arguments.rounds // 3:
+            print(f"Killing replica-{killed}")
+            processes[killed].kill()
+            live.discard(killed)
+        if round_number == arguments.rounds // 2:
+            print(f"Pausing replica-{paused} for {2 * arguments.lease_ttl}s")
+            os.kill(processes[paused].pid, signal.SIGSTOP)
+            live.discard(paused)
+
+        first_number = fake.next_number
+        fake.add_issues(arguments.issues_per_round, projects=arguments.channels)
+        for number in range(first_number, fake.next_number):
+            project_index = (number - first_number) % arguments.channels
+            expected.add((f"cluster-{project_index}", f"{get_project_name(project_index)}-{number}"))
+        time.sleep(SECOND_GAP_SECS)
+
+        owned = _run_round(commands, results, live, notified)
+        print(f"Round {round_number}: channels owned per replica {owned}")
+        time.sleep(SECOND_GAP_SECS)
+
+        if round_number == arguments.rounds // 2:
+            time.sleep(2 * arguments.lease_ttl)
+            os.kill(processes[paused].pid, signal.SIGCONT)
+            live.add(paused)
+
+    # let leases settle on the remaining replicas, then catch up
+    time.sleep(arguments.lease_ttl + 1)
+    _run_round(commands, results, live, notified)
+    for i in live:
+        commands[i].put(None)
+    for i in live:
+        processes[i].join(timeout=ROUND_TIMEOUT_SECS)
+    server.shutdown()
+    shutil.rmtree(directory, ignore_errors=True)
+
+    duplicates = {key: replicas for key, replicas in notified.items() if len(replicas) > 1}
+    missed = expected - set(notified)
+    print(f"{len(expected)} new issues, {len(notified)} notified, {len(duplicates)} notified more than once, {len(missed)} missed")
+    for (channel_name, issue_id), replicas in sorted(duplicates.items()):
+        print(f"  duplicate {issue_id} in {channel_name} by {', '.join(replicas)}")
+    for channel_name, issue_id in sorted(missed):
+        print(f"  missed {issue_id} in {channel_name}")
+
+
+def _run_round(commands: List[multiprocessing.Queue], results: multiprocessing.Queue, live: Set[int],
+               notified: Dict[Tuple[str, str], List[str]]) -> Dict[str, int]:
+    for i in live:
+        commands[i].put(True)
+    owned: Dict[str, int] = {}
+    deadline = time.time() + ROUND_TIMEOUT_SECS
+    while len(owned) < len(live):
+        try:
+            replica_id, channel_name, value = results.get(timeout=max(0.1, deadline - time.time()))
+        except queue.Empty:
+            print("Round timed out")
+            break
+        if channel_name == DONE:
+            owned[replica_id] = value
+        else:
+            notified.setdefault((channel_name, value), []).append(replica_id)
+    return dict(sorted(owned.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import threading
+import time
+from typing import Dict, Optional
+import urllib.parse
+
+DEFAULT_RETRY_AFTER_SECS = 1
+
+
+class FakeSlack:
+    """
+        Slack Web API stand-in accepting chat.postMessage (and answering ok to any other method).
+        Posted messages are only counted. Every request is delayed by latency_ms,
+        and every rate_limit_every-th post is answered with a 429 and a Retry-After header when set.
+    """
+
+    def __init__(self, latency_ms: int = 0, rate_limit_every: int = 0) -> None:
+        self.latency: float = latency_ms / 1000
+        self.rate_limit_every: int = rate_limit_every
+        self.message_count: int = 0
+        self.block_count: int = 0
+        self.rate_limited_count: int = 0
+        self.bytes_received: int = 0
+        self.lock = threading.Lock()
+
+    def reset(self):
+        with self.lock:
+            self.message_count = 0
+            self.block_count = 0
+            self.rate_limited_count = 0
+            self.bytes_received = 0
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {"messages": self.message_count, "blocks": self.block_count,
+                    "rate_limited": self.rate_limited_count, "bytes": self.bytes_received}
+
+    def post_message(self, body: dict) -> bool:
+        """
+            Record a posted message, return False when it is rate limited instead.
+        """
+        with self.lock:
+            if self.rate_limit_every > 0 and (self.message_count + self.rate_limited_count + 1) % self.rate_limit_every == 0:
+                self.rate_limited_count += 1
+                return False
+            self.message_count += 1
+            blocks = body.get("blocks", [])
+            if isinstance(blocks, str):
+                blocks = json.loads(blocks)
+            self.block_count += len(blocks)
+            return True
+
+    def serve(self, port: int = 0) -> ThreadingHTTPServer:
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path == "/_bench/stats":
+                    self._reply(200, fake.get_stats())
+                else:
+                    self.send_error(404)
+
+            def do_POST(self):
+                content = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                path = urllib.parse.urlparse(self.path).path
+                if path == "/_bench/reset":
+                    fake.reset()
+                    self._reply(200, {})
+                    return
+
+                if self.headers.get("Content-Type", "").startswith("application/json"):
+                    body = json.loads(content or b"{}")
+                else:
+                    body = {key: values[0] for key, values in urllib.parse.parse_qs(content.decode()).items()}
+                if fake.latency > 0:
+                    time.sleep(fake.latency)
+                with fake.lock:
+                    fake.bytes_received += len(content)
+
+                match path:
+                    case "/api/chat.postMessage":
+                        if fake.post_message(body):
+                            self._reply(200, {"ok": True, "channel": body.get("channel"), "ts": f"{time.time():.6f}"})
+                        else:
+                            self._reply(429, {"ok": False, "error": "ratelimited"},
+                                        {"Retry-After": str(DEFAULT_RETRY_AFTER_SECS)})
+                    case "/api/conversations.info":
+                        channel = body.get("channel", "")
+                        self._reply(200, {"ok": True, "channel": {"id": channel, "name": channel}})
+                    case _:
+                        self._reply(200, {"ok": True})
+
+            def _reply(self, status: int, payload: dict, headers: Optional[Dict[str, str]] = None):
+                content = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(content)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(content)
+
+        server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="fake-slack", daemon=True).start()
+        return server
@@ -0,0 +1,245 @@
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import random
+import re
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+import urllib.parse
+
+from util.utils import STAT_YOUTRACK_DATE_FORMAT
+
+DEFAULT_PROJECTS = 20
+DEFAULT_HISTORY_DAYS = 90
+DEFAULT_SEED = 42
+
+TAGS = ["bug", "customer", "regression", "security", "performance", "ux", "backend", "frontend"]
+PRIORITIES = ["Show-stopper", "Critical", "Major", "Normal", "Minor"]
+STATES = ["Submitted", "Open", "In Progress", "To be discussed", "Reopened"]
+TYPES = ["Bug", "Feature", "Task", "Usability Problem", "Performance Problem"]
+WORDS = ["login", "page", "crash", "when", "user", "clicks", "on", "the", "export", "button", "report", "slow",
+         "**bold**", "*italic*", "invoice", "timeout", "after", "upgrade", "API", "returns", "500", "missing", "field",
+         "[link]", "mobile", "dashboard", "search", "filter", "notification", "email", "sync", "permission"]
+
+RANGE_PATTERN = re.compile(r"(created|updated|resolved date):\s*(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})\s*\.\.\s*"
+                           r"(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})")
+PROJECT_PATTERN = re.compile(r"project:\s*\{?([^\s{}]+)\}?")
+RANGE_FIELDS = {"created": "created", "updated": "updated", "resolved date": "resolved"}
+
+
+def get_project_name(index: int) -> str:
+    return f"P{index}"
+
+
+def _get_timestamp_ms(timestamp: str) -> int:
+    return int(datetime.strptime(timestamp, STAT_YOUTRACK_DATE_FORMAT).timestamp() * 1000)
+
+
+def _get_top_level_fields(fields: str) -> List[str]:
+    """
+        Top level attribute names of a YouTrack fields projection, eg: "id,tags(name)" -> ["id", "tags"].
+    """
+    names: List[str] = []
+    depth = 0
+    current = ""
+    for char in fields:
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "," and depth == 0:
+            names.append(current.strip())
+            current = ""
+        elif depth == 0:
+            current += char
+    names.append(current.strip())
+    return [name for name in names if name != ""]
+
+
+class FakeYoutrack:
+    """
+        In memory YouTrack serving synthetic issues with the fields, sizes and ordering of the real /api/issues,
+        and the subset of the query language used by the bot: #Unresolved, #Resolved, project:, and
+        created/updated/resolved date ranges. Other terms are ignored.
+        Every request is delayed by latency_ms and counted.
+    """
+
+    def __init__(self, latency_ms: int = 0) -> None:
+        self.latency: float = latency_ms / 1000
+        self.issues: List[dict] = []
+        self.next_number: int = 1
+        self.rng = random.Random(DEFAULT_SEED)
+        self.version: int = 0
+        self.filtered: Dict[str, Tuple[int, List[dict]]] = {}
+        self.request_count: int = 0
+        self.issues_served: int = 0
+        self.bytes_served: int = 0
+        self.lock = threading.Lock()
+
+    def reset(self, issue_count: int, projects: int = DEFAULT_PROJECTS, resolved_ratio: float = 0.5,
+              history_days: int = DEFAULT_HISTORY_DAYS, seed: int = DEFAULT_SEED):
+        """
+            Replace issues with issue_count ones spread over projects and created during the last history_days,
+            (the last hour excluded so that they are never seen as new by tracking).
+        """
+        with self.lock:
+            self.rng = random.Random(seed)
+            self.issues = []
+            self.next_number = 1
+            now = datetime.now() - timedelta(hours=1)
+            first = now - timedelta(days=history_days)
+            step = (now - first).total_seconds() * 1000 / max(1, issue_count)
+            for i in range(issue_count):
+                created = int(first.timestamp() * 1000 + i * step)
+                self.issues.append(self._create_issue(get_project_name(i % projects), created, resolved_ratio))
+            self._reset_counters()
+
+    def add_issues(self, count: int, projects: int = DEFAULT_PROJECTS):
+        """
+            Add unresolved issues created now, as seen by tracking on its next poll.
+        """
+        with self.lock:
+            created = int(time.time() * 1000)
+            for i in range(count):
+                self.issues.append(self._create_issue(get_project_name(i % projects), created, 0))
+
+    def get_stats(self) -> dict:
+        with self.lock:
+            return {"requests": self.request_count, "issues": self.issues_served, "bytes": self.bytes_served}
+
+    def _reset_counters(self):
+        self.version += 1
+        self.filtered = {}
+        self.request_count = 0
+        self.issues_served = 0
+        self.bytes_served = 0
+
+    def _create_issue(self, project: str, created: int, resolved_ratio: float) -> dict:
+        number = self.next_number
+        self.next_number += 1
+        self.version += 1
+        resolved: Optional[int] = None
+        if self.rng.random() < resolved_ratio:
+            resolved = created + self.rng.randint(3600, 10 * 86400) * 1000
+            if resolved > time.time() * 1000:
+                resolved = None
+        user = self.rng.randrange(500)
+        return {
+            "$type": "Issue",
+            "id": f"2-{number}",
+            "idReadable": f"{project}-{number}",
+            "project": {"$type": "Project", "shortName": project, "name": f"Project {project}"},
+            "created": created,
+            "updated": resolved or created + self.rng.randint(0, 86400) * 1000,
+            "resolved": resolved,
+            "reporter": {"$type": "User", "email": f"user{user}@example.com"},
+            "updater": {"$type": "User", "email": f"user{(user + 1) % 500}@example.com"},
+            "commentsCount": self.rng.randrange(20),
+            "tags": [{"$type": "Tag", "name": tag} for tag in self.rng.sample(TAGS, self.rng.randrange(4))],
+            "customFields": [
+                self._create_custom_field("Priority", self.rng.choice(PRIORITIES)),
+                self._create_custom_field("State", "Fixed" if resolved else self.rng.choice(STATES)),
+                self._create_custom_field("Type", self.rng.choice(TYPES)),
+            ],
+            "summary": " ".join(self.rng.choices(WORDS, k=self.rng.randint(4, 14))),
+            "description": " ".join(self.rng.choices(WORDS, k=self.rng.randint(30, 300))),
+        }
+
+    def _create_custom_field(self, name: str, value: str) -> dict:
+        return {
+            "$type": "SingleEnumIssueCustomField",
+            "id": f"field-{name}",
+            "name": name,
+            "projectCustomField": {"$type": "EnumProjectCustomField", "id": f"project-field-{name}",
+                                   "field": {"$type": "CustomField", "id": f"custom-field-{name}", "name": name}},
+            "value": {"$type": "EnumBundleElement", "name": value, "presentation": value},
+        }
+
+    def filter(self, query: str) -> List[dict]:
+        with self.lock:
+            cached = self.filtered.get(query)
+            if cached is not None and cached[0] == self.version:
+                return cached[1]
+            issues = self.issues
+
+        lower_query = query.lower()
+        if "#unresolved" in lower_query:
+            issues = [issue for issue in issues if issue["resolved"] is None]
+        elif "#resolved" in lower_query:
+            issues = [issue for issue in issues if issue["resolved"] is not None]
+        for project in PROJECT_PATTERN.findall(query):
+            issues = [issue for issue in issues if issue["project"]["shortName"] == project]
+        for field, since, until in RANGE_PATTERN.findall(query):
+            since_ms = _get_timestamp_ms(since)
+            until_ms = _get_timestamp_ms(until) + 1000  # second precision, inclusive
+            attribute = RANGE_FIELDS[field]
+            issues = [issue for issue in issues
+                      if issue[attribute] is not None and since_ms <= issue[attribute] < until_ms]
+
+        with self.lock:
+            self.filtered[query] = (self.version, issues)
+        return issues
+
+    def get_page(self, query: str, fields: str, skip: int, top: int) -> List[dict]:
+        names = _get_top_level_fields(fields)
+        return [{name: issue[name] for name in names if name in issue} for issue in self.filter(query)[skip:skip + top]]
+
+    def serve(self, port: int = 0) -> ThreadingHTTPServer:
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                url = urllib.parse.urlparse(self.path)
+                params = urllib.parse.parse_qs(url.query)
+                match url.path:
+                    case "/api/issues":
+                        fake._on_request()
+                        issues = fake.get_page(params.get("query", [""])[0], params.get("fields", ["id"])[0],
+                                               int(params.get("$skip", ["0"])[0]), int(params.get("$top", ["42"])[0]))
+                        self._reply(issues, len(issues))
+                    case "/_bench/stats":
+                        self._reply(fake.get_stats())
+                    case _:
+                        self.send_error(404)
+
+            def do_POST(self):
+                url = urllib.parse.urlparse(self.path)
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                match url.path:
+                    case "/api/issuesGetter/count":
+                        fake._on_request()
+                        self._reply({"$type": "IssueCountResponse", "count": len(fake.filter(body.get("query", "")))})
+                    case "/_bench/reset":
+                        fake.reset(**body)
+                        self._reply({})
+                    case "/_bench/issues":
+                        fake.add_issues(**body)
+                        self._reply({})
+                    case _:
+                        self.send_error(404)
+
+            def _reply(self, payload, issue_count: int = 0):
+                content = json.dumps(payload).encode()
+                with fake.lock:
+                    fake.issues_served += issue_count
+                    fake.bytes_served += len(content)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(content)))
+                self.end_headers()
+                self.wfile.write(content)
+
+        server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, name="fake-youtrack", daemon=True).start()
+        return server
+
+    def _on_request(self):
+        with self.lock:
+            self.request_count += 1
+        if self.latency > 0:
+            time.sleep(self.latency)
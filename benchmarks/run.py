@@ -0,0 +1,106 @@
+"""
+    Offline benchmarks of the checker and rendering paths against local YouTrack and Slack stand-ins.
+
+    python -m benchmarks.run                                   # every scenario with default sizes
+    python -m benchmarks.run channels digest --ticks 3
+    python -m benchmarks.run --set youtrack.issue_mirror=yes --json after.json --baseline before.json
+"""
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import json
+import multiprocessing
+from typing import Dict, List, Optional
+
+from benchmarks.fake_slack import FakeSlack
+from benchmarks.fake_youtrack import FakeYoutrack
+from benchmarks.scenarios import DEFAULT_OPTIONS, SCENARIOS, run_scenario
+
+COLUMNS = ["ticks", "tick_p50_ms", "tick_p95_ms", "tick_max_ms", "requests_per_tick", "youtrack_mb",
+           "slack_messages", "slack_rate_limited", "messages_per_sec", "peak_rss_mb"]
+# metrics where a lower value is better, used to flag regressions against a baseline
+LOWER_IS_BETTER = ["tick_p50_ms", "tick_p95_ms", "tick_max_ms", "requests_per_tick", "youtrack_mb", "peak_rss_mb"]
+REGRESSION_THRESHOLD = 0.1
+
+
+def get_arguments() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Offline youtrack-slackbot benchmarks")
+    parser.add_argument("scenarios", nargs="*", default=list(SCENARIOS), metavar="scenario",
+                        help=f"scenarios to run among {', '.join(SCENARIOS)} (default: all)")
+    for option, value in DEFAULT_OPTIONS.items():
+        parser.add_argument(f"--{option.replace('_', '-')}", type=int, default=value, help=f"default: {value}")
+    parser.add_argument("--youtrack-latency", type=int, default=20, help="fake YouTrack latency per request in ms")
+    parser.add_argument("--slack-latency", type=int, default=10, help="fake Slack latency per request in ms")
+    parser.add_argument("--slack-rate-limit-every", type=int, default=0,
+                        help="answer every n-th chat.postMessage with a 429 (default: never)")
+    parser.add_argument("--set", action="append", default=[], metavar="SECTION.KEY=VALUE",
+                        help="configuration override, eg: youtrack.issue_mirror=yes")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--baseline", help="results file of a previous run to compare with")
+    arguments = parser.parse_args()
+    for scenario in arguments.scenarios:
+        if scenario not in SCENARIOS:
+            parser.error(f"unknown scenario {scenario}, expected one of {', '.join(SCENARIOS)}")
+    return arguments
+
+
+def print_results(results: List[dict], baseline: Optional[Dict[str, dict]]):
+    widths = [max(len("scenario"), *(len(result["scenario"]) for result in results))] + \
+             [max(len(column), 8) for column in COLUMNS]
+    print("  ".join(header.rjust(width) for header, width in zip(["scenario"] + COLUMNS, widths)))
+    for result in results:
+        print("  ".join(str(value).rjust(width) for value, width in
+                        zip([result["scenario"]] + [result[column] for column in COLUMNS], widths)))
+        previous = baseline.get(result["scenario"]) if baseline is not None else None
+        if previous is not None:
+            print("  ".join(_get_change(previous.get(column), result[column], column).rjust(width) for column, width in
+                            zip(["scenario"] + COLUMNS, widths)))
+
+
+def _get_change(previous, current, column: str) -> str:
+    if column == "scenario":
+        return "vs baseline"
+    if not previous or current is None:
+        return "-"
+    change = (current - previous) / previous
+    regression = change > REGRESSION_THRESHOLD if column in LOWER_IS_BETTER else \
+        column == "messages_per_sec" and change < -REGRESSION_THRESHOLD
+    return f"{'!' if regression else ''}{change:+.0%}"
+
+
+def main():
+    arguments = get_arguments()
+    options = {option: getattr(arguments, option) for option in DEFAULT_OPTIONS}
+    overrides: Dict[str, str] = {}
+    for override in arguments.set:
+        entry, _, value = override.partition("=")
+        overrides[entry.strip()] = value.strip()
+
+    youtrack_server = FakeYoutrack(latency_ms=arguments.youtrack_latency).serve()
+    slack_server = FakeSlack(latency_ms=arguments.slack_latency,
+                             rate_limit_every=arguments.slack_rate_limit_every).serve()
+    youtrack_url = f"http://127.0.0.1:{youtrack_server.server_port}"
+    slack_url = f"http://127.0.0.1:{slack_server.server_port}"
+
+    results: List[dict] = []
+    for scenario in arguments.scenarios:
+        print(f"Running {scenario}...")
+        # one fresh process per scenario, so that peak RSS is not inherited from the previous one
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as executor:
+            results.append(executor.submit(run_scenario, scenario, options, youtrack_url, slack_url, overrides).result())
+
+    baseline: Optional[Dict[str, dict]] = None
+    if arguments.baseline is not None:
+        with open(arguments.baseline) as baseline_file:
+            baseline = {result["scenario"]: result for result in json.load(baseline_file)["results"]}
+    print_results(results, baseline)
+
+    if arguments.json is not None:
+        with open(arguments.json, "w") as json_file:
+            json.dump({"options": options, "overrides": overrides, "results": results}, json_file, indent=2)
+
+    youtrack_server.shutdown()
+    slack_server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,310 @@
+from concurrent.futures import ThreadPoolExecutor
+import configparser
+from datetime import datetime
+import os
+import resource
+import shutil
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional
+
+import requests
+from slack_sdk import WebClient
+
+from benchmarks.fake_youtrack import DEFAULT_PROJECTS, get_project_name
+from util import config
+from util.config import Config
+from util.slack_outbox import SlackOutbox
+from util.utils import get_today_timestamp
+from youtrack.youtrack_checker import YoutrackChecker
+
+# same limits as youtrack-slackbot.py
+SLACK_MAX_MESSAGE_SIZE = 10000
+SLACK_MAX_BLOCK_SIZE = 3000
+
+WAIT_POLL_INTERVAL_SECS = 0.005
+OUTBOX_DRAIN_TIMEOUT_SECS = 600
+DAILY_FIRE_TIME = "09:00"
+STORM_PERIOD = "{This month}"
+
+DEFAULT_OPTIONS = {
+    "issues": 20000,
+    "channels": 200,
+    "ticks": 5,
+    "digest_issues": 50000,
+    "storm": 50,
+    "burst": 500,
+}
+
+# the generated configuration, --set overrides are applied on top of it.
+# Slack rates are raised so that the bot throughput is measured rather than Slack's policy
+BENCHMARK_CONFIG = {
+    "youtrack": {
+        "authorization_header": "Bearer perm:benchmark",
+        "max_issues": "100000",
+        "all_issue_fields": "id,idReadable,created,updated,resolved,reporter(email),updater(email),commentsCount,tags(name),"
+                            "customFields($type,id,projectCustomField($type,id,field($type,id,name)),"
+                            "value($type,name,minutes,presentation)),summary,description",
+        "issue_id_field": "id",
+    },
+    "slack": {
+        "channel_rate": "100",
+        "channel_burst": "100",
+        "global_rate": "1000",
+    },
+}
+
+
+class BenchmarkResult:
+    def __init__(self, scenario: str) -> None:
+        self.scenario: str = scenario
+        self.tick_latencies: List[float] = []
+        self.youtrack_requests: int = 0
+        self.youtrack_bytes: int = 0
+        self.slack_messages: int = 0
+        self.slack_rate_limited: int = 0
+        self.send_duration: float = 0
+        self.peak_rss_kb: int = 0
+
+    def to_dict(self) -> dict:
+        latencies = sorted(self.tick_latencies)
+        ticks = max(1, len(latencies))
+
+        def get_percentile(percentile: float) -> Optional[float]:
+            if len(latencies) == 0:
+                return None
+            return round(latencies[min(len(latencies) - 1, int(len(latencies) * percentile))] * 1000, 1)
+
+        return {
+            "scenario": self.scenario,
+            "ticks": len(latencies),
+            "tick_p50_ms": get_percentile(0.5),
+            "tick_p95_ms": get_percentile(0.95),
+            "tick_max_ms": get_percentile(1),
+            "requests_per_tick": round(self.youtrack_requests / ticks, 1),
+            "youtrack_mb": round(self.youtrack_bytes / 1024 / 1024, 1),
+            "slack_messages": self.slack_messages,
+            "slack_rate_limited": self.slack_rate_limited,
+            "messages_per_sec": round(self.slack_messages / self.send_duration, 1) if self.send_duration > 0 else None,
+            "peak_rss_mb": round(self.peak_rss_kb / 1024, 1),
+        }
+
+
+class BenchmarkEnvironment:
+    """
+        A YoutrackChecker and a SlackOutbox wired to the fake services, with their configuration and state
+        in a temporary directory. The scheduler is not started, ticks are driven by the scenario with a simulated clock.
+    """
+
+    def __init__(self, youtrack_url: str, slack_url: str, overrides: Dict[str, str]) -> None:
+        self.youtrack_url: str = youtrack_url
+        self.slack_url: str = slack_url
+        self.directory: str = tempfile.mkdtemp(prefix="youtrack-slackbot-benchmark-")
+
+        settings = configparser.ConfigParser()
+        settings.read_dict(BENCHMARK_CONFIG)
+        settings["youtrack"]["base_url"] = youtrack_url
+        settings["youtrack"]["api_endpoint"] = f"{youtrack_url}/api"
+        settings["state"] = {"file_name": os.path.join(self.directory, "state.db")}
+        settings["rollups"] = {"file_name": os.path.join(self.directory, "rollups.db")}
+        for entry, value in overrides.items():
+            section, _, key = entry.partition(".")
+            if section not in settings:
+                settings[section] = {}
+            settings[section][key] = value
+        config_file_name = os.path.join(self.directory, "config.ini")
+        with open(config_file_name, "w") as config_file:
+            settings.write(config_file)
+
+        self.config: Config = Config(config_file_name)
+        slack_config = self.config.configuration["slack"]
+        self.outbox: SlackOutbox = SlackOutbox(WebClient(token="xoxb-benchmark", base_url=f"{slack_url}/api/"),
+                                               SLACK_MAX_MESSAGE_SIZE, SLACK_MAX_BLOCK_SIZE,
+                                               channel_rate=slack_config.getfloat("channel_rate"),
+                                               channel_burst=slack_config.getint("channel_burst"),
+                                               global_rate=slack_config.getfloat("global_rate"))
+        self.checker: YoutrackChecker = YoutrackChecker(self.config, self.outbox.post)
+        # tracking cadence follows the simulated time of the ticks
+        self.simulated_time: float = 0
+        self.checker.tracking_cadence.clock = lambda: self.simulated_time
+        self.outbox.start()
+
+    def reset_youtrack(self, issue_count: int, projects: int = DEFAULT_PROJECTS, resolved_ratio: float = 0.5):
+        requests.post(f"{self.youtrack_url}/_bench/reset",
+                      json={"issue_count": issue_count, "projects": projects, "resolved_ratio": resolved_ratio}).raise_for_status()
+        requests.post(f"{self.slack_url}/_bench/reset").raise_for_status()
+
+    def add_youtrack_issues(self, count: int, projects: int = DEFAULT_PROJECTS):
+        requests.post(f"{self.youtrack_url}/_bench/issues", json={"count": count, "projects": projects}).raise_for_status()
+
+    def get_youtrack_stats(self) -> dict:
+        return requests.get(f"{self.youtrack_url}/_bench/stats").json()
+
+    def get_slack_stats(self) -> dict:
+        return requests.get(f"{self.slack_url}/_bench/stats").json()
+
+    def add_channels(self, count: int, modules: Dict[str, str], projects: int = DEFAULT_PROJECTS) -> List[str]:
+        channel_names: List[str] = []
+        for i in range(count):
+            channel_name = f"bench-{i}"
+            self.config.set_module_value_for_channel(channel_name, config.CHANNEL_NAME_ENTRY, channel_name)
+            self.config.set_module_value_for_channel(channel_name, config.QUERY_ENTRY, f"project: {get_project_name(i % projects)}")
+            self.config.set_module_value_for_channel(channel_name, config.POLLING_LASTCHECK, get_today_timestamp())
+            for module, frequency_config in modules.items():
+                self.config.set_module_value_for_channel(channel_name, module, frequency_config)
+            channel_names.append(channel_name)
+        return channel_names
+
+    def run_tick(self, now: datetime) -> float:
+        """
+            Run the scheduler once at the simulated time and wait for the dispatched jobs, return the elapsed time.
+        """
+        start = time.perf_counter()
+        self.simulated_time = now.timestamp()
+        self.checker.scheduler.tick(now)
+        while True:
+            with self.checker.scheduler.lock:
+                if len(self.checker.scheduler.running) == 0:
+                    break
+            time.sleep(WAIT_POLL_INTERVAL_SECS)
+        return time.perf_counter() - start
+
+    def wait_for_outbox(self):
+        deadline = time.monotonic() + OUTBOX_DRAIN_TIMEOUT_SECS
+        while time.monotonic() < deadline:
+            with self.outbox.condition:
+                if len(self.outbox.in_flight) == 0 and all(len(queue) == 0 for queue in self.outbox.queues.values()):
+                    return
+            time.sleep(WAIT_POLL_INTERVAL_SECS)
+        print(f"Outbox not drained after {OUTBOX_DRAIN_TIMEOUT_SECS}s, {self.outbox.get_pending_count()} messages pending")
+
+    def close(self):
+        self.checker.scheduler.stop()
+        self.checker.youtrack.close()
+        self.config.state.close()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def get_peak_rss_kb() -> int:
+    # ru_maxrss survives exec, so a spawned process would report the RSS of its parent (and its fake services)
+    # when bigger; VmHWM is reset by exec
+    try:
+        with open("/proc/self/status") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _get_simulated_start() -> datetime:
+    # two polling intervals before the daily modules fire
+    return datetime.now().replace(hour=8, minute=58, second=0, microsecond=0)
+
+
+def _sleep_to_next_second() -> float:
+    # tracking windows have a one second precision, issues added within the second of the last poll would be skipped
+    duration = 1 - time.time() % 1 + 0.01
+    time.sleep(duration)
+    return duration
+
+
+def run_channels(environment: BenchmarkEnvironment, options: dict, result: BenchmarkResult):
+    """
+        Channels with every module enabled: tracking polls every tick, digest and stats fire on the third tick.
+    """
+    environment.reset_youtrack(options["issues"])
+    environment.add_channels(options["channels"], {config.MODULE_TRACKING: "polling",
+                                                   config.MODULE_DIGEST: f"daily {DAILY_FIRE_TIME}",
+                                                   config.MODULE_STATS: f"daily {DAILY_FIRE_TIME}"})
+    start = _get_simulated_start()
+    send_start = time.perf_counter()
+    tracking_interval = environment.checker.scheduler.get_polling_interval(config.MODULE_TRACKING)
+    for tick in range(options["ticks"]):
+        result.tick_latencies.append(environment.run_tick(start + tick * tracking_interval))
+    environment.wait_for_outbox()
+    result.send_duration = time.perf_counter() - send_start
+
+
+def run_digest(environment: BenchmarkEnvironment, options: dict, result: BenchmarkResult):
+    """
+        Digest of a single channel with digest_issues unresolved issues, rendered and posted once per tick.
+    """
+    environment.reset_youtrack(options["digest_issues"], projects=1, resolved_ratio=0)
+    channel_name = environment.add_channels(1, {}, projects=1)[0]
+    send_start = time.perf_counter()
+    for _ in range(options["ticks"]):
+        start = time.perf_counter()
+        environment.checker._digest(channel_name)
+        result.tick_latencies.append(time.perf_counter() - start)
+    environment.wait_for_outbox()
+    result.send_duration = time.perf_counter() - send_start
+
+
+def run_stats_storm(environment: BenchmarkEnvironment, options: dict, result: BenchmarkResult):
+    """
+        storm concurrent !stats commands, each from a different channel, once per tick.
+    """
+    environment.reset_youtrack(options["issues"])
+    channel_names = environment.add_channels(options["storm"], {})
+    executor = ThreadPoolExecutor(max_workers=options["storm"], thread_name_prefix="benchmark-storm")
+
+    def on_stats_command(channel_name: str):
+        environment.outbox.post(channel_name, environment.checker.get_stats(channel_name, STORM_PERIOD))
+
+    send_start = time.perf_counter()
+    for _ in range(options["ticks"]):
+        start = time.perf_counter()
+        list(executor.map(on_stats_command, channel_names))
+        result.tick_latencies.append(time.perf_counter() - start)
+    environment.wait_for_outbox()
+    result.send_duration = time.perf_counter() - send_start
+    executor.shutdown()
+
+
+def run_tracking_burst(environment: BenchmarkEnvironment, options: dict, result: BenchmarkResult):
+    """
+        Tracking channels receiving burst new issues (spread over all projects) before every tick.
+    """
+    environment.reset_youtrack(options["issues"])
+    environment.add_channels(options["channels"], {config.MODULE_TRACKING: "polling"})
+    start = _get_simulated_start()
+    send_start = time.perf_counter()
+    slept: float = 0
+    tracking_interval = environment.checker.scheduler.get_polling_interval(config.MODULE_TRACKING)
+    for tick in range(options["ticks"]):
+        slept += _sleep_to_next_second()
+        environment.add_youtrack_issues(options["burst"])
+        result.tick_latencies.append(environment.run_tick(start + tick * tracking_interval))
+    environment.wait_for_outbox()
+    result.send_duration = time.perf_counter() - send_start - slept
+
+
+SCENARIOS: Dict[str, Callable[[BenchmarkEnvironment, dict, BenchmarkResult], None]] = {
+    "channels": run_channels,
+    "digest": run_digest,
+    "stats_storm": run_stats_storm,
+    "tracking_burst": run_tracking_burst,
+}
+
+
+def run_scenario(scenario: str, options: dict, youtrack_url: str, slack_url: str, overrides: Dict[str, str]) -> dict:
+    """
+        Run a scenario, meant to be called in a fresh process so that peak RSS is the scenario one.
+    """
+    result = BenchmarkResult(scenario)
+    environment = BenchmarkEnvironment(youtrack_url, slack_url, overrides)
+    try:
+        SCENARIOS[scenario](environment, options, result)
+        youtrack_stats = environment.get_youtrack_stats()
+        slack_stats = environment.get_slack_stats()
+        result.youtrack_requests = youtrack_stats["requests"]
+        result.youtrack_bytes = youtrack_stats["bytes"]
+        result.slack_messages = slack_stats["messages"]
+        result.slack_rate_limited = slack_stats["rate_limited"]
+        result.peak_rss_kb = get_peak_rss_kb()
+    finally:
+        environment.close()
+
+    return result.to_dict()
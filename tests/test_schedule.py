@@ -0,0 +1,34 @@
+from datetime import datetime, timedelta
+import unittest
+
+from util.schedule import parse_schedule
+
+GRACE_PERIOD = timedelta(seconds=300)
+
+
+class FirstFireTest(unittest.TestCase):
+    def test_start_within_grace_period_keeps_today_fire(self):
+        schedule = parse_schedule("daily 9:00")
+        now = datetime(2026, 10, 19, 9, 0, 30)
+        self.assertEqual(schedule.first_fire(now, GRACE_PERIOD), datetime(2026, 10, 19, 9, 0))
+
+    def test_start_after_grace_period_skips_to_next_day(self):
+        schedule = parse_schedule("daily 9:00")
+        now = datetime(2026, 10, 19, 9, 10)
+        self.assertEqual(schedule.first_fire(now, GRACE_PERIOD), datetime(2026, 10, 20, 9, 0))
+
+    def test_weekly_start_within_grace_period_keeps_this_week_fire(self):
+        schedule = parse_schedule("weekly monday 9:00")
+        now = datetime(2026, 10, 19, 9, 4)  # a monday
+        self.assertEqual(schedule.first_fire(now, GRACE_PERIOD), datetime(2026, 10, 19, 9, 0))
+
+    def test_first_fire_matches_next_fire(self):
+        schedule = parse_schedule("daily 9:00")
+        now = datetime(2026, 10, 19, 9, 0, 30)
+        previous_fire = datetime(2026, 10, 18, 9, 0)
+        self.assertEqual(schedule.first_fire(now, GRACE_PERIOD),
+                         schedule.next_fire(previous_fire, now, GRACE_PERIOD, timedelta(seconds=60)))
+
+
+if __name__ == "__main__":
+    unittest.main()
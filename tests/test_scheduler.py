@@ -0,0 +1,71 @@
+from collections import Counter
+import configparser
+from datetime import datetime, timedelta
+import os
+import shutil
+import tempfile
+import unittest
+
+from util import config
+from util.config import Config
+from youtrack.youtrack_checker import YoutrackChecker
+
+SETTINGS = {
+    "youtrack": {
+        "base_url": "http://youtrack.invalid",
+        "api_endpoint": "http://youtrack.invalid/api",
+        "authorization_header": "Bearer perm:test",
+        "max_issues": "100",
+        "issue_id_field": "id",
+    },
+}
+SIMULATED_SECONDS = 600
+
+
+class PollingIntervalTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp(prefix="youtrack-slackbot-test-")
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def _count_fires(self, tracking_settings: dict) -> Counter:
+        """
+            Tick the scheduler every second over the simulated duration and count the fires of each module.
+        """
+        settings = configparser.ConfigParser()
+        settings.read_dict(SETTINGS)
+        settings["state"] = {"file_name": os.path.join(self.directory, f"state-{len(os.listdir(self.directory))}.db")}
+        settings["tracking"] = tracking_settings
+        config_file_name = os.path.join(self.directory, "config.ini")
+        with open(config_file_name, "w") as config_file:
+            settings.write(config_file)
+
+        configuration = Config(config_file_name)
+        configuration.set_module_value_for_channel("test", config.CHANNEL_NAME_ENTRY, "test")
+        configuration.set_module_value_for_channel("test", config.QUERY_ENTRY, "project: TEST")
+        for module in config.MODULES:
+            configuration.set_module_value_for_channel("test", module, "polling")
+        checker = YoutrackChecker(configuration, lambda *args, **kwargs: None)
+        scheduler = checker.scheduler
+        fires: Counter = Counter()
+
+        def submit(job, fire_at):
+            fires[job.module] += 1
+            scheduler._on_job_done(job.key)
+
+        scheduler._submit = submit
+        start = datetime(2026, 10, 19, 9, 0)
+        for second in range(SIMULATED_SECONDS):
+            scheduler.tick(start + timedelta(seconds=second))
+        checker.youtrack.close()
+        configuration.state.close()
+        return fires
+
+    def test_adaptive_tracking_keeps_digest_and_stats_interval(self):
+        regular = self._count_fires({"adaptive": "no"})
+        adaptive = self._count_fires({"adaptive": "yes", "min_interval": "15"})
+        self.assertEqual(regular[config.MODULE_DIGEST], SIMULATED_SECONDS // 60)
+        self.assertEqual(adaptive[config.MODULE_DIGEST], regular[config.MODULE_DIGEST])
+        self.assertEqual(adaptive[config.MODULE_STATS], regular[config.MODULE_STATS])
+        self.assertEqual(adaptive[config.MODULE_TRACKING], SIMULATED_SECONDS // 15)
@@ -0,0 +1,15 @@
+import unittest
+
+from youtrack.youtrack import SORT_BY_CREATED, get_sorted_query
+
+
+class SortedQueryTest(unittest.TestCase):
+    def test_query_is_sorted_by_creation_date(self):
+        self.assertEqual(get_sorted_query("project: TEST"), f"project: TEST {SORT_BY_CREATED}")
+
+    def test_empty_query_is_sorted_by_creation_date(self):
+        self.assertEqual(get_sorted_query(""), SORT_BY_CREATED)
+
+    def test_query_sort_is_kept(self):
+        query = "project: TEST Sort By: updated desc"
+        self.assertEqual(get_sorted_query(query), query)
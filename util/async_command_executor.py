@@ -0,0 +1,32 @@
+import asyncio
+from typing import Set
+
+from util import metrics
+from util.command_executor import COMMAND_STATUS_EXECUTED, DEFAULT_COMMAND_WORKERS, CommandExecutor
+
+
+class AsyncCommandExecutor(CommandExecutor):
+    """
+        CommandExecutor running commands as tasks of the event loop, functions return coroutines.
+        At most workers commands run at the same time. submit() must be called from the event loop.
+    """
+
+    def __init__(self, workers: int = DEFAULT_COMMAND_WORKERS) -> None:
+        super().__init__(workers)
+        self.semaphore = asyncio.Semaphore(workers)
+        self.tasks: Set[asyncio.Task] = set()
+
+    def _start(self, channel: str):
+        task = asyncio.get_running_loop().create_task(self._run_async(channel))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _run_async(self, channel: str):
+        key, function = self._get_running(channel)
+        try:
+            async with self.semaphore:
+                await function()
+            metrics.SLACK_COMMANDS.inc(COMMAND_STATUS_EXECUTED)
+        except Exception as exception:
+            self._on_error(channel, key, exception)
+        self._on_done(channel)
@@ -0,0 +1,98 @@
+import asyncio
+import time
+from typing import AsyncIterable, List, Optional, Set
+
+from slack_sdk.errors import SlackApiError
+from slack_sdk.web.async_client import AsyncWebClient
+
+from util.block_kit import Message, render_messages_async
+from util.slack_outbox import (DEFAULT_CHANNEL_BURST, DEFAULT_CHANNEL_RATE, DEFAULT_GLOBAL_RATE,
+                               DEFAULT_RETRY_AFTER_SECS, SEND_STATUS_ERROR, SEND_STATUS_OK, SEND_STATUS_RATE_LIMITED,
+                               OutboundMessage, SlackOutbox)
+
+
+class AsyncSlackOutbox(SlackOutbox):
+    """
+        SlackOutbox sending from the event loop with the async Slack client.
+        post() can still be called from any thread.
+    """
+
+    def __init__(self, client: AsyncWebClient, max_message_size: int, max_block_size: int,
+                 channel_rate: float = DEFAULT_CHANNEL_RATE, channel_burst: int = DEFAULT_CHANNEL_BURST,
+                 global_rate: float = DEFAULT_GLOBAL_RATE) -> None:
+        super().__init__(client, max_message_size, max_block_size, channel_rate=channel_rate,
+                         channel_burst=channel_burst, global_rate=global_rate)
+        self.loop: Optional[asyncio.AbstractEventLoop] = None
+        self.wakeup: Optional[asyncio.Event] = None
+        self.tasks: Set[asyncio.Task] = set()
+
+    def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.wakeup = asyncio.Event()
+        self._create_task(self._dispatch_loop_async())
+
+    def post(self, channel_name: str, message: Message, coalesce: bool = False):
+        if isinstance(message, AsyncIterable):
+            # lines still being read (eg: a digest), called from the event loop which produces them
+            self._create_task(self._post_async(channel_name, message, coalesce))
+            return
+        super().post(channel_name, message, coalesce)
+
+    async def _post_async(self, channel_name: str, lines: AsyncIterable[str], coalesce: bool):
+        async for blocks in render_messages_async(lines, self.max_message_size, self.max_block_size):
+            self._enqueue(channel_name, blocks, coalesce)
+
+    def _on_posted(self):
+        if self.loop is not None:
+            self.loop.call_soon_threadsafe(self.wakeup.set)
+
+    def _create_task(self, coroutine):
+        task = asyncio.get_running_loop().create_task(coroutine)
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _dispatch_loop_async(self):
+        while True:
+            with self.condition:
+                channel_name, wait_time = self._get_next_channel()
+                if channel_name is not None:
+                    self.in_flight.add(channel_name)
+                    self.buckets[channel_name].take()
+                    self.global_bucket.take()
+                    batch = self._pop_batch(self.queues[channel_name])
+                    self.queues[channel_name] = self.queues.pop(channel_name)  # round robin between channels
+
+            if channel_name is None:
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), wait_time)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            self._create_task(self._send_async(channel_name, batch))
+
+    async def _send_async(self, channel_name: str, batch: List[OutboundMessage]):
+        retry_after: float = 0
+        status = SEND_STATUS_OK
+        start = time.perf_counter()
+        try:
+            await self.client.chat_postMessage(channel=channel_name,
+                                               text="digest",
+                                               blocks=self._get_blocks(batch))
+        except SlackApiError as exception:
+            if exception.response.status_code == 429:
+                retry_after = float(exception.response.headers.get("Retry-After", DEFAULT_RETRY_AFTER_SECS))
+                status = SEND_STATUS_RATE_LIMITED
+            else:
+                print(f"Unable to post message to {channel_name}: {str(exception)}")
+                status = SEND_STATUS_ERROR
+        except Exception as exception:
+            print(f"Unable to post message to {channel_name}: {str(exception)}")
+            status = SEND_STATUS_ERROR
+        finally:
+            self._observe_send(batch, status, time.perf_counter() - start)
+            with self.condition:
+                if retry_after > 0:
+                    self._requeue(channel_name, batch, retry_after)
+                self.in_flight.discard(channel_name)
+            self.wakeup.set()
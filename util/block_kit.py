@@ -0,0 +1,181 @@
+import re
+from typing import AsyncIterable, AsyncIterator, Iterable, Iterator, List, Tuple, Union
+
+# Slack rejects messages with more blocks
+MAX_BLOCKS_PER_MESSAGE = 50
+
+# YouTrack markdown to Slack mrkdwn, "**" must be tried before "*"
+MARKDOWN_REPLACEMENTS = {"**": "*", "*": "_", "##": "*", "\\[": "[", "\\]": "]"}
+MARKDOWN_PATTERN = re.compile("|".join(re.escape(token) for token in MARKDOWN_REPLACEMENTS))
+
+# Slack limits on interactive elements
+MAX_PLAIN_TEXT_SIZE = 75
+MAX_OPTION_VALUE_SIZE = 150
+MAX_SELECT_OPTIONS = 100
+
+
+class InteractiveMessage:
+    """
+        Lines followed by interactive blocks (eg: buttons), posted as a single Slack message so that it can be updated
+        in place. Lines which do not fit in one message with the blocks are dropped.
+    """
+    __slots__ = ("lines", "blocks")
+
+    def __init__(self, lines: List[str], blocks: List[dict]) -> None:
+        self.lines: List[str] = lines
+        self.blocks: List[dict] = blocks
+
+
+# a message to post: either a text, its lines as they are produced (eg: digests, asynchronously in async mode),
+# or an interactive message
+Message = Union[str, Iterable[str], AsyncIterable[str], InteractiveMessage]
+
+
+def to_slack_markdown(text: str) -> str:
+    """
+        Convert YouTrack markdown emphasis to Slack mrkdwn in a single pass:
+        **bold** -> *bold*, *italic* -> _italic_, ## -> *, \\[ -> [, \\] -> ].
+    """
+    return MARKDOWN_PATTERN.sub(lambda match: MARKDOWN_REPLACEMENTS[match.group(0)], text)
+
+
+def get_plain_text(text: str) -> dict:
+    return {
+        "type": "plain_text",
+        "text": text[:MAX_PLAIN_TEXT_SIZE]
+    }
+
+
+def get_button(text: str, action_id: str, value: str) -> dict:
+    return {
+        "type": "button",
+        "text": get_plain_text(text),
+        "action_id": action_id,
+        "value": value
+    }
+
+
+def get_static_select(placeholder: str, action_id: str, options: List[Tuple[str, str]]) -> dict:
+    """
+        A select menu from (text, value) options, values too long for Slack are left out.
+    """
+    return {
+        "type": "static_select",
+        "placeholder": get_plain_text(placeholder),
+        "action_id": action_id,
+        "options": [{"text": get_plain_text(text), "value": value}
+                    for text, value in options if len(value) <= MAX_OPTION_VALUE_SIZE][:MAX_SELECT_OPTIONS]
+    }
+
+
+def get_section(text: str) -> dict:
+    return {
+        "type": "section",
+        "text": {
+            "type": "mrkdwn",
+            "text": text
+        }
+    }
+
+
+class MessageRenderer:
+    """
+        Pack lines into mrkdwn sections of at most max_block_size characters, and sections into messages of at most
+        max_message_size characters and MAX_BLOCKS_PER_MESSAGE blocks.
+        Lines are kept as is until their section is complete, then joined once; lines longer than a section are cut.
+    """
+
+    def __init__(self, max_message_size: int, max_block_size: int) -> None:
+        self.max_message_size: int = max_message_size
+        self.max_block_size: int = max_block_size
+        self.messages: List[List[dict]] = []  # complete messages, not yet consumed
+        self.blocks: List[dict] = []
+        self.message_size: int = 0
+        self.lines: List[str] = []
+        self.block_size: int = 0
+
+    def add_line(self, line: str):
+        for start in range(0, max(1, len(line)), self.max_block_size):
+            piece = line[start:start + self.max_block_size]
+            size = len(piece) + 1  # with its line break
+            if self.message_size + self.block_size + size > self.max_message_size:
+                self._close_message()
+            elif self.block_size + size > self.max_block_size:
+                self._close_block()
+                if len(self.blocks) >= MAX_BLOCKS_PER_MESSAGE:
+                    self._close_message()
+            self.lines.append(piece)
+            self.block_size += size
+
+    def close(self):
+        self._close_message()
+
+    def pop_messages(self) -> List[List[dict]]:
+        messages = self.messages
+        self.messages = []
+        return messages
+
+    def _close_block(self):
+        text = "\n".join(self.lines)
+        if text.strip() != "":  # Slack rejects empty sections
+            self.blocks.append(get_section(text))
+            self.message_size += len(text)
+        self.lines = []
+        self.block_size = 0
+
+    def _close_message(self):
+        self._close_block()
+        if len(self.blocks) > 0:
+            self.messages.append(self.blocks)
+        self.blocks = []
+        self.message_size = 0
+
+
+def render_messages(message: Union[str, Iterable[str], InteractiveMessage], max_message_size: int, max_block_size: int) -> Iterator[List[dict]]:
+    """
+        Yield the blocks of each Slack message needed to post message, as soon as each one is complete.
+    """
+    if isinstance(message, InteractiveMessage):
+        yield render_interactive_message(message, max_message_size, max_block_size)
+        return
+    renderer = MessageRenderer(max_message_size, max_block_size)
+    for line in message.splitlines() if isinstance(message, str) else message:
+        renderer.add_line(line)
+        yield from renderer.pop_messages()
+    renderer.close()
+    yield from renderer.pop_messages()
+
+
+async def render_messages_async(lines: AsyncIterable[str], max_message_size: int, max_block_size: int) -> AsyncIterator[List[dict]]:
+    """
+        render_messages for lines produced asynchronously.
+    """
+    renderer = MessageRenderer(max_message_size, max_block_size)
+    async for line in lines:
+        renderer.add_line(line)
+        for blocks in renderer.pop_messages():
+            yield blocks
+    renderer.close()
+    for blocks in renderer.pop_messages():
+        yield blocks
+
+
+def render_interactive_message(message: InteractiveMessage, max_message_size: int, max_block_size: int) -> List[dict]:
+    renderer = MessageRenderer(max_message_size, max_block_size)
+    for line in message.lines:
+        renderer.add_line(line)
+    renderer.close()
+    messages = renderer.pop_messages()
+    blocks = messages[0][:MAX_BLOCKS_PER_MESSAGE - len(message.blocks)] if len(messages) > 0 else []
+    return blocks + message.blocks
+
+
+def render_blocks(message: Message, max_message_size: int, max_block_size: int) -> List[dict]:
+    """
+        Blocks of the first Slack message of message, to update a message in place.
+    """
+    return next(render_messages(message, max_message_size, max_block_size), [])
+
+
+def get_text_size(blocks: List[dict]) -> int:
+    return sum(len(block.get("text", {}).get("text", "")) for block in blocks)
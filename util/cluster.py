@@ -0,0 +1,162 @@
+import atexit
+import bisect
+import hashlib
+import os
+import socket
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from util import metrics
+
+DEFAULT_LEASE_TTL_SECS = 30
+DEFAULT_HEARTBEAT_INTERVAL_SECS = 5
+VIRTUAL_NODES = 64
+
+Lease = Tuple[int, float]  # epoch, expiration time
+
+
+def get_hash(value: str) -> int:
+    return int.from_bytes(hashlib.sha1(value.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """
+        Consistent hashing of channels on replicas: when a replica joins or leaves,
+        only the channels of the ring segments it takes or gives back change owner.
+    """
+
+    def __init__(self, replicas: Iterable[str], virtual_nodes: int = VIRTUAL_NODES) -> None:
+        self.nodes: List[Tuple[int, str]] = sorted((get_hash(f"{replica}#{i}"), replica)
+                                                   for replica in replicas for i in range(virtual_nodes))
+        self.hashes: List[int] = [node_hash for node_hash, _ in self.nodes]
+
+    def get_replica(self, key: str) -> Optional[str]:
+        if len(self.nodes) == 0:
+            return None
+        return self.nodes[bisect.bisect(self.hashes, get_hash(key)) % len(self.nodes)][1]
+
+
+class Cluster:
+    """
+        Share channels between bot replicas using the same state file.
+        Each replica heartbeats in the state file, channels are assigned to live replicas by consistent hashing,
+        and a replica only runs the modules of the channels it holds a lease on.
+        Leases expire when not renewed, so the channels of a dead replica are taken over after lease_ttl.
+        Each change of owner increments the lease epoch, writes of a channel state are fenced by the epoch
+        (see get_fence) so that a replica which lost its lease (eg: paused) cannot overwrite the new owner's.
+    """
+
+    def __init__(self, file_name: str, replica_id: Optional[str] = None, lease_ttl_secs: int = DEFAULT_LEASE_TTL_SECS,
+                 heartbeat_interval_secs: int = DEFAULT_HEARTBEAT_INTERVAL_SECS) -> None:
+        self.replica_id: str = replica_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.lease_ttl: float = lease_ttl_secs
+        self.heartbeat_interval: float = heartbeat_interval_secs
+        self.leases: Dict[str, Lease] = {}  # channel -> lease held by this replica
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+        self.connection = sqlite3.connect(file_name, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS cluster_replicas (
+                                       replica TEXT PRIMARY KEY,
+                                       heartbeat REAL NOT NULL)""")
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS channel_leases (
+                                       channel TEXT PRIMARY KEY,
+                                       replica TEXT NOT NULL,
+                                       epoch INTEGER NOT NULL,
+                                       expires REAL NOT NULL)""")
+
+    def start(self, channels_provider: Callable[[], List[str]]):
+        """
+            Heartbeat and rebalance every heartbeat interval in a background thread,
+            channels_provider returns the current channels (and may refresh them from the state file first).
+        """
+        self.heartbeat(channels_provider())
+        self.thread = threading.Thread(target=self._heartbeat_loop, args=(channels_provider,), name="cluster", daemon=True)
+        self.thread.start()
+        atexit.register(self.leave)
+
+    def owns(self, channel: str) -> bool:
+        with self.lock:
+            lease = self.leases.get(channel)
+            return lease is not None and time.time() < lease[1]
+
+    def get_owned_channels(self) -> Set[str]:
+        now = time.time()
+        with self.lock:
+            return {channel for channel, (_, expires) in self.leases.items() if now < expires}
+
+    def get_fence(self, channel: str) -> Tuple[str, tuple]:
+        """
+            SQL condition, and its parameters, true only while this replica holds the channel lease it believes it holds.
+            To be checked in the statement writing the channel state.
+        """
+        with self.lock:
+            lease = self.leases.get(channel)
+        epoch = lease[0] if lease is not None and time.time() < lease[1] else None
+        return ("EXISTS (SELECT 1 FROM channel_leases WHERE channel = ? AND replica = ? AND epoch = ? AND expires > ?)",
+                (channel, self.replica_id, epoch, time.time()))
+
+    def heartbeat(self, channels: List[str], now: Optional[float] = None):
+        """
+            Renew this replica membership and rebalance leases in a single transaction:
+            leases of the channels hashed to this replica are taken when free or expired and renewed when held,
+            the ones held but now hashed to another replica are released right away.
+        """
+        now = now or time.time()
+        leases: Dict[str, Lease] = {}
+        with self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            self.connection.execute("INSERT OR REPLACE INTO cluster_replicas (replica, heartbeat) VALUES (?, ?)",
+                                    (self.replica_id, now))
+            self.connection.execute("DELETE FROM cluster_replicas WHERE heartbeat < ?", (now - self.lease_ttl,))
+            ring = HashRing(replica for replica, in self.connection.execute("SELECT replica FROM cluster_replicas"))
+            current: Dict[str, Tuple[str, int, float]] = {
+                channel: (replica, epoch, expires) for channel, replica, epoch, expires in
+                self.connection.execute("SELECT channel, replica, epoch, expires FROM channel_leases")}
+
+            for channel in channels:
+                replica, epoch, expires = current.get(channel, (None, 0, 0))
+                if ring.get_replica(channel) == self.replica_id:
+                    if replica == self.replica_id or expires <= now:
+                        if replica != self.replica_id:
+                            epoch += 1
+                        leases[channel] = (epoch, now + self.lease_ttl)
+                        self.connection.execute(
+                            "INSERT OR REPLACE INTO channel_leases (channel, replica, epoch, expires) VALUES (?, ?, ?, ?)",
+                            (channel, self.replica_id, epoch, now + self.lease_ttl))
+                elif replica == self.replica_id:
+                    self.connection.execute("UPDATE channel_leases SET expires = 0 WHERE channel = ?", (channel,))
+            deleted_channels = set(current) - set(channels)
+            self.connection.executemany("DELETE FROM channel_leases WHERE channel = ? AND replica = ?",
+                                        [(channel, self.replica_id) for channel in deleted_channels])
+
+        with self.lock:
+            self.leases = leases
+        metrics.CLUSTER_OWNED_CHANNELS.set(len(leases))
+
+    def leave(self):
+        """
+            Release leases and membership so that other replicas take over without waiting for expiration.
+        """
+        self.stop_event.set()
+        with self.lock:
+            self.leases = {}
+        try:
+            with self.connection:
+                self.connection.execute("BEGIN IMMEDIATE")
+                self.connection.execute("UPDATE channel_leases SET expires = 0 WHERE replica = ?", (self.replica_id,))
+                self.connection.execute("DELETE FROM cluster_replicas WHERE replica = ?", (self.replica_id,))
+        except sqlite3.Error as exception:
+            print(f"Unable to leave cluster: {str(exception)}")
+
+    def _heartbeat_loop(self, channels_provider: Callable[[], List[str]]):
+        while not self.stop_event.wait(self.heartbeat_interval):
+            try:
+                self.heartbeat(channels_provider())
+            except Exception as exception:
+                print(f"Cluster heartbeat failed: {str(exception)}")
+                metrics.ERRORS.inc("cluster")
@@ -0,0 +1,80 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import threading
+from typing import Any, Callable, Deque, Dict, Tuple
+
+from util import metrics
+
+DEFAULT_COMMAND_WORKERS = 4
+COMMAND_STATUS_EXECUTED = "executed"
+COMMAND_STATUS_COALESCED = "coalesced"
+COMMAND_STATUS_ERROR = "error"
+
+Command = Tuple[str, Callable[[], Any]]  # key (eg: the command text), function running it
+
+
+class CommandExecutor:
+    """
+        Run chat commands out of the Slack event handler, on a bounded pool of workers,
+        so that a slow YouTrack query does not hold the handler and delay the events of other channels.
+        Commands of a channel run one at a time in arrival order, so that they do not race on the channel config.
+        A command identical to the last one waiting or running for its channel is coalesced with it.
+    """
+
+    def __init__(self, workers: int = DEFAULT_COMMAND_WORKERS) -> None:
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="command")
+        self.lock = threading.Lock()
+        self.queues: Dict[str, Deque[Command]] = {}  # channel -> commands, the first one is running
+
+    def submit(self, channel: str, key: str, function: Callable[[], Any]) -> bool:
+        """
+            Queue the command for the channel, return False when it was coalesced with the previous one.
+        """
+        with self.lock:
+            queue = self.queues.get(channel)
+            if queue is not None and queue[-1][0] == key:
+                metrics.SLACK_COMMANDS.inc(COMMAND_STATUS_COALESCED)
+                return False
+            start = queue is None
+            if start:
+                queue = self.queues[channel] = deque()
+            queue.append((key, function))
+
+        if start:
+            self._start(channel)
+        return True
+
+    def get_pending_count(self) -> int:
+        with self.lock:
+            return sum(len(queue) for queue in self.queues.values())
+
+    def _start(self, channel: str):
+        self.executor.submit(self._run, channel)
+
+    def _run(self, channel: str):
+        key, function = self._get_running(channel)
+        try:
+            function()
+            metrics.SLACK_COMMANDS.inc(COMMAND_STATUS_EXECUTED)
+        except Exception as exception:
+            self._on_error(channel, key, exception)
+        self._on_done(channel)
+
+    def _get_running(self, channel: str) -> Command:
+        with self.lock:
+            return self.queues[channel][0]
+
+    def _on_done(self, channel: str):
+        # the next command of the channel goes back to the pool queue, behind the other channels' ones
+        with self.lock:
+            queue = self.queues[channel]
+            queue.popleft()
+            if len(queue) == 0:
+                del self.queues[channel]
+                return
+        self._start(channel)
+
+    def _on_error(self, channel: str, key: str, exception: Exception):
+        print(f"Command {key} failed for {channel}: {str(exception)}")
+        metrics.SLACK_COMMANDS.inc(COMMAND_STATUS_ERROR)
+        metrics.ERRORS.inc("command")
@@ -1,7 +1,11 @@
 from datetime import datetime
 import configparser
-from typing import List, Tuple
+import json
+import threading
+from typing import Dict, List, Optional, Tuple
 
+from util.schedule import FREQUENCIES, FREQUENCY_DAILY, FREQUENCY_POLLING, FREQUENCY_WEEKLY, ModuleSchedule
+from util.state_store import DEFAULT_FLUSH_INTERVAL_SECS, DEFAULT_STATE_FILE_NAME, StateStore
 from util.utils import STAT_YOUTRACK_DATE_FORMAT
 
 CONFIG_FILE_NAME = "config/config.ini"
@@ -15,72 +19,196 @@ MODULE_DIGEST = "digest"
 MODULES = [MODULE_TRACKING, MODULE_STATS, MODULE_DIGEST]
 
 POLLING_LASTCHECK = "lastcheck"
+# issues pushed to the channel since its last tracking sweep, see PushTracking
+PUSHED_ENTRY = "pushed"
 
-FREQUENCY_POLLING = "polling"
-FREQUENCY_DAILY = "daily"
-FREQUENCY_WEEKLY = "weekly"
-FREQUENCIES = [FREQUENCY_POLLING, FREQUENCY_DAILY, FREQUENCY_WEEKLY]
+
+class ChannelRecord:
+    __slots__ = ("key", "name", "query", "lastcheck", "modules")
+
+    def __init__(self, key: str, name: str, query: str = "", lastcheck: str = "") -> None:
+        self.key: str = key
+        self.name: str = name
+        self.query: str = query
+        self.lastcheck: str = lastcheck
+        self.modules: Dict[str, ModuleSchedule] = {}
+
+    def get_value(self, entry: str) -> str:
+        value: str = ""
+        if entry == CHANNEL_NAME_ENTRY:
+            value = self.name
+        elif entry == QUERY_ENTRY:
+            value = self.query
+        elif entry == POLLING_LASTCHECK:
+            value = self.lastcheck
+        elif entry in self.modules:
+            value = self.modules[entry].frequency_config
+        return value
 
 
 class Config:
-    def __init__(self) -> None:
+    def __init__(self, file_name: str = CONFIG_FILE_NAME) -> None:
+        # static settings (YouTrack and Slack credentials), never written back
+        self.file_name: str = file_name
         self.configuration = configparser.ConfigParser()
-        self.configuration.read(CONFIG_FILE_NAME)
-
-        if "channels" not in self.configuration:
-            self.configuration.add_section("channels")
+        self.configuration.read(file_name)
+
+        # mutable channel state, persisted in the state store and indexed in memory by channel
+        self.state: StateStore = StateStore(
+            self.configuration.get("state", "file_name", fallback=DEFAULT_STATE_FILE_NAME),
+            self.configuration.getfloat("state", "flush_interval", fallback=DEFAULT_FLUSH_INTERVAL_SECS))
+        self._import_legacy_channels()
+        self.channels: Dict[str, ChannelRecord] = {}
+        self.lock = threading.Lock()
+        self._load_channels()
+
+    def _import_legacy_channels(self):
+        """
+            Channels used to be stored in the [channels] section of config.ini,
+            import them once into the state store.
+        """
+        if "channels" in self.configuration and self.state.is_new and len(self.configuration["channels"]) > 0:
+            for entry, value in self.configuration["channels"].items():
+                channel_name, _, key = entry.rpartition(".")
+                self.state.set(channel_name, key, value)
+            self.state.flush()
+            print(f"Channels imported from {self.file_name}, the [channels] section can now be removed from it.")
+
+    def _load_channels(self):
+        for entry in self.state.get_channels():
+            name = self.state.get(entry, CHANNEL_NAME_ENTRY)
+            if name is None:
+                continue
+            record = ChannelRecord(entry, name,
+                                   self.state.get(entry, QUERY_ENTRY) or "",
+                                   self.state.get(entry, POLLING_LASTCHECK) or "")
+            for module in MODULES:
+                frequency_config = self.state.get(entry, module)
+                if frequency_config is not None:
+                    record.modules[module] = ModuleSchedule(frequency_config)
+            self.channels[entry] = record
+
+    def reload_channels(self):
+        """
+            Pick up channels changed by other replicas sharing the state file.
+            Unchanged module schedules are kept as is, so that their jobs are not rescheduled.
+        """
+        with self.lock:
+            self.state.reload()
+            previous_channels = self.channels
+            self.channels = {}
+            self._load_channels()
+            for entry, record in self.channels.items():
+                previous_record = previous_channels.get(entry)
+                if previous_record is None:
+                    continue
+                for module, module_schedule in record.modules.items():
+                    previous_schedule = previous_record.modules.get(module)
+                    if previous_schedule is not None and previous_schedule.frequency_config == module_schedule.frequency_config:
+                        record.modules[module] = previous_schedule
+
+    def get_channel(self, channel_name: str) -> Optional[ChannelRecord]:
+        return self.channels.get(channel_name.lower())
+
+    def get_channels(self) -> List[ChannelRecord]:
+        with self.lock:
+            return list(self.channels.values())
 
     def get_last_check_for_channel(self, channel_name: str) -> datetime:
         return datetime.strptime(
-            self.configuration['channels'][channel_name+"."+POLLING_LASTCHECK], STAT_YOUTRACK_DATE_FORMAT)
+            self.get_module_value_for_channel(channel_name, POLLING_LASTCHECK), STAT_YOUTRACK_DATE_FORMAT)
 
     def get_channel_entries(self) -> List[Tuple[str, str]]:
-        channel_names: List[Tuple[str,str]] = []
-        for entry in self.configuration["channels"]:
-            if entry.endswith("." + CHANNEL_NAME_ENTRY):
-                channel_names.append((entry[:-len(CHANNEL_NAME_ENTRY)-1], self.configuration["channels"][entry]))
-
-        return channel_names
+        return [(record.key, record.name) for record in self.get_channels()]
 
     def save_config(self):
-        with open(CONFIG_FILE_NAME, "w", encoding="utf-8") as configfile:
-            self.configuration.write(configfile)
+        self.state.request_flush()
     
     def has_channel(self, channel_name:str) -> bool:
-        return channel_name.lower() + "." + CHANNEL_NAME_ENTRY in self.configuration["channels"]
+        record = self.get_channel(channel_name)
+        return record is not None and record.name != "" and record.query != ""
     
     def get_module_value_for_channel(self, channel_name:str, module:str) -> str:
-        value: str = ""
-        entry: str = channel_name.lower()
-        if self.has_channel(channel_name) and module in entry + "." + module in self.configuration["channels"]:
-            value = self.configuration["channels"][entry + "." + module]
-
-        return value
+        record = self.get_channel(channel_name)
+        return record.get_value(module) if record is not None else ""
     
     def set_module_value_for_channel(self, channel_name:str, module:str, value:str):
         entry: str = channel_name.lower()
-        self.configuration["channels"][entry + "." + module] = value
+        with self.lock:
+            record = self.channels.get(entry)
+            if record is None:
+                record = ChannelRecord(entry, value if module == CHANNEL_NAME_ENTRY else channel_name)
+                self.channels[entry] = record
+            if module == CHANNEL_NAME_ENTRY:
+                record.name = value
+            elif module == QUERY_ENTRY:
+                record.query = value
+            elif module == POLLING_LASTCHECK:
+                record.lastcheck = value
+            else:
+                record.modules[module] = ModuleSchedule(value)
+            self.state.set(entry, module, value)
+
+    def set_last_check_for_channel(self, channel_name: str, value: str) -> bool:
+        """
+            Write the channel last check, unless the channel was deleted meanwhile (eg: !del_query during a poll).
+        """
+        entry: str = channel_name.lower()
+        with self.lock:
+            record = self.channels.get(entry)
+            if record is None:
+                return False
+            record.lastcheck = value
+            self.state.set(entry, POLLING_LASTCHECK, value)
+            return True
+
+    def set_fenced_last_check_for_channel(self, channel_name: str, value: str, condition: str, parameters: tuple) -> bool:
+        """
+            Write the channel last check right away, only if the SQL condition holds (eg: a cluster lease fence).
+        """
+        entry: str = channel_name.lower()
+        with self.lock:
+            record = self.channels.get(entry)
+            if record is None or not self.state.set_if(entry, POLLING_LASTCHECK, value, condition, parameters):
+                return False
+            record.lastcheck = value
+            return True
+
+    def get_pushed_issues(self, channel_name: str) -> Dict[str, float]:
+        value = self.state.get(channel_name.lower(), PUSHED_ENTRY)
+        return json.loads(value) if value else {}
+
+    def set_pushed_issues(self, channel_name: str, pushed_issues: Dict[str, float]):
+        """
+            Save issue id -> claim timestamp, unless the channel was deleted meanwhile.
+        """
+        entry: str = channel_name.lower()
+        with self.lock:
+            if entry not in self.channels:
+                return
+            if len(pushed_issues) > 0:
+                self.state.set(entry, PUSHED_ENTRY, json.dumps(pushed_issues, separators=(",", ":")))
+            else:
+                self.state.delete(entry, PUSHED_ENTRY)
 
     def delete_channel(self, channel_name: str) -> bool:
-        deleted = False
-        entry: str = channel_name.lower() + "." + CHANNEL_NAME_ENTRY
-        if entry in self.configuration["channels"]:
-            deleted = True
-            def del_entry(suffix:str):
-                full_entry = channel_name.lower() + "." + suffix
-                if full_entry in self.configuration["channels"]:
-                    del self.configuration["channels"][full_entry]
-            
-            for module in MODULES:
-                del_entry(module)
-            del_entry(POLLING_LASTCHECK)
-            del_entry(CHANNEL_NAME_ENTRY)
-            del_entry(QUERY_ENTRY)
-            
+        entry: str = channel_name.lower()
+        with self.lock:
+            record = self.channels.pop(entry, None)
+            if record is not None:
+                for module in MODULES:
+                    self.state.delete(entry, module)
+                self.state.delete(entry, POLLING_LASTCHECK)
+                self.state.delete(entry, PUSHED_ENTRY)
+                self.state.delete(entry, CHANNEL_NAME_ENTRY)
+                self.state.delete(entry, QUERY_ENTRY)
         
-        return deleted
+        return record is not None
 
     def delete_module_for_channel(self, channel_name: str, module: str):
-        entry: str = channel_name.lower() + "." + module
-        if entry in self.configuration["channels"]:
-            del self.configuration["channels"][entry]
+        entry: str = channel_name.lower()
+        with self.lock:
+            record = self.channels.get(entry)
+            if record is not None:
+                record.modules.pop(module, None)
+            self.state.delete(entry, module)
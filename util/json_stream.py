@@ -0,0 +1,82 @@
+import codecs
+import json
+import re
+from typing import Any, List
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+# what may follow a complete array element
+SEPARATORS = {",", "]", " ", "\t", "\n", "\r"}
+
+# decoder states
+STATE_START = "start"  # before the top level value
+STATE_FIRST_ELEMENT = "first_element"  # after "[", expecting an element or "]"
+STATE_ELEMENT = "element"  # after ",", expecting an element
+STATE_SEPARATOR = "separator"  # after an element, expecting "," or "]"
+STATE_END = "end"  # after "]"
+STATE_OTHER = "other"  # the top level value is not an array, decoded as a whole on close
+
+
+class JsonArrayDecoder:
+    """
+        Incremental decoder of a JSON array fed with chunks of UTF-8 bytes (eg: a streamed HTTP response).
+        Each element is returned as soon as it is complete, so that only one element and the current chunk are
+        held in memory instead of the whole response and its object tree.
+        Any other top level value (eg: an error object) is decoded as a whole on close and kept in value.
+    """
+
+    def __init__(self) -> None:
+        self.text_decoder = codecs.getincrementaldecoder("utf-8")()
+        self.decoder = json.JSONDecoder()
+        self.buffer: str = ""
+        self.state: str = STATE_START
+        self.value: Any = None
+
+    def feed(self, chunk: bytes) -> List[Any]:
+        self.buffer += self.text_decoder.decode(chunk)
+        return self._decode(final=False)
+
+    def close(self) -> List[Any]:
+        self.buffer += self.text_decoder.decode(b"", final=True)
+        elements = self._decode(final=True)
+        if self.state == STATE_OTHER:
+            self.value = json.loads(self.buffer)
+        elif self.state != STATE_END:
+            raise ValueError("Truncated JSON array")
+        return elements
+
+    def _decode(self, final: bool) -> List[Any]:
+        elements: List[Any] = []
+        position = 0
+        while self.state not in (STATE_END, STATE_OTHER):
+            position = WHITESPACE.match(self.buffer, position).end()
+            if position == len(self.buffer):
+                break
+
+            char = self.buffer[position]
+            if self.state == STATE_START:
+                if char != "[":
+                    self.state = STATE_OTHER
+                    break
+                self.state = STATE_FIRST_ELEMENT
+                position += 1
+            elif self.state == STATE_SEPARATOR or (self.state == STATE_FIRST_ELEMENT and char == "]"):
+                if char not in ",]":
+                    raise ValueError(f"Expecting ',' or ']' at {position}: {self.buffer[position:position + 20]!r}")
+                self.state = STATE_ELEMENT if char == "," else STATE_END
+                position += 1
+            else:
+                try:
+                    element, end = self.decoder.raw_decode(self.buffer, position)
+                except json.JSONDecodeError:
+                    if final:
+                        raise
+                    break  # incomplete element, wait for the next chunk
+                if not final and isinstance(element, (int, float)) and self.buffer[end:end + 1] not in SEPARATORS:
+                    break  # a number may go on in the next chunk (eg: "-2" of "-2.5e10")
+                elements.append(element)
+                self.state = STATE_SEPARATOR
+                position = end
+
+        if self.state != STATE_OTHER:
+            self.buffer = self.buffer[position:]
+        return elements
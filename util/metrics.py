@@ -0,0 +1,242 @@
+import bisect
+from contextlib import contextmanager
+import contextvars
+import math
+import threading
+import time
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple, TypeVar
+
+# in secs, from a fast local call to a slow paginated query
+DEFAULT_LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+LAG_BUCKETS = (0.1, 0.5, 1, 2, 5, 10, 30, 60, 120, 300)
+
+# module (tracking, digest, stats) on behalf of which YouTrack is called, "command" for Slack commands
+MODULE_COMMAND = "command"
+current_module: contextvars.ContextVar = contextvars.ContextVar("current_module", default=MODULE_COMMAND)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LabelValues = Tuple[str, ...]
+
+
+class Metric:
+    """
+        A metric family in the Prometheus text exposition format, one value per label values combination.
+    """
+    metric_type: str = "untyped"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> None:
+        self.name: str = name
+        self.documentation: str = documentation
+        self.label_names: Tuple[str, ...] = tuple(label_names)
+        self.lock = threading.Lock()
+
+    def _get_label_values(self, label_values: Sequence[str], labels: Dict[str, str]) -> LabelValues:
+        if len(labels) > 0:
+            label_values = [labels[name] for name in self.label_names]
+        if len(label_values) != len(self.label_names):
+            raise ValueError(f"{self.name} expects labels {self.label_names}, got {label_values}")
+        return tuple(str(value) for value in label_values)
+
+    def _format_labels(self, label_values: LabelValues, extra: Optional[Tuple[str, str]] = None) -> str:
+        pairs = list(zip(self.label_names, label_values))
+        if extra is not None:
+            pairs.append(extra)
+        if len(pairs) == 0:
+            return ""
+        return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"] + self._render_samples()
+
+    def _render_samples(self) -> List[str]:
+        return []
+
+
+class Counter(Metric):
+    metric_type = "counter"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = ()) -> None:
+        super().__init__(name, documentation, label_names)
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1, **labels: str):
+        key = self._get_label_values(label_values, labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, *label_values: str, **labels: str) -> float:
+        with self.lock:
+            return self.values.get(self._get_label_values(label_values, labels), 0)
+
+    def _render_samples(self) -> List[str]:
+        with self.lock:
+            return [f"{self.name}{self._format_labels(key)} {_format_value(value)}" for key, value in self.values.items()]
+
+
+class Gauge(Metric):
+    """
+        Either set explicitly, or computed on collection when a function is given (unlabelled gauges only).
+    """
+    metric_type = "gauge"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = (),
+                 function: Optional[Callable[[], float]] = None) -> None:
+        super().__init__(name, documentation, label_names)
+        self.values: Dict[LabelValues, float] = {}
+        self.function: Optional[Callable[[], float]] = function
+
+    def set(self, value: float, *label_values: str, **labels: str):
+        key = self._get_label_values(label_values, labels)
+        with self.lock:
+            self.values[key] = value
+
+    def set_function(self, function: Callable[[], float]):
+        self.function = function
+
+    def get(self, *label_values: str, **labels: str) -> Optional[float]:
+        if self.function is not None:
+            return self.function()
+        with self.lock:
+            return self.values.get(self._get_label_values(label_values, labels))
+
+    def remove(self, *label_values: str, **labels: str):
+        key = self._get_label_values(label_values, labels)
+        with self.lock:
+            self.values.pop(key, None)
+
+    def _render_samples(self) -> List[str]:
+        if self.function is not None:
+            return [f"{self.name} {_format_value(self.function())}"]
+        with self.lock:
+            return [f"{self.name}{self._format_labels(key)} {_format_value(value)}" for key, value in self.values.items()]
+
+
+class HistogramValue:
+    __slots__ = ("bucket_counts", "total", "count")
+
+    def __init__(self, bucket_count: int) -> None:
+        self.bucket_counts: List[int] = [0] * bucket_count  # not cumulative
+        self.total: float = 0
+        self.count: int = 0
+
+
+class Histogram(Metric):
+    metric_type = "histogram"
+
+    def __init__(self, name: str, documentation: str, label_names: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS) -> None:
+        super().__init__(name, documentation, label_names)
+        self.buckets: Tuple[float, ...] = tuple(sorted(buckets)) + (math.inf,)
+        self.values: Dict[LabelValues, HistogramValue] = {}
+
+    def observe(self, value: float, *label_values: str, **labels: str):
+        key = self._get_label_values(label_values, labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            histogram_value = self.values.get(key)
+            if histogram_value is None:
+                histogram_value = self.values[key] = HistogramValue(len(self.buckets))
+            histogram_value.bucket_counts[index] += 1
+            histogram_value.total += value
+            histogram_value.count += 1
+
+    @contextmanager
+    def time(self, *label_values: str, **labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, *label_values, **labels)
+
+    def _render_samples(self) -> List[str]:
+        samples: List[str] = []
+        with self.lock:
+            for key, histogram_value in self.values.items():
+                cumulative = 0
+                for bound, count in zip(self.buckets, histogram_value.bucket_counts):
+                    cumulative += count
+                    samples.append(f"{self.name}_bucket{self._format_labels(key, ('le', _format_value(bound)))} {cumulative}")
+                samples.append(f"{self.name}_sum{self._format_labels(key)} {_format_value(histogram_value.total)}")
+                samples.append(f"{self.name}_count{self._format_labels(key)} {histogram_value.count}")
+        return samples
+
+
+MetricType = TypeVar("MetricType", bound=Metric)
+
+
+class Registry:
+    def __init__(self) -> None:
+        self.metrics: List[Metric] = []
+
+    def register(self, metric: MetricType) -> MetricType:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+REGISTRY = Registry()
+
+YOUTRACK_REQUEST_SECONDS: Histogram = REGISTRY.register(Histogram(
+    "youtrack_request_duration_seconds", "YouTrack API request latency.", ["operation", "module"]))
+YOUTRACK_RESPONSE_BYTES: Histogram = REGISTRY.register(Histogram(
+    "youtrack_response_size_bytes", "YouTrack API response size.", ["operation"], buckets=SIZE_BUCKETS))
+YOUTRACK_RATE_LIMITED: Counter = REGISTRY.register(Counter(
+    "youtrack_rate_limited_total", "Tracking polls which got a 429 from YouTrack after retries, holding every channel."))
+YOUTRACK_CACHE_REQUESTS: Counter = REGISTRY.register(Counter(
+    "youtrack_cache_requests_total", "YouTrack calls answered from the response cache (hit), by a call in flight (shared) or by YouTrack (miss).", ["result"]))
+YOUTRACK_CACHE_BYTES: Gauge = REGISTRY.register(Gauge(
+    "youtrack_cache_size_bytes", "Size of the YouTrack responses held by the response cache."))
+SLACK_POST_SECONDS: Histogram = REGISTRY.register(Histogram(
+    "slack_post_duration_seconds", "Slack chat.postMessage latency.", ["status"]))
+SLACK_MESSAGE_BYTES: Histogram = REGISTRY.register(Histogram(
+    "slack_message_size_bytes", "Size of the messages posted to Slack.", buckets=SIZE_BUCKETS))
+SLACK_PENDING_MESSAGES: Gauge = REGISTRY.register(Gauge(
+    "slack_outbox_pending_messages", "Messages waiting in the Slack outbox."))
+SCHEDULER_TICK_SECONDS: Histogram = REGISTRY.register(Histogram(
+    "scheduler_tick_duration_seconds", "Time spent by the scheduler to dispatch due jobs."))
+SCHEDULER_LAG_SECONDS: Histogram = REGISTRY.register(Histogram(
+    "scheduler_job_lag_seconds", "Delay between a job fire time and the start of its execution.", ["module"],
+    buckets=LAG_BUCKETS))
+SCHEDULER_LAST_TICK: Gauge = REGISTRY.register(Gauge(
+    "scheduler_last_tick_timestamp_seconds", "Wall clock time of the last scheduler tick."))
+SCHEDULER_MISSED_FIRES: Counter = REGISTRY.register(Counter(
+    "scheduler_missed_fires_total", "Daily/weekly fires skipped because they were late by more than the grace period.", ["module"]))
+SCHEDULER_SKIPPED_RUNS: Counter = REGISTRY.register(Counter(
+    "scheduler_skipped_runs_total", "Fires skipped because the previous run of the job was still in progress.", ["module"]))
+CHANNEL_UNRESOLVED_ISSUES: Gauge = REGISTRY.register(Gauge(
+    "channel_unresolved_issues", "Unresolved issues matching the channel query, as of the last digest or stats.", ["channel"]))
+CHANNEL_TRACKING_INTERVAL: Gauge = REGISTRY.register(Gauge(
+    "channel_tracking_interval_seconds", "Current polling interval of the channel tracking, before backoff.", ["channel"]))
+CHANNEL_TRACKED_ISSUES: Counter = REGISTRY.register(Counter(
+    "channel_tracked_issues_total", "New issues notified by tracking.", ["channel"]))
+SLACK_COMMANDS: Counter = REGISTRY.register(Counter(
+    "slack_commands_total", "Chat commands by result (executed, coalesced, error).", ["result"]))
+SLACK_PENDING_COMMANDS: Gauge = REGISTRY.register(Gauge(
+    "slack_pending_commands", "Chat commands running or waiting for their channel's previous ones."))
+WEBHOOK_ISSUES: Counter = REGISTRY.register(Counter(
+    "webhook_issues_total", "Issues pushed by YouTrack, by result (notified, unmatched, rejected).", ["result"]))
+CLUSTER_OWNED_CHANNELS: Gauge = REGISTRY.register(Gauge(
+    "cluster_owned_channels", "Channels whose lease is held by this replica."))
+CLUSTER_FENCED_WRITES: Counter = REGISTRY.register(Counter(
+    "cluster_fenced_writes_total", "Last check writes rejected because the channel lease was lost."))
+ERRORS: Counter = REGISTRY.register(Counter(
+    "errors_total", "Errors by component (youtrack, slack, command, module, state, cluster).", ["component"]))
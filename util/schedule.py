@@ -0,0 +1,110 @@
+from datetime import datetime, timedelta
+import math
+from typing import List, Optional, Tuple
+
+FREQUENCY_POLLING = "polling"
+FREQUENCY_DAILY = "daily"
+FREQUENCY_WEEKLY = "weekly"
+FREQUENCIES = [FREQUENCY_POLLING, FREQUENCY_DAILY, FREQUENCY_WEEKLY]
+
+
+class Schedule:
+    __slots__ = ("frequency", "hour", "minute", "weekday")
+
+    def __init__(self, frequency: str, hour: int = 0, minute: int = 0, weekday: Optional[int] = None) -> None:
+        self.frequency: str = frequency
+        self.hour: int = hour
+        self.minute: int = minute
+        self.weekday: Optional[int] = weekday
+
+    @property
+    def is_polling(self) -> bool:
+        return self.frequency == FREQUENCY_POLLING
+
+    def first_fire(self, now: datetime, grace_period: timedelta = timedelta(0)) -> datetime:
+        """
+            Like next_fire, a daily/weekly fire not older than the grace period is kept,
+            so that a bot started just after a fire time still runs it.
+        """
+        if self.is_polling:
+            return now
+        return self._next_wall_clock_fire(now - grace_period - timedelta(microseconds=1))
+
+    def next_fire(self, previous_fire: datetime, now: datetime, grace_period: timedelta, polling_interval: timedelta) -> datetime:
+        """
+            Next fire time computed from the previous theoretical fire time (not from the time the job ran),
+            so that slow jobs do not make the schedule drift.
+            Polling fires missed while late are collapsed into the next one,
+            daily/weekly fires are kept if they are not older than the grace period.
+        """
+        if self.is_polling:
+            late_intervals = max(1, math.ceil((now - previous_fire) / polling_interval))
+            return previous_fire + polling_interval * late_intervals
+        fire = self._next_wall_clock_fire(previous_fire)
+        if fire < now - grace_period:
+            fire = self._next_wall_clock_fire(now - grace_period)
+        return fire
+
+    def _next_wall_clock_fire(self, after: datetime) -> datetime:
+        fire = after.replace(hour=self.hour, minute=self.minute, second=0, microsecond=0)
+        if self.weekday is not None:
+            fire += timedelta(days=(self.weekday - fire.weekday()) % 7)
+        while fire <= after:
+            fire += timedelta(days=7 if self.weekday is not None else 1)
+        return fire
+
+
+class ModuleSchedule:
+    """
+        A module frequency as stored in configuration, parsed once.
+        error is set instead of schedule when the frequency cannot be parsed.
+    """
+    __slots__ = ("frequency_config", "schedule", "error")
+
+    def __init__(self, frequency_config: str) -> None:
+        self.frequency_config: str = frequency_config
+        self.schedule: Optional[Schedule] = None
+        self.error: Optional[Exception] = None
+        try:
+            self.schedule = parse_schedule(frequency_config)
+        except Exception as exception:
+            self.error = exception
+
+    @property
+    def frequency(self) -> str:
+        return self.frequency_config.split(" ")[0]
+
+
+def parse_schedule(frequency_config: str) -> Schedule:
+    """
+        Parse a module frequency as stored in configuration:
+        "polling", "daily <hour:minute>" or "weekly <day> <hour:minute>" (24h format).
+        Raise ValueError when the frequency cannot be parsed.
+    """
+    args: List[str] = frequency_config.split(" ")
+    schedule: Schedule
+    match args[0]:
+        case "polling":
+            schedule = Schedule(FREQUENCY_POLLING)
+        case "daily":
+            if len(args) != 2:
+                raise ValueError("Expected format: daily <hour:minute> (in 24h format), eg: daily 9:00")
+            hour, minute = _parse_time(args[1])
+            schedule = Schedule(FREQUENCY_DAILY, hour=hour, minute=minute)
+        case "weekly":
+            if len(args) != 3:
+                raise ValueError("Expected format: weekly <day> <hour:minute> (in 24h format), eg: weekly friday 14:30")
+            hour, minute = _parse_time(args[2])
+            schedule = Schedule(FREQUENCY_WEEKLY, hour=hour, minute=minute,
+                                weekday=datetime.strptime(args[1], "%A").weekday())
+        case _:
+            raise ValueError(f"Unkown frequency {args[0]}")
+
+    return schedule
+
+
+def _parse_time(hour_minute: str) -> Tuple[int, int]:
+    hour, minute = hour_minute.split(":")
+    if not 0 <= int(hour) < 24 or not 0 <= int(minute) < 60:
+        raise ValueError(f"Invalid time {hour_minute}")
+    return int(hour), int(minute)
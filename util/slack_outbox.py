@@ -0,0 +1,203 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
+from typing import Deque, Dict, List, Optional, Set
+
+from slack_sdk import WebClient
+from slack_sdk.errors import SlackApiError
+
+from util import metrics
+from util.block_kit import MAX_BLOCKS_PER_MESSAGE, Message, get_text_size, render_messages
+
+# chat.postMessage allows about one message per second per channel, with short bursts
+DEFAULT_CHANNEL_RATE = 1.0
+DEFAULT_CHANNEL_BURST = 3
+# workspace wide limit, kept under the "special" tier
+DEFAULT_GLOBAL_RATE = 20.0
+DEFAULT_SENDERS = 4
+DEFAULT_RETRY_AFTER_SECS = 30
+MAX_SEND_ATTEMPTS = 3
+SEND_STATUS_OK = "ok"
+SEND_STATUS_RATE_LIMITED = "rate_limited"
+SEND_STATUS_ERROR = "error"
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float) -> None:
+        self.rate: float = rate
+        self.capacity: float = capacity
+        self.tokens: float = capacity
+        self.updated_at: float = time.monotonic()
+        self.blocked_until: float = 0
+
+    def get_wait_time(self, now: float) -> float:
+        """
+            Time to wait before a token is available, 0 if one can be taken now.
+        """
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        if self.tokens >= 1:
+            return 0
+        return (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def block(self, now: float, duration: float):
+        self.blocked_until = max(self.blocked_until, now + duration)
+        self.tokens = 0
+
+
+class OutboundMessage:
+    __slots__ = ("blocks", "size", "coalesce", "attempts")
+
+    def __init__(self, blocks: List[dict], coalesce: bool) -> None:
+        self.blocks: List[dict] = blocks
+        self.size: int = get_text_size(blocks)
+        self.coalesce: bool = coalesce
+        self.attempts: int = 0
+
+
+class SlackOutbox:
+    """
+        Background dispatcher for messages posted to Slack.
+        Producers only enqueue; messages are sent per channel in order, throttled by a token bucket per channel
+        and a global one, and delayed according to Retry-After when Slack rate limits the bot.
+        Messages are rendered to Block Kit sections when posted, one Slack message at a time, so that sending starts
+        while a long digest is still being rendered.
+        Consecutive messages marked as coalescable (eg: tracking notifications) are merged into a single message,
+        up to the maximum message size.
+    """
+
+    def __init__(self, client: WebClient, max_message_size: int, max_block_size: int,
+                 channel_rate: float = DEFAULT_CHANNEL_RATE, channel_burst: int = DEFAULT_CHANNEL_BURST,
+                 global_rate: float = DEFAULT_GLOBAL_RATE, senders: int = DEFAULT_SENDERS) -> None:
+        self.client: WebClient = client
+        self.max_message_size: int = max_message_size
+        self.max_block_size: int = max_block_size
+        self.channel_rate: float = channel_rate
+        self.channel_burst: int = channel_burst
+        self.global_bucket: TokenBucket = TokenBucket(global_rate, global_rate)
+
+        self.queues: Dict[str, Deque[OutboundMessage]] = {}
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.in_flight: Set[str] = set()
+        self.condition = threading.Condition()
+        self.senders: int = senders
+        # created by start(), the async outbox sends from the event loop and never needs them
+        self.executor: Optional[ThreadPoolExecutor] = None
+        self.dispatcher: Optional[threading.Thread] = None
+
+    def start(self):
+        self.executor = ThreadPoolExecutor(max_workers=self.senders, thread_name_prefix="slack-sender")
+        self.dispatcher = threading.Thread(target=self._dispatch_loop, name="slack-outbox", daemon=True)
+        self.dispatcher.start()
+
+    def post(self, channel_name: str, message: Message, coalesce: bool = False):
+        for blocks in render_messages(message, self.max_message_size, self.max_block_size):
+            self._enqueue(channel_name, blocks, coalesce)
+
+    def _enqueue(self, channel_name: str, blocks: List[dict], coalesce: bool):
+        with self.condition:
+            self.queues.setdefault(channel_name, deque()).append(OutboundMessage(blocks, coalesce))
+            self.condition.notify()
+        self._on_posted()
+
+    def _on_posted(self):
+        """
+            Called from the posting thread each time a message is queued.
+        """
+
+    def get_pending_count(self) -> int:
+        with self.condition:
+            return sum(len(queue) for queue in self.queues.values())
+
+    def _dispatch_loop(self):
+        while True:
+            with self.condition:
+                channel_name, wait_time = self._get_next_channel()
+                if channel_name is None:
+                    self.condition.wait(wait_time)
+                    continue
+                self.in_flight.add(channel_name)
+                self.buckets[channel_name].take()
+                self.global_bucket.take()
+                batch = self._pop_batch(self.queues[channel_name])
+                self.queues[channel_name] = self.queues.pop(channel_name)  # round robin between channels
+            self.executor.submit(self._send, channel_name, batch)
+
+    def _get_next_channel(self):
+        now = time.monotonic()
+        wait_time: Optional[float] = None
+        global_wait = self.global_bucket.get_wait_time(now)
+        for channel_name, queue in self.queues.items():
+            if len(queue) == 0 or channel_name in self.in_flight:
+                continue
+            bucket = self.buckets.setdefault(channel_name, TokenBucket(self.channel_rate, self.channel_burst))
+            channel_wait = max(global_wait, bucket.get_wait_time(now))
+            if channel_wait == 0:
+                return channel_name, 0
+            wait_time = channel_wait if wait_time is None else min(wait_time, channel_wait)
+
+        return None, wait_time
+
+    def _pop_batch(self, queue: Deque[OutboundMessage]) -> List[OutboundMessage]:
+        batch: List[OutboundMessage] = [queue.popleft()]
+        if batch[0].coalesce:
+            size = batch[0].size
+            block_count = len(batch[0].blocks)
+            while len(queue) > 0 and queue[0].coalesce and block_count + len(queue[0].blocks) <= MAX_BLOCKS_PER_MESSAGE \
+                    and size + queue[0].size <= self.max_message_size:
+                size += queue[0].size
+                block_count += len(queue[0].blocks)
+                batch.append(queue.popleft())
+        return batch
+
+    def _send(self, channel_name: str, batch: List[OutboundMessage]):
+        retry_after: float = 0
+        status = SEND_STATUS_OK
+        start = time.perf_counter()
+        try:
+            self.client.chat_postMessage(channel=channel_name,
+                                         text="digest",
+                                         blocks=self._get_blocks(batch))
+        except SlackApiError as exception:
+            if exception.response.status_code == 429:
+                retry_after = float(exception.response.headers.get("Retry-After", DEFAULT_RETRY_AFTER_SECS))
+                status = SEND_STATUS_RATE_LIMITED
+            else:
+                print(f"Unable to post message to {channel_name}: {str(exception)}")
+                status = SEND_STATUS_ERROR
+        except Exception as exception:
+            print(f"Unable to post message to {channel_name}: {str(exception)}")
+            status = SEND_STATUS_ERROR
+        finally:
+            self._observe_send(batch, status, time.perf_counter() - start)
+            with self.condition:
+                if retry_after > 0:
+                    self._requeue(channel_name, batch, retry_after)
+                self.in_flight.discard(channel_name)
+                self.condition.notify()
+
+    def _observe_send(self, batch: List[OutboundMessage], status: str, duration: float):
+        metrics.SLACK_POST_SECONDS.observe(duration, status)
+        if status == SEND_STATUS_OK:
+            metrics.SLACK_MESSAGE_BYTES.observe(sum(message.size for message in batch))
+        elif status == SEND_STATUS_ERROR:
+            metrics.ERRORS.inc("slack")
+
+    def _requeue(self, channel_name: str, batch: List[OutboundMessage], retry_after: float):
+        print(f"Rate limited by Slack on {channel_name}, retrying in {retry_after}s")
+        self.buckets[channel_name].block(time.monotonic(), retry_after)
+        for message in reversed(batch):
+            message.attempts += 1
+            if message.attempts < MAX_SEND_ATTEMPTS:
+                self.queues[channel_name].appendleft(message)
+
+    def _get_blocks(self, batch: List[OutboundMessage]) -> List[dict]:
+        if len(batch) == 1:
+            return batch[0].blocks
+        return [block for message in batch for block in message.blocks]
@@ -0,0 +1,143 @@
+import atexit
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+from util import metrics
+
+DEFAULT_STATE_FILE_NAME = "config/state.db"
+DEFAULT_FLUSH_INTERVAL_SECS = 5
+
+EntryKey = Tuple[str, str]  # (channel, key)
+
+
+class StateStore:
+    """
+        Mutable channel state (queries, module schedules, last checks) kept in memory and written behind to SQLite.
+        Changes are only marked dirty, a background thread writes them in a single transaction
+        every flush interval or as soon as a flush is requested. SQLite (WAL journal) makes each flush atomic.
+    """
+
+    def __init__(self, file_name: str = DEFAULT_STATE_FILE_NAME, flush_interval: float = DEFAULT_FLUSH_INTERVAL_SECS) -> None:
+        self.file_name: str = file_name
+        self.flush_interval: float = flush_interval
+        self.entries: Dict[str, Dict[str, str]] = {}
+        self.dirty: Set[EntryKey] = set()
+        self.lock = threading.RLock()
+        self.flush_lock = threading.Lock()
+        self.flush_event = threading.Event()
+        self.stop_event = threading.Event()
+
+        self.is_new: bool = not os.path.exists(file_name)
+        self.connection = sqlite3.connect(file_name, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS channel_entries (
+                                       channel TEXT NOT NULL,
+                                       key TEXT NOT NULL,
+                                       value TEXT NOT NULL,
+                                       PRIMARY KEY (channel, key))""")
+        for channel, key, value in self.connection.execute("SELECT channel, key, value FROM channel_entries"):
+            self.entries.setdefault(channel, {})[key] = value
+
+        self.flusher = threading.Thread(target=self._flush_loop, name="state-flusher", daemon=True)
+        self.flusher.start()
+        atexit.register(self.close)
+
+    def get_channels(self) -> List[str]:
+        with self.lock:
+            return list(self.entries)
+
+    def get(self, channel: str, key: str) -> Optional[str]:
+        with self.lock:
+            return self.entries.get(channel, {}).get(key)
+
+    def set(self, channel: str, key: str, value: str):
+        with self.lock:
+            self.entries.setdefault(channel, {})[key] = value
+            self.dirty.add((channel, key))
+
+    def delete(self, channel: str, key: str) -> bool:
+        with self.lock:
+            channel_entries = self.entries.get(channel, {})
+            if key not in channel_entries:
+                return False
+            del channel_entries[key]
+            if len(channel_entries) == 0:
+                del self.entries[channel]
+            self.dirty.add((channel, key))
+            return True
+
+    def set_if(self, channel: str, key: str, value: str, condition: str, parameters: tuple) -> bool:
+        """
+            Write the entry right away, in the same statement as the SQL condition (eg: a lease fence).
+            Return False, leaving the entry unchanged, when the condition is false.
+        """
+        with self.flush_lock, self.lock:
+            cursor = self.connection.execute(
+                f"INSERT OR REPLACE INTO channel_entries (channel, key, value) SELECT ?, ?, ? WHERE {condition}",
+                (channel, key, value) + parameters)
+            if cursor.rowcount == 0:
+                return False
+            self.entries.setdefault(channel, {})[key] = value
+            self.dirty.discard((channel, key))
+            return True
+
+    def reload(self):
+        """
+            Read entries written by other processes sharing the file, local changes not flushed yet are kept.
+        """
+        with self.flush_lock, self.lock:
+            entries: Dict[str, Dict[str, str]] = {}
+            for channel, key, value in self.connection.execute("SELECT channel, key, value FROM channel_entries"):
+                entries.setdefault(channel, {})[key] = value
+            for channel, key in self.dirty:
+                value = self.entries.get(channel, {}).get(key)
+                if value is None:
+                    entries.get(channel, {}).pop(key, None)
+                else:
+                    entries.setdefault(channel, {})[key] = value
+            self.entries = {channel: channel_entries for channel, channel_entries in entries.items() if len(channel_entries) > 0}
+
+    def request_flush(self):
+        self.flush_event.set()
+
+    def flush(self):
+        with self.flush_lock:
+            with self.lock:
+                changes = [(channel, key, self.entries.get(channel, {}).get(key)) for channel, key in self.dirty]
+                self.dirty.clear()
+            if len(changes) == 0:
+                return
+
+            try:
+                with self.connection:
+                    self.connection.execute("BEGIN")
+                    for channel, key, value in changes:
+                        if value is None:
+                            self.connection.execute("DELETE FROM channel_entries WHERE channel = ? AND key = ?", (channel, key))
+                        else:
+                            self.connection.execute("INSERT OR REPLACE INTO channel_entries (channel, key, value) VALUES (?, ?, ?)",
+                                                    (channel, key, value))
+            except Exception:
+                with self.lock:
+                    self.dirty.update((channel, key) for channel, key, _ in changes)
+                raise
+
+    def close(self):
+        if not self.stop_event.is_set():
+            self.stop_event.set()
+            self.flush_event.set()
+            self.flusher.join()
+            self.flush()
+
+    def _flush_loop(self):
+        while not self.stop_event.is_set():
+            self.flush_event.wait(self.flush_interval)
+            self.flush_event.clear()
+            try:
+                self.flush()
+            except Exception as exception:
+                print(f"Unable to save channels state: {str(exception)}")
+                metrics.ERRORS.inc("state")
@@ -0,0 +1,60 @@
+from collections import OrderedDict
+import threading
+import time
+from typing import Any, Callable, Hashable, Optional, Tuple
+
+DEFAULT_MAX_SIZE = 1024
+
+
+class TtlCache:
+    """
+        Values expire ttl seconds after being set.
+        Holds at most max_size entries, and max_bytes when set with the size of each value,
+        the least recently used one is dropped first.
+    """
+
+    def __init__(self, ttl_secs: float, max_size: int = DEFAULT_MAX_SIZE, max_bytes: Optional[int] = None) -> None:
+        self.ttl: float = ttl_secs
+        self.max_size: int = max_size
+        self.max_bytes: Optional[int] = max_bytes
+        self.entries: OrderedDict[Hashable, Tuple[float, Any, int]] = OrderedDict()  # key -> expiration time, value, size
+        self.bytes: int = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                self._delete(key)
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: Hashable, value: Any, size: int = 0):
+        with self.lock:
+            self._delete(key)
+            self.entries[key] = (time.monotonic() + self.ttl, value, size)
+            self.bytes += size
+            while len(self.entries) > self.max_size or (self.max_bytes is not None and self.bytes > self.max_bytes):
+                self._delete(next(iter(self.entries)))
+
+    def delete(self, key: Hashable):
+        with self.lock:
+            self._delete(key)
+
+    def delete_if(self, predicate: Callable[[Hashable], bool]) -> int:
+        with self.lock:
+            keys = [key for key in self.entries if predicate(key)]
+            for key in keys:
+                self._delete(key)
+            return len(keys)
+
+    def get_bytes(self) -> int:
+        return self.bytes
+
+    def _delete(self, key: Hashable):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry[2]
@@ -34,21 +34,3 @@ def get_args(command: str) -> List[str]:
 def get_today_timestamp(seconds_delta:int = 0) -> str:
     now = datetime.now() + timedelta(seconds=seconds_delta)
     return now.strftime(STAT_YOUTRACK_DATE_FORMAT)
-
-
-
-def split_string(string, max_characters):
-    lines = string.splitlines()
-
-    result = []
-    current_chunk = ""
-    for line in lines:
-        if len(current_chunk) + len(line) < max_characters:
-            current_chunk += line + "\n"
-        else:
-            result.append(current_chunk)
-            current_chunk = line + "\n"
-    
-    result.append(current_chunk)
-
-    return result
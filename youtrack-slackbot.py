@@ -1,66 +1,258 @@
-from typing import List, cast
-from flask import Flask
+import asyncio
+import hmac
+import re
+import threading
+import time
+from typing import List, Optional, Tuple, cast
+from flask import Flask, Response, jsonify, request
 from slack_bolt import App
+from slack_bolt.async_app import AsyncApp
 from slack_bolt.adapter.socket_mode import SocketModeHandler
+from slack_bolt.adapter.socket_mode.async_handler import AsyncSocketModeHandler
 from slack_bolt.adapter.flask import SlackRequestHandler
-from util import config
+from util import config, metrics
 from util.config import Config
-from util.utils import split_string, get_args, get_today_timestamp
-from youtrack.youtrack_checker import YoutrackChecker
+from util.async_command_executor import AsyncCommandExecutor
+from util.async_slack_outbox import AsyncSlackOutbox
+from util.block_kit import Message, render_blocks
+from util.command_executor import DEFAULT_COMMAND_WORKERS, CommandExecutor
+from util.slack_outbox import DEFAULT_CHANNEL_BURST, DEFAULT_CHANNEL_RATE, DEFAULT_GLOBAL_RATE, SlackOutbox
+from util.ttl_cache import TtlCache
+from util.utils import get_args, get_today_timestamp
+from youtrack.async_youtrack_checker import AsyncYoutrackChecker
+from youtrack.youtrack_checker import DIGEST_ACTION_NEXT, DIGEST_ACTION_PREVIOUS, DIGEST_ACTION_TAG, YoutrackChecker, \
+    parse_digest_action_value
 
 MSG_NO_QUERY_SET = "No query defined for this channel, first set one with `!set_query` command"
 
 SLACK_MAX_MESSAGE_SIZE = 10000
 SLACK_MAX_BLOCK_SIZE = 3000
 
+DEFAULT_METRICS_HOST = "0.0.0.0"
+DEFAULT_METRICS_PORT = 8000
+DEFAULT_HEALTH_MAX_TICK_AGE_SECS = 60
+DEFAULT_CHANNEL_NAME_TTL_SECS = 3600
+
 configuration = Config()
 
-app = Flask(__name__)
-app = App(
-    token=configuration.configuration["slack"]["bot_token"],
-    signing_secret=configuration.configuration["slack"]["signing_secret"]
-)
+ASYNC_MODE = configuration.configuration.getboolean("bot", "async_mode", fallback=False)
+COMMAND_WORKERS = configuration.configuration.getint("bot", "command_workers", fallback=DEFAULT_COMMAND_WORKERS)
+
+METRICS_ENABLED = configuration.configuration.getboolean("metrics", "enabled", fallback=False)
+HEALTH_MAX_TICK_AGE_SECS = configuration.configuration.getint("metrics", "health_max_tick_age", fallback=DEFAULT_HEALTH_MAX_TICK_AGE_SECS)
+
+WEBHOOK_ENABLED = configuration.configuration.getboolean("webhook", "enabled", fallback=False)
+WEBHOOK_TOKEN = configuration.configuration.get("webhook", "token", fallback="")
+
+# serves metrics, health check and YouTrack webhook, Slack events come through socket mode
+flask_app = Flask(__name__)
+
+if ASYNC_MODE:
+    app = AsyncApp(
+        token=configuration.configuration["slack"]["bot_token"],
+        signing_secret=configuration.configuration["slack"]["signing_secret"]
+    )
+    outbox = AsyncSlackOutbox(app.client, SLACK_MAX_MESSAGE_SIZE, SLACK_MAX_BLOCK_SIZE,
+                              channel_rate=configuration.configuration.getfloat("slack", "channel_rate", fallback=DEFAULT_CHANNEL_RATE),
+                              channel_burst=configuration.configuration.getint("slack", "channel_burst", fallback=DEFAULT_CHANNEL_BURST),
+                              global_rate=configuration.configuration.getfloat("slack", "global_rate", fallback=DEFAULT_GLOBAL_RATE))
+else:
+    app = App(
+        token=configuration.configuration["slack"]["bot_token"],
+        signing_secret=configuration.configuration["slack"]["signing_secret"]
+    )
+    outbox = SlackOutbox(app.client, SLACK_MAX_MESSAGE_SIZE, SLACK_MAX_BLOCK_SIZE,
+                         channel_rate=configuration.configuration.getfloat("slack", "channel_rate", fallback=DEFAULT_CHANNEL_RATE),
+                         channel_burst=configuration.configuration.getint("slack", "channel_burst", fallback=DEFAULT_CHANNEL_BURST),
+                         global_rate=configuration.configuration.getfloat("slack", "global_rate", fallback=DEFAULT_GLOBAL_RATE))
+
+# commands are only parsed in the Slack event handler, which returns right away, and run by the executor
+command_executor = AsyncCommandExecutor(COMMAND_WORKERS) if ASYNC_MODE else CommandExecutor(COMMAND_WORKERS)
+# channel id -> name, a renamed channel keeps its previous name until expiration
+channel_names = TtlCache(configuration.configuration.getint("bot", "channel_name_ttl", fallback=DEFAULT_CHANNEL_NAME_TTL_SECS))
 
 
-@app.event("message")
 def on_message(payload):
-    msg = ""
     channel_id = payload.get("channel", "xxx")
-    text = payload.get("text", "")
+    args = parse_command(payload.get("text", ""))
+    if args is not None:
+        command_executor.submit(channel_id, " ".join(args), lambda: _execute_command(channel_id, args))
+
+
+async def on_message_async(payload):
+    channel_id = payload.get("channel", "xxx")
+    args = parse_command(payload.get("text", ""))
+    if args is not None:
+        command_executor.submit(channel_id, " ".join(args), lambda: _execute_command_async(channel_id, args))
+
+
+def parse_command(text: str) -> Optional[List[str]]:
     args = get_args(text)
-    if len(args) > 0 and args[0][0] == "!":
+    return args if len(args) > 0 and args[0][0] == "!" else None
+
+
+def on_digest_action(ack, body, action):
+    ack()
+    channel_id, ts, page, tag = _get_digest_action(body, action)
+    # queued with the channel commands, a burst of clicks on the same button is coalesced
+    command_executor.submit(channel_id, f"digest {ts} {page} {tag}", lambda: _update_digest(channel_id, ts, page, tag))
+
+
+async def on_digest_action_async(ack, body, action):
+    await ack()
+    channel_id, ts, page, tag = _get_digest_action(body, action)
+    command_executor.submit(channel_id, f"digest {ts} {page} {tag}", lambda: _update_digest_async(channel_id, ts, page, tag))
+
+
+def _get_digest_action(body: dict, action: dict) -> Tuple[str, str, int, Optional[str]]:
+    value = action["selected_option"]["value"] if action["action_id"] == DIGEST_ACTION_TAG else action["value"]
+    page, tag = parse_digest_action_value(value)
+    return body["channel"]["id"], body["message"]["ts"], page, tag
+
+
+def _update_digest(channel_id: str, ts: str, page: int, tag: Optional[str]):
+    msg = youtrack.get_digest_page(_get_channel_name(channel_id), page, tag)
+    app.client.chat_update(channel=channel_id, ts=ts, text="Digest",
+                           blocks=render_blocks(msg, SLACK_MAX_MESSAGE_SIZE, SLACK_MAX_BLOCK_SIZE))
+
+
+async def _update_digest_async(channel_id: str, ts: str, page: int, tag: Optional[str]):
+    msg = await youtrack.get_digest_page(await _get_channel_name_async(channel_id), page, tag)
+    await app.client.chat_update(channel=channel_id, ts=ts, text="Digest",
+                                 blocks=render_blocks(msg, SLACK_MAX_MESSAGE_SIZE, SLACK_MAX_BLOCK_SIZE))
+
+
+def _get_channel_name(channel_id: str) -> str:
+    channel_name = channel_names.get(channel_id)
+    if channel_name is None:
         channel_name = cast(dict, app.client.conversations_info(
             channel=channel_id).data).get("channel", {}).get("name", channel_id)
-        msg = MSG_NO_QUERY_SET
-        match args[0]:
-            case "!set_query":
-                query = " ".join(args[1:])
-                msg = "A query already exists for this channel, delete it first."
-                if not configuration.has_channel(channel_name):
-                    configuration.set_module_value_for_channel(channel_name, config.CHANNEL_NAME_ENTRY, channel_name)
-                    configuration.set_module_value_for_channel(channel_name, config.QUERY_ENTRY, query)
-                    configuration.set_module_value_for_channel(channel_name, config.POLLING_LASTCHECK, get_today_timestamp())
-                    msg = "Query set"
-            case "!del_query":
-                if configuration.delete_channel(channel_name):
-                    msg = "Query deleted"
-            case "!show_query":
-                if configuration.has_channel(channel_name):
-                    configuration.get_module_value_for_channel(channel_name, config.QUERY_ENTRY)
-            case "!enable":
-                msg = _enable_module(args, channel_name)
-            case "!disable":
-                msg = _disable_module(args, channel_name)
-            case "!config":
-                msg = _config(channel_name)
-            case "!stats":
-                msg = _stats(args, channel_name)
-            case "!digest":
-                msg = _digest(channel_name)
-            case _:
-                msg = _help()
-        configuration.save_config()
-        send_message_to_channel(channel_name, msg)
+        channel_names.set(channel_id, channel_name)
+    return channel_name
+
+
+async def _get_channel_name_async(channel_id: str) -> str:
+    channel_name = channel_names.get(channel_id)
+    if channel_name is None:
+        channel_name = cast(dict, (await app.client.conversations_info(
+            channel=channel_id)).data).get("channel", {}).get("name", channel_id)
+        channel_names.set(channel_id, channel_name)
+    return channel_name
+
+
+def _execute_command(channel_id: str, args: List[str]):
+    channel_name = _get_channel_name(channel_id)
+    msg = _handle_command(args, channel_name)
+    configuration.save_config()
+    send_message_to_channel(channel_name, msg)
+
+
+async def _execute_command_async(channel_id: str, args: List[str]):
+    channel_name = await _get_channel_name_async(channel_id)
+    match args[0]:
+        case "!stats" if len(args) > 1:
+            msg = await youtrack.get_stats(channel_name, " ".join(args[1:]))
+        case "!digest":
+            msg = await youtrack.get_digest(channel_name)
+        case _:
+            msg = _handle_command(args, channel_name)
+    configuration.save_config()
+    send_message_to_channel(channel_name, msg)
+
+
+def _handle_command(args: List[str], channel_name: str) -> Message:
+    msg = MSG_NO_QUERY_SET
+    match args[0]:
+        case "!set_query":
+            query = " ".join(args[1:])
+            msg = "A query already exists for this channel, delete it first."
+            if not configuration.has_channel(channel_name):
+                configuration.set_module_value_for_channel(channel_name, config.CHANNEL_NAME_ENTRY, channel_name)
+                configuration.set_module_value_for_channel(channel_name, config.QUERY_ENTRY, query)
+                configuration.set_module_value_for_channel(channel_name, config.POLLING_LASTCHECK, get_today_timestamp())
+                youtrack.invalidate_channel(channel_name, query)
+                msg = "Query set"
+        case "!del_query":
+            query = configuration.get_module_value_for_channel(channel_name, config.QUERY_ENTRY)
+            if configuration.delete_channel(channel_name):
+                youtrack.invalidate_channel(channel_name, query)
+                msg = "Query deleted"
+        case "!show_query":
+            if configuration.has_channel(channel_name):
+                configuration.get_module_value_for_channel(channel_name, config.QUERY_ENTRY)
+        case "!enable":
+            msg = _enable_module(args, channel_name)
+        case "!disable":
+            msg = _disable_module(args, channel_name)
+        case "!config":
+            msg = _config(channel_name)
+        case "!stats":
+            msg = _stats(args, channel_name)
+        case "!digest":
+            msg = _digest(channel_name)
+        case _:
+            msg = _help()
+
+    return msg
+
+
+app.event("message")(on_message_async if ASYNC_MODE else on_message)
+app.action(re.compile(f"^({DIGEST_ACTION_PREVIOUS}|{DIGEST_ACTION_NEXT}|{DIGEST_ACTION_TAG})$"))(
+    on_digest_action_async if ASYNC_MODE else on_digest_action)
+metrics.SLACK_PENDING_MESSAGES.set_function(outbox.get_pending_count)
+metrics.SLACK_PENDING_COMMANDS.set_function(command_executor.get_pending_count)
+
+
+@flask_app.route("/metrics")
+def get_metrics():
+    return Response(metrics.REGISTRY.render(), content_type=metrics.CONTENT_TYPE)
+
+
+@flask_app.route("/health")
+def get_health():
+    """
+        Healthy while the scheduler ticks, a stuck poll loop makes notifications late without any error.
+    """
+    last_tick = metrics.SCHEDULER_LAST_TICK.get()
+    last_tick_age = time.time() - last_tick if last_tick is not None else None
+    healthy = last_tick_age is not None and last_tick_age <= HEALTH_MAX_TICK_AGE_SECS
+    return jsonify({
+        "status": "ok" if healthy else "late",
+        "last_tick_age_secs": last_tick_age,
+        "pending_messages": outbox.get_pending_count()
+    }), 200 if healthy else 503
+
+
+@flask_app.route("/webhook/issues", methods=["POST"])
+def on_issues_created():
+    """
+        Issue created notifications posted by a YouTrack workflow with "Authorization: Bearer <token>":
+        an issue or a list of issues in the REST API format, with the tracking fields and the ones read by channel queries.
+    """
+    if not WEBHOOK_ENABLED:
+        return jsonify({"error": "webhook disabled"}), 404
+    if WEBHOOK_TOKEN == "" or not hmac.compare_digest(request.headers.get("Authorization", ""), f"Bearer {WEBHOOK_TOKEN}"):
+        metrics.WEBHOOK_ISSUES.inc("rejected")
+        return jsonify({"error": "invalid token"}), 401
+    payload = request.get_json(silent=True)
+    issues = payload if isinstance(payload, list) else [payload]
+    if not all(isinstance(issue, dict) and "id" in issue and "idReadable" in issue for issue in issues):
+        metrics.WEBHOOK_ISSUES.inc("rejected", amount=len(issues))
+        return jsonify({"error": "expecting an issue or a list of issues with id and idReadable"}), 400
+
+    channels = {}
+    for issue in issues:
+        channels[issue["idReadable"]] = youtrack.on_issue_created(issue)
+        metrics.WEBHOOK_ISSUES.inc("notified" if len(channels[issue["idReadable"]]) > 0 else "unmatched")
+    return jsonify({"channels": channels}), 202
+
+
+def start_http_server():
+    if METRICS_ENABLED or WEBHOOK_ENABLED:
+        threading.Thread(target=flask_app.run, name="http", daemon=True, kwargs={
+            "host": configuration.configuration.get("metrics", "host", fallback=DEFAULT_METRICS_HOST),
+            "port": configuration.configuration.getint("metrics", "port", fallback=DEFAULT_METRICS_PORT)
+        }).start()
 
 
 def _enable_module(args: List[str], channel_name: str) -> str:
@@ -136,7 +328,7 @@ def _stats(args: List[str], channel_name: str) -> str:
     return msg
 
 
-def _digest(channel_name: str) -> str:
+def _digest(channel_name: str) -> Message:
     return youtrack.get_digest(channel_name)
 
 
@@ -154,26 +346,29 @@ def _help():
 """
 
 
-def send_message_to_channel(channel_name: str, message: str):
-    for chunk in split_string(message, SLACK_MAX_MESSAGE_SIZE):
-        blocks = []
-        for sub_chunk in split_string(chunk, SLACK_MAX_BLOCK_SIZE):
-            blocks.append(
-                {
-                    "type": "section",
-                    "text": {
-                        "type": "mrkdwn",
-                        "text": sub_chunk
-                    }
-                })
-        app.client.chat_postMessage(channel=channel_name,
-                                    text="digest",
-                                    blocks=blocks)
+def send_message_to_channel(channel_name: str, message: Message, coalesce: bool = False):
+    outbox.post(channel_name, message, coalesce)
+
+
+async def main_async():
+    global youtrack
+    youtrack = AsyncYoutrackChecker(configuration, send_message_to_channel)
+    start_http_server()
+    outbox.start()
+    checker_task = asyncio.create_task(youtrack.run())
+    await AsyncSocketModeHandler(
+        app, configuration.configuration["slack"]["app_token"]).start_async()
+    checker_task.cancel()
 
 
 if __name__ == "__main__":
-    handler = SlackRequestHandler(app)
-    youtrack = YoutrackChecker(configuration, send_message_to_channel)
-    youtrack.start()
-    SocketModeHandler(
-        app, configuration.configuration["slack"]["app_token"]).start()
+    if ASYNC_MODE:
+        asyncio.run(main_async())
+    else:
+        handler = SlackRequestHandler(app)
+        youtrack = YoutrackChecker(configuration, send_message_to_channel)
+        youtrack.start()
+        start_http_server()
+        outbox.start()
+        SocketModeHandler(
+            app, configuration.configuration["slack"]["app_token"]).start()
@@ -0,0 +1,224 @@
+import asyncio
+import json as json_module
+import time
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional
+
+import aiohttp
+
+from util import metrics
+from util.json_stream import JsonArrayDecoder
+from youtrack.issue import Issue
+from youtrack.response_cache import (CACHE_STATUS_HIT, CACHE_STATUS_MISS, CACHE_STATUS_SHARED, DEFAULT_CACHE_MAX_ENTRIES,
+                                     DEFAULT_CACHE_MAX_MB, DEFAULT_CACHE_TTL_SECS, CacheKey, Fetched, ResponseCache)
+from youtrack.youtrack import (COUNT_MAX_ATTEMPTS, COUNT_RETRY_DELAY_SECS, DEFAULT_MAX_CONCURRENCY, DEFAULT_MAX_RETRIES,
+                               DEFAULT_PAGE_SIZE, DEFAULT_POOL_SIZE, DEFAULT_RETRY_BACKOFF_FACTOR, REQUEST_TIMEOUT_SECS,
+                               RETRY_STATUS_CODES, STREAM_CHUNK_SIZE, PageCursor, get_count_key,
+                               get_page_key, get_page_params, get_retry_after, get_sorted_query, raise_on_error,
+                               raise_on_rate_limit, read_count)
+
+
+class AsyncResponseCache(ResponseCache):
+    """
+        ResponseCache whose fetches are coroutines, calls waiting for the one in flight await its result.
+    """
+
+    def __init__(self, ttl_secs: int = DEFAULT_CACHE_TTL_SECS, max_entries: int = DEFAULT_CACHE_MAX_ENTRIES,
+                 max_mb: int = DEFAULT_CACHE_MAX_MB) -> None:
+        super().__init__(ttl_secs, max_entries, max_mb)
+        self.in_flight_tasks: Dict[CacheKey, asyncio.Future] = {}
+
+    async def get_async(self, key: CacheKey, fetch: Callable[[], Awaitable[Fetched]]) -> Any:
+        response = self.responses.get(key)
+        if response is not None:
+            metrics.YOUTRACK_CACHE_REQUESTS.inc(CACHE_STATUS_HIT)
+            return response
+        future = self.in_flight_tasks.get(key)
+        if future is not None:
+            metrics.YOUTRACK_CACHE_REQUESTS.inc(CACHE_STATUS_SHARED)
+            return await asyncio.shield(future)
+
+        metrics.YOUTRACK_CACHE_REQUESTS.inc(CACHE_STATUS_MISS)
+        future = self.in_flight_tasks[key] = asyncio.get_running_loop().create_future()
+        generation = self.generation
+        try:
+            response, size = await fetch()
+            self._store(key, response, size, generation)
+            future.set_result(response)
+            return response
+        except Exception as exception:
+            future.set_exception(exception)
+            future.exception()  # retrieved here when nobody else waits for it
+            raise
+        finally:
+            del self.in_flight_tasks[key]
+            if not future.done():
+                future.cancel()  # fetch cancelled, so are the waiting calls
+
+
+class AsyncYoutrack:
+    """
+        asyncio counterpart of the Youtrack client, with the same paging, count and retry behavior.
+        The aiohttp session is created on first use so that it belongs to the running event loop.
+    """
+
+    def __init__(self, base_url: str, authorization_header: str, api_endpoint: str, issue_id_field: str, all_issue_fields: str, max_issues: int,
+                 pool_size: int = DEFAULT_POOL_SIZE, max_retries: int = DEFAULT_MAX_RETRIES, retry_backoff_factor: float = DEFAULT_RETRY_BACKOFF_FACTOR,
+                 page_size: int = DEFAULT_PAGE_SIZE, prefetch_next_page: bool = False,
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY, response_cache: bool = False,
+                 response_cache_ttl: int = DEFAULT_CACHE_TTL_SECS, response_cache_max_entries: int = DEFAULT_CACHE_MAX_ENTRIES,
+                 response_cache_max_mb: int = DEFAULT_CACHE_MAX_MB):
+        self.base_url: str = base_url
+        self.max_issues = max_issues
+        self.page_size = page_size
+        self.prefetch_next_page = prefetch_next_page
+        self.all_issue_fields = all_issue_fields
+        self.issue_id_field = issue_id_field
+        self.pool_size: int = pool_size
+        self.max_retries: int = max_retries
+        self.retry_backoff_factor: float = retry_backoff_factor
+        # requests in flight from every module and command of this bot, a slot is not held while waiting to retry
+        self.concurrency = asyncio.Semaphore(max_concurrency)
+        self.cache: Optional[AsyncResponseCache] = None
+        if response_cache:
+            self.cache = AsyncResponseCache(response_cache_ttl, response_cache_max_entries, response_cache_max_mb)
+
+        self.headers = {
+            'Authorization': authorization_header,
+            'Accept': 'application/json',
+            'Accept-Encoding': 'gzip, deflate'
+        }
+
+        self.api_endpoint: str = api_endpoint
+        self.session: Optional[aiohttp.ClientSession] = None
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(headers=self.headers,
+                                                 connector=aiohttp.TCPConnector(limit=self.pool_size),
+                                                 timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT_SECS))
+        return self.session
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+
+    async def _request(self, operation: str, method: str, path: str, params: dict, json: Optional[dict] = None,
+                       records: bool = False) -> Fetched:
+        """
+            With records, the response is decoded as it is received into a list of Issue records.
+        """
+        try:
+            for attempt in range(self.max_retries + 1):
+                async with self.concurrency:
+                    start = time.perf_counter()
+                    async with self._get_session().request(method, f"{self.api_endpoint}{path}", params=params, json=json) as response:
+                        if response.status not in RETRY_STATUS_CODES or attempt == self.max_retries:
+                            raise_on_rate_limit(response.status, response.headers.get("Retry-After"))
+                            result, size = await self._read(response, records)
+                            metrics.YOUTRACK_REQUEST_SECONDS.observe(time.perf_counter() - start, operation, metrics.current_module.get())
+                            metrics.YOUTRACK_RESPONSE_BYTES.observe(size, operation)
+                            return result, size
+                        delay = get_retry_after(response.headers.get("Retry-After")) or self.retry_backoff_factor * (2 ** attempt)
+                await asyncio.sleep(delay)
+        except Exception:
+            metrics.ERRORS.inc("youtrack")
+            raise
+
+    async def _read(self, response: aiohttp.ClientResponse, records: bool):
+        if records:
+            return await self._read_records(response)
+        content = await response.read()
+        payload = json_module.loads(content)
+        raise_on_error(payload)
+        return payload, len(content)
+
+    @staticmethod
+    async def _read_records(response: aiohttp.ClientResponse):
+        issues: List[Issue] = []
+        size = 0
+        decoder = JsonArrayDecoder()
+        async for chunk in response.content.iter_chunked(STREAM_CHUNK_SIZE):
+            size += len(chunk)
+            issues.extend(Issue.from_json(issue) for issue in decoder.feed(chunk))
+        issues.extend(Issue.from_json(issue) for issue in decoder.close())
+        if decoder.value is not None:
+            raise_on_error(decoder.value)
+            raise Exception(f"Unexpected YouTrack response: {decoder.value}")
+        return issues, size
+
+    def iter_issues(self, query: str, only_issue_ids: bool = False, page_size: Optional[int] = None,
+                    prefetch: Optional[bool] = None, fields: Optional[str] = None,
+                    max_issues: Optional[int] = None, cached: bool = True) -> AsyncIterator[dict]:
+        return self._iter_pages(self._get_page, "issues", query, only_issue_ids, page_size, prefetch, fields,
+                                max_issues, cached)
+
+    def iter_issue_records(self, query: str, only_issue_ids: bool = False, page_size: Optional[int] = None,
+                           prefetch: Optional[bool] = None, fields: Optional[str] = None,
+                           max_issues: Optional[int] = None, cached: bool = True) -> AsyncIterator[Issue]:
+        return self._iter_pages(self._get_record_page, "records", query, only_issue_ids, page_size, prefetch, fields,
+                                max_issues, cached)
+
+    async def get_issue_page(self, query: str, skip: int, top: int, fields: Optional[str] = None,
+                             cached: bool = True) -> List[Issue]:
+        fields = fields or self.all_issue_fields
+        query = get_sorted_query(query)
+        return await self._get_response(cached, get_page_key("records", query, fields, skip, top),
+                                        lambda: self._get_record_page(query, fields, skip, top))
+
+    def invalidate_cache(self, query: str):
+        if self.cache is not None:
+            self.cache.invalidate(query)
+
+    async def _get_response(self, cached: bool, key: CacheKey, fetch: Callable[[], Awaitable[Fetched]]):
+        if cached and self.cache is not None:
+            return await self.cache.get_async(key, fetch)
+        return (await fetch())[0]
+
+    async def _iter_pages(self, get_page: Callable[[str, str, int, int], Awaitable[Fetched]], kind: str, query: str,
+                          only_issue_ids: bool, page_size: Optional[int], prefetch: Optional[bool],
+                          fields: Optional[str], max_issues: Optional[int], cached: bool) -> AsyncIterator:
+        cursor = PageCursor(page_size or self.page_size, max_issues or self.max_issues)
+        prefetch = self.prefetch_next_page if prefetch is None else prefetch
+        if fields is None:
+            fields = self.all_issue_fields if not only_issue_ids else self.issue_id_field
+        query = get_sorted_query(query)
+
+        def get_response(skip: int, top: int) -> Awaitable[list]:
+            return self._get_response(cached, get_page_key(kind, query, fields, skip, top),
+                                      lambda: get_page(query, fields, skip, top))
+
+        page = await get_response(*cursor.first())
+        while len(page) > 0:
+            next_window = cursor.advance(len(page))
+            next_page: Optional[asyncio.Task] = None
+            if prefetch and next_window is not None:
+                next_page = asyncio.create_task(get_response(*next_window))
+
+            for issue in page:
+                yield issue
+
+            if next_window is None:
+                break
+            page = await next_page if next_page is not None else await get_response(*next_window)
+
+    async def _get_page(self, query: str, fields: str, skip: int, top: int) -> Fetched:
+        return await self._request("issues", "GET", "/issues", get_page_params(query, fields, skip, top))
+
+    async def _get_record_page(self, query: str, fields: str, skip: int, top: int) -> Fetched:
+        return await self._request("issues", "GET", "/issues", get_page_params(query, fields, skip, top), records=True)
+
+    async def count_issues(self, query: str, cached: bool = True) -> int:
+        return await self._get_response(cached, get_count_key(query), lambda: self._fetch_count(query))
+
+    async def _fetch_count(self, query: str) -> Fetched:
+        return await self._count_issues(query), 0
+
+    async def _count_issues(self, query: str) -> int:
+        for _ in range(COUNT_MAX_ATTEMPTS):
+            result, _ = await self._request("count", "POST", "/issuesGetter/count", {"fields": "count"}, json={"query": query})
+            count = read_count(result)
+            if count is not None:
+                return count
+            await asyncio.sleep(COUNT_RETRY_DELAY_SECS)
+
+        raise Exception(f"YouTrack did not compute issue count for query: {query}")
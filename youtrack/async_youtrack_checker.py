@@ -0,0 +1,189 @@
+import asyncio
+from datetime import datetime
+from typing import AsyncIterator, Callable, Dict, Iterable, Optional, Set, Tuple
+
+from util import config, metrics
+from util.block_kit import Message
+from util.config import Config
+from util.schedule import ModuleSchedule
+from youtrack.async_youtrack import AsyncYoutrack
+from youtrack.scheduler import DEFAULT_GRACE_PERIOD_SECS, ScheduledJob, Scheduler
+from youtrack.youtrack_checker import (DIGEST_FIELD_PROFILE, NO_TICKET, TRACKING_FIELD_PROFILE, BaseYoutrackChecker,
+                                       get_youtrack_settings)
+from youtrack.youtrack_stats import STATS_BY_TAG_FIELD_PROFILE, Stats, add_issue_tags
+
+DEFAULT_ASYNC_CONCURRENCY = 100
+# features only implemented by the threaded checker
+ASYNC_UNSUPPORTED_SETTINGS = [("youtrack", "shared_tracking"), ("youtrack", "issue_mirror"), ("rollups", "enabled")]
+
+
+class AsyncScheduler(Scheduler):
+    """
+        Scheduler running due jobs as asyncio tasks on the event loop, at most max_concurrency at a time.
+    """
+
+    def __init__(self, jobs_provider: Callable[[], Iterable[Tuple[str, str, ModuleSchedule]]],
+                 execute_cb: Callable,
+                 invalid_schedule_cb: Callable[[str, str, ModuleSchedule], None],
+                 polling_interval: int,
+                 module_polling_intervals: Optional[Dict[str, int]] = None,
+                 max_concurrency: int = DEFAULT_ASYNC_CONCURRENCY,
+                 grace_period_secs: int = DEFAULT_GRACE_PERIOD_SECS) -> None:
+        super().__init__(jobs_provider, execute_cb, invalid_schedule_cb, polling_interval,
+                         module_polling_intervals=module_polling_intervals, grace_period_secs=grace_period_secs)
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.tasks: Set[asyncio.Task] = set()
+
+    async def run(self):
+        while not self.stop_event.is_set():
+            self.tick(datetime.now())
+            await asyncio.sleep(self._get_sleep_duration(datetime.now()))
+
+    def _submit(self, job: ScheduledJob, fire_at: datetime):
+        task = asyncio.get_running_loop().create_task(self._run_job(job, fire_at))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+
+    async def _run_job(self, job: ScheduledJob, fire_at: datetime):
+        try:
+            async with self.semaphore:
+                self._observe_lag(job, fire_at)
+                await self.execute_cb(job.channel_name, job.module, job.module_schedule)
+        finally:
+            self._on_job_done(job.key)
+
+
+class AsyncYoutrackChecker(BaseYoutrackChecker):
+    def __init__(self, configuration: Config, send_message_to_channel_cb) -> None:
+        unsupported = [f"[{section}] {key}" for section, key in ASYNC_UNSUPPORTED_SETTINGS
+                       if configuration.configuration.getboolean(section, key, fallback=False)]
+        if len(unsupported) > 0:
+            raise Exception(f"{', '.join(unsupported)} not supported with [bot] async_mode, disable them or async_mode")
+        super().__init__(configuration, send_message_to_channel_cb)
+        self.youtrack: AsyncYoutrack = AsyncYoutrack(**get_youtrack_settings(configuration.configuration["youtrack"]))
+        if self.youtrack.cache is not None:
+            metrics.YOUTRACK_CACHE_BYTES.set_function(self.youtrack.cache.get_bytes)
+        self.scheduler: AsyncScheduler = AsyncScheduler(
+            jobs_provider=self._get_scheduled_jobs,
+            execute_cb=self._execute_scheduled_job,
+            invalid_schedule_cb=self._on_invalid_schedule,
+            polling_interval=self.polling_interval,
+            module_polling_intervals={config.MODULE_TRACKING: self.tracking_interval},
+            max_concurrency=configuration.configuration.getint("scheduler", "async_concurrency", fallback=DEFAULT_ASYNC_CONCURRENCY),
+            grace_period_secs=configuration.configuration.getint("scheduler", "grace_period", fallback=DEFAULT_GRACE_PERIOD_SECS))
+
+    async def run(self):
+        if self.cluster is not None:
+            self.cluster.start(self._get_cluster_channels)
+        try:
+            await self.scheduler.run()
+        finally:
+            await self.youtrack.close()
+
+    async def _execute_scheduled_job(self, channel_name: str, module: str, module_schedule: ModuleSchedule):
+        frequency = module_schedule.frequency
+        metrics.current_module.set(module)  # each job runs in its own task context
+        try:
+            await self._execute_module(module, frequency, channel_name)
+        except Exception as exception:
+            print(f"Error processing module '{module}' for frequency '{frequency}' : {str(exception)}")
+            metrics.ERRORS.inc("module")
+
+    async def _execute_module(self, module: str, frequency: str, channel_name: str):
+        match module:
+            case config.MODULE_TRACKING if self._is_tracking_due(channel_name, frequency):
+                await self._tracking(channel_name)
+            case config.MODULE_DIGEST:
+                await self._digest(channel_name)
+            case config.MODULE_STATS:
+                await self._stats(channel_name, frequency)
+
+    async def _digest(self, channel_name: str):
+        msg = await self.get_digest(channel_name)
+        self.send_message_to_channel_cb(
+            channel_name=channel_name, message=msg)
+
+    async def _tracking(self, channel_name: str):
+        try:
+            issue_count = await self._poll_new_issues(channel_name)
+        except Exception as exception:
+            self.tracking_cadence.on_error(channel_name, exception)
+            raise
+        self._on_tracking_poll(channel_name, issue_count)
+
+    async def _poll_new_issues(self, channel_name: str) -> int:
+        issue_count = 0
+        query, last_poll = self._get_tracking_query(channel_name)
+        async for issue in self.youtrack.iter_issue_records(query, fields=self.fields[TRACKING_FIELD_PROFILE.name], cached=False):
+            issue_count += 1
+            self._notify_new_issue(channel_name, issue)
+        self._set_last_check(channel_name, last_poll)
+        return issue_count
+
+    async def _stats(self, channel_name: str, frequency: str):
+        period = self.get_beginning_end_from_frequency(frequency)
+
+        msg = await self.get_stats(channel_name, period)
+        self.send_message_to_channel_cb(
+            channel_name=channel_name, message=msg)
+
+    async def get_digest(self, channel_name: str) -> Message:
+        if self.digest_paginated:
+            return await self.get_digest_page(channel_name)
+        return self._iter_digest_lines(channel_name)
+
+    async def _iter_digest_lines(self, channel_name: str) -> AsyncIterator[str]:
+        issue_count = 0
+        try:
+            issues = self.youtrack.iter_issue_records(
+                f"""#Unresolved {self.config.get_module_value_for_channel(channel_name, config.QUERY_ENTRY)}""",
+                fields=self.fields[DIGEST_FIELD_PROFILE.name])
+            async for issue in issues:
+                if issue_count == 0:
+                    for line in self._get_digest_header():
+                        yield line
+                issue_count += 1
+                yield self._get_digest_line(issue)
+            if issue_count == 0:
+                yield NO_TICKET
+            metrics.CHANNEL_UNRESOLVED_ISSUES.set(issue_count, channel_name)
+        except Exception as exception:
+            yield str(exception)
+
+    async def get_digest_page(self, channel_name: str, page: int = 0, tag: Optional[str] = None) -> Message:
+        msg: Message = NO_TICKET
+        try:
+            query = self._get_digest_query(self.config.get_module_value_for_channel(channel_name, config.QUERY_ENTRY), tag)
+            issue_count = await self.youtrack.count_issues(query)
+            page = min(page, self._get_digest_page_count(issue_count) - 1)
+            issues = await self.youtrack.get_issue_page(query, page * self.digest_page_size, self.digest_page_size,
+                                                        fields=self.fields[DIGEST_FIELD_PROFILE.name])
+            if tag is None:
+                metrics.CHANNEL_UNRESOLVED_ISSUES.set(issue_count, channel_name)
+            msg = self._get_digest_page_message(issues, issue_count, page, tag)
+        except Exception as exception:
+            msg = str(exception)
+
+        return msg
+
+    async def get_stats(self, channel_name: str, period: str) -> str:
+        try:
+            stats = Stats(self.config.get_module_value_for_channel(channel_name, config.QUERY_ENTRY), period)
+            count_queries = stats.get_count_queries()
+            *counts, stats.ticket_count_by_tag = await asyncio.gather(
+                *[self.youtrack.count_issues(count_query) for _, count_query in count_queries],
+                self._count_issues_by_tag(stats.unresolved_query))
+            stats.set_counts({attribute: count for (attribute, _), count in zip(count_queries, counts)})
+            metrics.CHANNEL_UNRESOLVED_ISSUES.set(stats.all_time_unresolved_count, channel_name)
+            msg: str = self._get_stats_markdown(stats, period)
+        except Exception as exception:
+            msg = str(exception)
+
+        return msg
+
+    async def _count_issues_by_tag(self, query: str) -> Dict[str, int]:
+        ticket_count_by_tag: Dict[str, int] = {}
+        async for issue in self.youtrack.iter_issues(query, fields=self.fields[STATS_BY_TAG_FIELD_PROFILE.name]):
+            add_issue_tags(ticket_count_by_tag, issue)
+
+        return ticket_count_by_tag
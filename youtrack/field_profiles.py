@@ -0,0 +1,102 @@
+from configparser import SectionProxy
+from typing import Dict, List, Optional
+
+FIELDS_SECTION = "fields"
+
+# a YouTrack fields projection as a tree, eg: "id,reporter(email)" -> {"id": {}, "reporter": {"email": {}}}
+FieldTree = Dict[str, dict]
+
+
+class FieldProfile:
+    """
+        Fields requested to YouTrack by one kind of call, declared next to the code reading the issues.
+        required is what this code reads: a profile can be overridden in the [fields] section with more fields,
+        never with less.
+    """
+    __slots__ = ("name", "required")
+
+    def __init__(self, name: str, required: str) -> None:
+        self.name: str = name
+        self.required: str = required
+
+
+def parse_fields(fields: str) -> FieldTree:
+    tree: FieldTree = {}
+    stack: List[FieldTree] = [tree]
+    name = ""
+    for char in fields + ",":
+        match char:
+            case "(":
+                stack.append(stack[-1].setdefault(name.strip(), {}))
+                name = ""
+            case ")" | ",":
+                if name.strip() != "":
+                    stack[-1].setdefault(name.strip(), {})
+                name = ""
+                if char == ")":
+                    if len(stack) == 1:
+                        raise ValueError(f"Unbalanced parenthesis in fields: {fields}")
+                    stack.pop()
+            case _:
+                name += char
+    if len(stack) != 1:
+        raise ValueError(f"Unbalanced parenthesis in fields: {fields}")
+
+    return tree
+
+
+def format_fields(tree: FieldTree) -> str:
+    return ",".join(f"{name}({format_fields(subtree)})" if len(subtree) > 0 else name for name, subtree in tree.items())
+
+
+def merge_fields(*fields: str) -> str:
+    """
+        Union of projections, each field requested once (eg: a profile and what a matcher needs).
+    """
+    tree: FieldTree = {}
+    for projection in fields:
+        _merge(tree, parse_fields(projection))
+    return format_fields(tree)
+
+
+def get_missing_fields(fields: str, required: str) -> List[str]:
+    return _get_missing(parse_fields(fields), parse_fields(required), "")
+
+
+def load_field_profiles(profiles: List[FieldProfile], fields_config: Optional[SectionProxy]) -> Dict[str, str]:
+    """
+        Resolve the fields of each profile, from the [fields] section when overridden, from its requirements otherwise.
+        Raise at startup on an unknown profile or on an override missing fields read by the code.
+    """
+    resolved: Dict[str, str] = {profile.name: profile.required for profile in profiles}
+    if fields_config is None:
+        return resolved
+
+    for name, fields in fields_config.items():
+        if name not in resolved:
+            raise Exception(f"Unknown field profile [{FIELDS_SECTION}] {name}, expected one of {', '.join(resolved)}")
+    for profile in profiles:
+        fields = fields_config.get(profile.name, fallback=None)
+        if fields is None:
+            continue
+        missing = get_missing_fields(fields, profile.required)
+        if len(missing) > 0:
+            raise Exception(f"[{FIELDS_SECTION}] {profile.name} misses fields read by the bot: {', '.join(missing)}")
+        resolved[profile.name] = fields
+
+    return resolved
+
+
+def _merge(tree: FieldTree, other: FieldTree):
+    for name, subtree in other.items():
+        _merge(tree.setdefault(name, {}), subtree)
+
+
+def _get_missing(tree: FieldTree, required: FieldTree, prefix: str) -> List[str]:
+    missing: List[str] = []
+    for name, subtree in required.items():
+        if name not in tree:
+            missing.append(f"{prefix}{name}")
+        else:
+            missing.extend(_get_missing(tree[name], subtree, f"{prefix}{name}."))
+    return missing
@@ -0,0 +1,34 @@
+from typing import Optional, Tuple
+
+
+class Issue:
+    """
+        Compact record of the issue fields rendered in Slack, built while decoding YouTrack responses
+        so that the rest of the payload (custom fields, project, ...) is dropped right away.
+        created and resolved are timestamps in ms, created is 0 when missing so that it can be used as a sort key.
+    """
+    __slots__ = ("id", "id_readable", "summary", "created", "resolved", "reporter_email", "tags")
+
+    def __init__(self, id: str, id_readable: str, summary: str, created: int, resolved: Optional[int],
+                 reporter_email: Optional[str], tags: Tuple[str, ...]) -> None:
+        self.id: str = id
+        self.id_readable: str = id_readable
+        self.summary: str = summary
+        self.created: int = created
+        self.resolved: Optional[int] = resolved
+        self.reporter_email: Optional[str] = reporter_email
+        self.tags: Tuple[str, ...] = tags
+
+    @staticmethod
+    def from_json(issue: dict) -> "Issue":
+        reporter = issue.get("reporter") or {}
+        return Issue(issue.get("id", ""),
+                     issue.get("idReadable", ""),
+                     issue.get("summary") or "",
+                     issue.get("created") or 0,
+                     issue.get("resolved"),
+                     reporter.get("email"),
+                     tuple(tag.get("name", "") for tag in issue.get("tags") or []))
+
+    def __repr__(self) -> str:
+        return f"Issue({self.id_readable})"
@@ -0,0 +1,111 @@
+from datetime import datetime, timedelta
+from operator import attrgetter
+import threading
+from typing import Dict, List, Optional
+
+from util.utils import STAT_YOUTRACK_DATE_FORMAT
+from youtrack.field_profiles import merge_fields
+from youtrack.issue import Issue
+from youtrack.youtrack import Youtrack
+
+DEFAULT_MIRROR_MAX_AGE_SECS = 60
+# updated dates are compared at second precision and clocks may differ slightly, re-read a small overlap
+SYNC_OVERLAP = timedelta(seconds=60)
+# read by _sync, on top of the fields of the issues served
+MIRROR_ISSUE_FIELDS = "id,resolved"
+
+
+class IssueMirror:
+    """
+        Local copy of the unresolved issues of a channel query as compact Issue records, keyed by issue id.
+        After a first full load, it is refreshed with delta queries on updated date:
+        updated issues are replaced, the ones which got resolved are dropped.
+        The unresolved count is then checked against YouTrack, on mismatch (eg: an issue left the query
+        because of a field change) issue ids are re-synchronized.
+    """
+
+    def __init__(self, youtrack: Youtrack, query: str, fields: str, max_age_secs: int = DEFAULT_MIRROR_MAX_AGE_SECS) -> None:
+        self.youtrack: Youtrack = youtrack
+        self.query: str = query
+        self.fields: str = fields
+        self.max_age: timedelta = timedelta(seconds=max_age_secs)
+        self.issues: Dict[str, Issue] = {}
+        self.last_sync: Optional[datetime] = None
+        self.lock = threading.Lock()
+
+    @property
+    def unresolved_query(self) -> str:
+        return f"#Unresolved {self.query}"
+
+    def is_fresh(self) -> bool:
+        return self.last_sync is not None and datetime.now() - self.last_sync < self.max_age
+
+    def get_issues(self) -> List[Issue]:
+        """
+            Unresolved issues sorted by creation date, refreshed first if the mirror is older than max age.
+        """
+        self.refresh_if_stale()
+        with self.lock:
+            return sorted(self.issues.values(), key=attrgetter("created"))
+
+    def get_count(self) -> int:
+        self.refresh_if_stale()
+        with self.lock:
+            return len(self.issues)
+
+    def refresh_if_stale(self):
+        if not self.is_fresh():
+            self.refresh()
+
+    def refresh(self):
+        with self.lock:
+            now = datetime.now().replace(microsecond=0)
+            if self.last_sync is None:
+                self._load()
+            else:
+                self._sync(self.last_sync - SYNC_OVERLAP, now)
+            self.last_sync = now
+
+    def _load(self):
+        self.issues = {issue.id: issue for issue in self.youtrack.iter_issue_records(self.unresolved_query, fields=self.fields, cached=False)}
+
+    def _sync(self, since: datetime, until: datetime):
+        updated_query = (f"{self.query} updated: {since.strftime(STAT_YOUTRACK_DATE_FORMAT)} .. "
+                         f"{until.strftime(STAT_YOUTRACK_DATE_FORMAT)}")
+        for issue in self.youtrack.iter_issue_records(updated_query, fields=self.fields, cached=False):
+            if issue.resolved is None:
+                self.issues[issue.id] = issue
+            else:
+                self.issues.pop(issue.id, None)
+
+        if self.youtrack.count_issues(self.unresolved_query, cached=False) != len(self.issues):
+            ids = {issue["id"] for issue in self.youtrack.iter_issues(self.unresolved_query, fields="id", cached=False)}
+            for issue_id in set(self.issues) - ids:
+                del self.issues[issue_id]
+            if len(ids - set(self.issues)) > 0:
+                self._load()
+
+
+class IssueMirrors:
+    """
+        One mirror per channel, rebuilt when the channel query changes.
+    """
+
+    def __init__(self, youtrack: Youtrack, fields: str, max_age_secs: int = DEFAULT_MIRROR_MAX_AGE_SECS) -> None:
+        self.youtrack: Youtrack = youtrack
+        self.fields: str = merge_fields(MIRROR_ISSUE_FIELDS, fields)
+        self.max_age_secs: int = max_age_secs
+        self.mirrors: Dict[str, IssueMirror] = {}
+        self.lock = threading.Lock()
+
+    def get_mirror(self, channel_name: str, query: str) -> IssueMirror:
+        with self.lock:
+            mirror = self.mirrors.get(channel_name)
+            if mirror is None or mirror.query != query:
+                mirror = IssueMirror(self.youtrack, query, self.fields, self.max_age_secs)
+                self.mirrors[channel_name] = mirror
+            return mirror
+
+    def invalidate(self, channel_name: str):
+        with self.lock:
+            self.mirrors.pop(channel_name, None)
@@ -0,0 +1,95 @@
+from datetime import datetime, timedelta
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from util.config import ChannelRecord, Config
+from youtrack.query_matcher import QueryMatcher, compile_query
+
+DEFAULT_SWEEP_INTERVAL_SECS = 900
+
+
+class PushTracking:
+    """
+        Route the issues pushed by a YouTrack workflow to the polling tracking channels whose query matches,
+        so that they are notified without waiting for the next poll.
+        For those channels, polling becomes a reconciliation sweep run every sweep_interval, for the issues the push
+        missed (bot down, workflow error). Both paths claim an issue id per channel before posting it, so that each
+        issue is notified once. Channels whose query the matcher cannot evaluate never get a push and keep polling.
+        Claims are kept in the channel state, so that they survive a restart, until a sweep of the channel
+        has read past them.
+    """
+
+    def __init__(self, configuration: Config, sweep_interval_secs: int = DEFAULT_SWEEP_INTERVAL_SECS) -> None:
+        self.config: Config = configuration
+        self.sweep_interval: timedelta = timedelta(seconds=sweep_interval_secs)
+        self.last_sweeps: Dict[str, datetime] = {}
+        self.matchers: Dict[str, Tuple[str, Optional[QueryMatcher]]] = {}  # channel -> query, matcher
+        self.lock = threading.Lock()
+
+    def get_matching_channels(self, channels: List[ChannelRecord], issue: dict) -> List[str]:
+        """
+            Channels tracking by polling whose query matches the issue and which were not notified of it yet.
+            Claims the issue for the returned channels.
+        """
+        matching_channels: List[str] = []
+        for channel in channels:
+            matcher = self._get_matcher(channel)
+            if matcher is not None and matcher.matches(issue) and self.claim(channel.name, issue["id"]):
+                matching_channels.append(channel.name)
+        return matching_channels
+
+    def is_pushed(self, channel: ChannelRecord) -> bool:
+        return self._get_matcher(channel) is not None
+
+    def claim(self, channel_name: str, issue_id: str) -> bool:
+        """
+            Return True if the issue was not notified to the channel yet, and record it as notified.
+        """
+        with self.lock:
+            pushed_issues = self.config.get_pushed_issues(channel_name)
+            if issue_id in pushed_issues:
+                return False
+            pushed_issues[issue_id] = datetime.now().timestamp()
+            self.config.set_pushed_issues(channel_name, pushed_issues)
+            return True
+
+    def start_sweep(self, channel_name: str, now: Optional[datetime] = None) -> bool:
+        """
+            Return True when the channel reconciliation sweep is due, and record it as started.
+        """
+        now = now or datetime.now()
+        with self.lock:
+            last_sweep = self.last_sweeps.get(channel_name)
+            if last_sweep is not None and now - last_sweep < self.sweep_interval:
+                return False
+            self.last_sweeps[channel_name] = now
+            return True
+
+    def end_sweep(self, channel_name: str):
+        """
+            Called once the channel poll succeeded: it read every issue created before the last check it saved,
+            so claims made before can no longer be read again and are dropped.
+        """
+        with self.lock:
+            pushed_issues = self.config.get_pushed_issues(channel_name)
+            if len(pushed_issues) == 0 or self.config.get_channel(channel_name) is None:
+                return
+            # the last check is one second past the end of what the poll read
+            read_until = (self.config.get_last_check_for_channel(channel_name) - timedelta(seconds=1)).timestamp()
+            kept = {issue_id: claimed_at for issue_id, claimed_at in pushed_issues.items() if claimed_at >= read_until}
+            if len(kept) < len(pushed_issues):
+                self.config.set_pushed_issues(channel_name, kept)
+
+    def invalidate(self, channel_name: str):
+        with self.lock:
+            self.last_sweeps.pop(channel_name, None)
+            self.matchers.pop(channel_name, None)
+
+    def _get_matcher(self, channel: ChannelRecord) -> Optional[QueryMatcher]:
+        # None for channels whose query cannot be evaluated locally
+        with self.lock:
+            query, matcher = self.matchers.get(channel.name, (None, None))
+            if query != channel.query:
+                matcher = compile_query(channel.query)
+                self.matchers[channel.name] = (channel.query, matcher)
+            return matcher
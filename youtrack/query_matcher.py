@@ -0,0 +1,125 @@
+import re
+from typing import Callable, List, Optional, Set
+
+UNRESOLVED = "#unresolved"
+RESOLVED = "#resolved"
+UNASSIGNED = "unassigned"
+
+# fields needed on each issue to evaluate a query locally
+MATCHER_ISSUE_FIELDS = "project(shortName,name),resolved,tags(name),customFields(name,value(name,login,presentation))"
+
+TERM_PATTERN = re.compile(r"""\s*(?:
+    (?P<hash>\#(?:\{[^}]*\}|[^\s{}:,]+))
+    |
+    (?P<field>\{[^}]*\}|[\w.\-]+)\s*:\s*(?P<values>(?:\{[^}]*\}|[^\s{},:]+)(?:\s*,\s*(?:\{[^}]*\}|[^\s{},:]+))*)
+    )\s*""", re.VERBOSE)
+VALUE_PATTERN = re.compile(r"\{[^}]*\}|[^\s{},]+")
+# keywords and attributes whose semantic cannot be evaluated from the issue fields we fetch
+UNSUPPORTED_FIELDS = {"created", "updated", "resolved", "resolved date", "updated by", "commenter", "has",
+                      "issue id", "summary", "description", "comments", "sort by", "in", "for", "by",
+                      "visible to", "links", "mentions", "saved search", "looks like", "reporter", "version"}
+UNSUPPORTED_WORDS = {"and", "or", "not"}
+# values YouTrack resolves (current user, state or date keywords), they cannot be compared as text
+KEYWORD_VALUES = {"me", "unresolved", "resolved", "empty", "today", "yesterday", "tomorrow",
+                  "this week", "last week", "next week", "this month", "last month", "next month",
+                  "this year", "last year", "next year"}
+
+
+class QueryMatcher:
+    """
+        Local evaluation of the subset of YouTrack queries made of implicit AND terms:
+        #Unresolved, #Resolved, project: X, tag: X and <custom field>: value[, value].
+    """
+
+    def __init__(self, query: str, predicates: List[Callable[[dict], bool]], projects: Set[str]) -> None:
+        self.query: str = query
+        self.predicates: List[Callable[[dict], bool]] = predicates
+        self.projects: Set[str] = projects
+
+    def matches(self, issue: dict) -> bool:
+        return all(predicate(issue) for predicate in self.predicates)
+
+
+def compile_query(query: str) -> Optional[QueryMatcher]:
+    """
+        Return a matcher for the query, or None when the query uses syntax the matcher cannot evaluate
+        (in which case the query has to be sent to YouTrack).
+    """
+    predicates: List[Callable[[dict], bool]] = []
+    projects: Set[str] = set()
+    position = 0
+    while position < len(query):
+        term = TERM_PATTERN.match(query, position)
+        if term is None or term.end() == position:
+            return None
+        position = term.end()
+
+        if term.group("hash") is not None:
+            hash_term = term.group("hash").lower()
+            if hash_term == UNRESOLVED:
+                predicates.append(lambda issue: issue.get("resolved") is None)
+            elif hash_term == RESOLVED:
+                predicates.append(lambda issue: issue.get("resolved") is not None)
+            else:
+                return None  # #value matches any field or tag in YouTrack
+            continue
+
+        field = _unbrace(term.group("field")).lower()
+        values = {_unbrace(value).lower() for value in VALUE_PATTERN.findall(term.group("values"))}
+        if field.startswith("-") or field in UNSUPPORTED_FIELDS or field in UNSUPPORTED_WORDS:
+            return None  # -field: value excludes the values
+        if any(value.startswith("-") or "*" in value or value in KEYWORD_VALUES for value in values):
+            return None
+
+        match field:
+            case "project":
+                projects |= values
+                predicates.append(_project_predicate(values))
+            case "tag" | "tags":
+                predicates.append(_tag_predicate(values))
+            case _:
+                predicates.append(_custom_field_predicate(field, values))
+
+    return QueryMatcher(query, predicates, projects)
+
+
+def _unbrace(value: str) -> str:
+    value = value.strip()
+    if value.startswith("{") and value.endswith("}"):
+        value = value[1:-1]
+    return value.strip()
+
+
+def _project_predicate(values: Set[str]) -> Callable[[dict], bool]:
+    def predicate(issue: dict) -> bool:
+        project = issue.get("project") or {}
+        return (project.get("shortName") or "").lower() in values or (project.get("name") or "").lower() in values
+    return predicate
+
+
+def _tag_predicate(values: Set[str]) -> Callable[[dict], bool]:
+    def predicate(issue: dict) -> bool:
+        return any((tag.get("name") or "").lower() in values for tag in issue.get("tags", []))
+    return predicate
+
+
+def _custom_field_predicate(field: str, values: Set[str]) -> Callable[[dict], bool]:
+    def predicate(issue: dict) -> bool:
+        for custom_field in issue.get("customFields", []):
+            if (custom_field.get("name") or "").lower() == field:
+                return bool(_get_custom_field_values(custom_field.get("value")) & values)
+        return False
+    return predicate
+
+
+def _get_custom_field_values(value) -> Set[str]:
+    if value is None:
+        return {UNASSIGNED}
+    if isinstance(value, list):
+        field_values: Set[str] = set()
+        for sub_value in value:
+            field_values |= _get_custom_field_values(sub_value)
+        return field_values
+    if isinstance(value, dict):
+        return {str(value[key]).lower() for key in ("name", "login", "presentation") if value.get(key) is not None}
+    return {str(value).lower()}
@@ -0,0 +1,79 @@
+from concurrent.futures import Future
+import threading
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+from util import metrics
+from util.ttl_cache import TtlCache
+
+DEFAULT_CACHE_TTL_SECS = 30
+DEFAULT_CACHE_MAX_ENTRIES = 1000
+DEFAULT_CACHE_MAX_MB = 64
+CACHE_STATUS_HIT = "hit"
+CACHE_STATUS_MISS = "miss"
+CACHE_STATUS_SHARED = "shared"
+
+# (kind, query, ...), eg: ("issues", query, fields, skip, top) or ("count", query)
+CacheKey = Tuple[Hashable, ...]
+Fetched = Tuple[Any, int]  # response, its size in bytes
+
+
+class ResponseCache:
+    """
+        Responses of read-only YouTrack calls kept ttl seconds, so that the digest and stats of channels sharing
+        a query, and commands repeating a module, do not query YouTrack again.
+        Bounded in entries and in bytes (response sizes), least recently used responses are dropped first.
+        Concurrent identical calls wait for the single one in flight instead of all querying YouTrack (single flight).
+    """
+
+    def __init__(self, ttl_secs: int = DEFAULT_CACHE_TTL_SECS, max_entries: int = DEFAULT_CACHE_MAX_ENTRIES,
+                 max_mb: int = DEFAULT_CACHE_MAX_MB) -> None:
+        self.responses: TtlCache = TtlCache(ttl_secs, max_size=max_entries, max_bytes=max_mb * 1024 * 1024)
+        self.in_flight: Dict[CacheKey, Future] = {}
+        # incremented on invalidation, a response fetched across an invalidation is returned but not kept
+        self.generation: int = 0
+        self.lock = threading.Lock()
+
+    def get(self, key: CacheKey, fetch: Callable[[], Fetched]) -> Any:
+        response = self.responses.get(key)
+        if response is not None:
+            metrics.YOUTRACK_CACHE_REQUESTS.inc(CACHE_STATUS_HIT)
+            return response
+
+        with self.lock:
+            future = self.in_flight.get(key)
+            leader = future is None
+            if leader:
+                future = self.in_flight[key] = Future()
+                generation = self.generation
+        if not leader:
+            metrics.YOUTRACK_CACHE_REQUESTS.inc(CACHE_STATUS_SHARED)
+            return future.result()
+
+        metrics.YOUTRACK_CACHE_REQUESTS.inc(CACHE_STATUS_MISS)
+        try:
+            response, size = fetch()
+            self._store(key, response, size, generation)
+            future.set_result(response)
+            return response
+        except Exception as exception:
+            future.set_exception(exception)
+            raise
+        finally:
+            with self.lock:
+                del self.in_flight[key]
+
+    def invalidate(self, query: str) -> int:
+        """
+            Drop the responses of every call whose query contains the given one (eg: a channel query).
+        """
+        with self.lock:
+            self.generation += 1
+        return self.responses.delete_if(lambda key: query in key[1])
+
+    def get_bytes(self) -> int:
+        return self.responses.get_bytes()
+
+    def _store(self, key: CacheKey, response: Any, size: int, generation: int):
+        with self.lock:
+            if generation == self.generation:
+                self.responses.set(key, response, size)
@@ -0,0 +1,164 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+from datetime import datetime, timedelta
+import heapq
+import itertools
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from util import metrics
+from util.schedule import ModuleSchedule
+
+DEFAULT_WORKERS = 8
+DEFAULT_GRACE_PERIOD_SECS = 300
+SCHEDULER_RESOLUTION_SECS = 1
+
+JobKey = Tuple[str, str]  # (channel name, module)
+
+
+class ScheduledJob:
+    __slots__ = ("channel_name", "module", "module_schedule", "fire_at")
+
+    def __init__(self, channel_name: str, module: str, module_schedule: ModuleSchedule, fire_at: datetime) -> None:
+        self.channel_name: str = channel_name
+        self.module: str = module
+        self.module_schedule: ModuleSchedule = module_schedule
+        self.fire_at: datetime = fire_at
+
+    @property
+    def key(self) -> JobKey:
+        return (self.channel_name, self.module)
+
+
+class Scheduler:
+    """
+        Keep the next fire time of every (channel, module) in a heap and dispatch due jobs to a bounded worker pool.
+        Jobs which missed their fire time by less than the grace period are still executed, older ones are skipped.
+        A job is never run twice concurrently.
+    """
+
+    def __init__(self, jobs_provider: Callable[[], Iterable[Tuple[str, str, ModuleSchedule]]],
+                 execute_cb: Callable[[str, str, ModuleSchedule], None],
+                 invalid_schedule_cb: Callable[[str, str, ModuleSchedule], None],
+                 polling_interval: int,
+                 module_polling_intervals: Optional[Dict[str, int]] = None,
+                 max_workers: int = DEFAULT_WORKERS,
+                 grace_period_secs: int = DEFAULT_GRACE_PERIOD_SECS) -> None:
+        self.jobs_provider = jobs_provider
+        self.execute_cb = execute_cb
+        self.invalid_schedule_cb = invalid_schedule_cb
+        self.polling_interval: timedelta = timedelta(seconds=polling_interval)
+        # modules polling at another interval than polling_interval
+        self.module_polling_intervals: Dict[str, timedelta] = {
+            module: timedelta(seconds=interval) for module, interval in (module_polling_intervals or {}).items()}
+        self.grace_period: timedelta = timedelta(seconds=grace_period_secs)
+        self.max_workers: int = max_workers
+        # created on the first dispatch, the async scheduler runs jobs as tasks and never needs it
+        self.executor: Optional[ThreadPoolExecutor] = None
+
+        self.jobs: Dict[JobKey, ScheduledJob] = {}
+        self.invalid_schedules: Dict[JobKey, ModuleSchedule] = {}
+        self.heap: List[Tuple[datetime, int, ScheduledJob]] = []
+        self.sequence = itertools.count()
+        self.running: Set[JobKey] = set()
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+
+    def run_forever(self):
+        while not self.stop_event.is_set():
+            self.tick(datetime.now())
+            self.stop_event.wait(self._get_sleep_duration(datetime.now()))
+
+    def stop(self):
+        self.stop_event.set()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+
+    def tick(self, now: datetime):
+        with metrics.SCHEDULER_TICK_SECONDS.time():
+            self._tick(now)
+        metrics.SCHEDULER_LAST_TICK.set(time.time())
+
+    def _tick(self, now: datetime):
+        self.sync(now)
+        while len(self.heap) > 0 and self.heap[0][0] <= now:
+            _, _, job = heapq.heappop(self.heap)
+            if self.jobs.get(job.key) is not job:
+                continue  # job removed or rescheduled since it was pushed
+
+            if now - job.fire_at <= self.grace_period:
+                self._dispatch(job)
+            else:
+                print(f"Missed {job.module} for {job.channel_name} scheduled at {job.fire_at}")
+                metrics.SCHEDULER_MISSED_FIRES.inc(job.module)
+
+            job.fire_at = job.module_schedule.schedule.next_fire(
+                job.fire_at, now, self.grace_period, self.get_polling_interval(job.module))
+            self._push(job)
+
+    def get_polling_interval(self, module: str) -> timedelta:
+        return self.module_polling_intervals.get(module, self.polling_interval)
+
+    def sync(self, now: datetime):
+        """
+            Reconcile scheduled jobs with the channels configuration: new modules are scheduled,
+            disabled ones are dropped and modified ones are rescheduled.
+        """
+        wanted: Dict[JobKey, ModuleSchedule] = {}
+        for channel_name, module, module_schedule in self.jobs_provider():
+            wanted[(channel_name, module)] = module_schedule
+
+        for key in list(self.jobs):
+            if wanted.get(key) is not self.jobs[key].module_schedule:
+                del self.jobs[key]
+        for key in list(self.invalid_schedules):
+            if wanted.get(key) is not self.invalid_schedules[key]:
+                del self.invalid_schedules[key]
+
+        for key, module_schedule in wanted.items():
+            if key in self.jobs or key in self.invalid_schedules:
+                continue
+            if module_schedule.schedule is None:
+                self.invalid_schedules[key] = module_schedule
+                self.invalid_schedule_cb(key[0], key[1], module_schedule)
+                continue
+            job = ScheduledJob(key[0], key[1], module_schedule, module_schedule.schedule.first_fire(now, self.grace_period))
+            self.jobs[key] = job
+            self._push(job)
+
+    def _push(self, job: ScheduledJob):
+        heapq.heappush(self.heap, (job.fire_at, next(self.sequence), job))
+
+    def _get_sleep_duration(self, now: datetime) -> float:
+        sleep_duration: float = SCHEDULER_RESOLUTION_SECS
+        if len(self.heap) > 0:
+            sleep_duration = min(sleep_duration, max(0, (self.heap[0][0] - now).total_seconds()))
+        return sleep_duration
+
+    def _dispatch(self, job: ScheduledJob):
+        with self.lock:
+            if job.key in self.running:
+                print(f"Skipping {job.module} for {job.channel_name}: previous run still in progress")
+                metrics.SCHEDULER_SKIPPED_RUNS.inc(job.module)
+                return
+            self.running.add(job.key)
+
+        self._submit(job, job.fire_at)
+
+    def _submit(self, job: ScheduledJob, fire_at: datetime):
+        if self.executor is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="scheduler")
+        future: Future = self.executor.submit(self._run_job, job, fire_at)
+        future.add_done_callback(lambda _: self._on_job_done(job.key))
+
+    def _run_job(self, job: ScheduledJob, fire_at: datetime):
+        self._observe_lag(job, fire_at)
+        self.execute_cb(job.channel_name, job.module, job.module_schedule)
+
+    def _observe_lag(self, job: ScheduledJob, fire_at: datetime):
+        # job.fire_at already points to the next fire once the job is dispatched
+        metrics.SCHEDULER_LAG_SECONDS.observe(max(0, (datetime.now() - fire_at).total_seconds()), job.module)
+
+    def _on_job_done(self, key: JobKey):
+        with self.lock:
+            self.running.discard(key)
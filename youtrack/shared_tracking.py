@@ -0,0 +1,78 @@
+from datetime import datetime, timedelta
+from operator import attrgetter
+import threading
+from typing import Dict, List, Optional, Tuple
+
+from util.utils import STAT_YOUTRACK_DATE_FORMAT
+from youtrack.field_profiles import merge_fields
+from youtrack.issue import Issue
+from youtrack.query_matcher import MATCHER_ISSUE_FIELDS, QueryMatcher
+from youtrack.youtrack import Youtrack
+
+ALL_PROJECTS = ""
+# read by get_new_issues, on top of the fields of the issues returned and the ones read by matchers
+WINDOW_ISSUE_FIELDS = "id,created"
+
+
+class TrackingWindow:
+    __slots__ = ("since", "until", "fetched_at", "issues")
+
+    def __init__(self, since: datetime, until: datetime, fetched_at: datetime, issues: List[dict]) -> None:
+        self.since: datetime = since
+        self.until: datetime = until
+        self.fetched_at: datetime = fetched_at
+        self.issues: List[dict] = issues
+
+
+class SharedTracking:
+    """
+        Fetch the issues created in the polling window once per project and share them between all tracking channels,
+        each channel filtering them locally with its query matcher.
+        A window is reused by channels polling within the same polling interval as long as it covers their last check.
+    """
+
+    def __init__(self, youtrack: Youtrack, issue_fields: str, polling_interval: int) -> None:
+        self.youtrack: Youtrack = youtrack
+        self.fields: str = merge_fields(WINDOW_ISSUE_FIELDS, issue_fields, MATCHER_ISSUE_FIELDS)
+        self.polling_interval: timedelta = timedelta(seconds=polling_interval)
+        self.windows: Dict[str, TrackingWindow] = {}
+        self.window_locks: Dict[str, threading.Lock] = {}
+        self.lock = threading.Lock()
+
+    def get_new_issues(self, matcher: QueryMatcher, last_check: str) -> Tuple[List[Issue], datetime]:
+        """
+            Return issues matching the channel query created since last check, sorted by creation date,
+            and the end of the window they were taken from.
+            Windows keep full issues for the matchers, matching ones are returned as Issue records.
+        """
+        since = datetime.strptime(last_check, STAT_YOUTRACK_DATE_FORMAT)
+        windows = [self._get_window(project, since) for project in (sorted(matcher.projects) or [ALL_PROJECTS])]
+        until = min(window.until for window in windows)
+        since_ms = since.timestamp() * 1000
+        until_ms = (until.timestamp() + 1) * 1000
+
+        issues: Dict[str, Issue] = {}
+        for window in windows:
+            for issue in window.issues:
+                if since_ms <= issue.get("created", 0) < until_ms and matcher.matches(issue):
+                    issues[issue["id"]] = Issue.from_json(issue)
+
+        return sorted(issues.values(), key=attrgetter("created")), until
+
+    def _get_window(self, project: str, since: datetime) -> TrackingWindow:
+        with self.lock:
+            window_lock = self.window_locks.setdefault(project, threading.Lock())
+
+        with window_lock:
+            now = datetime.now().replace(microsecond=0)
+            window: Optional[TrackingWindow] = self.windows.get(project)
+            if window is None or window.since > since or now - window.fetched_at >= self.polling_interval:
+                window_since = min(since, now - 2 * self.polling_interval)
+                query = f"""created: {window_since.strftime(STAT_YOUTRACK_DATE_FORMAT)} .. {now.strftime(STAT_YOUTRACK_DATE_FORMAT)}"""
+                if project != ALL_PROJECTS:
+                    query = f"project: {{{project}}} {query}"
+                window = TrackingWindow(window_since, now, now,
+                                        list(self.youtrack.iter_issues(query, fields=self.fields, cached=False)))
+                self.windows[project] = window
+
+            return window
@@ -0,0 +1,230 @@
+from datetime import date, datetime, timedelta
+import json
+import re
+import sqlite3
+import threading
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from util.utils import STAT_YOUTRACK_DATE_FORMAT
+from youtrack.field_profiles import FieldProfile
+from youtrack.youtrack import Youtrack
+from youtrack.youtrack_stats import Stats
+
+DEFAULT_ROLLUPS_FILE_NAME = "config/rollups.db"
+DEFAULT_ROLLUPS_MAX_AGE_SECS = 300
+ROLLUP_ISSUE_FIELDS = "id,created,resolved,tags(name)"
+# read by _upsert_issues
+ROLLUPS_FIELD_PROFILE = FieldProfile("rollups", ROLLUP_ISSUE_FIELDS)
+# aggregates need every issue of the query, not only the first max_issues ones
+ROLLUP_MAX_ISSUES = 1000000
+DAY_FORMAT = "%Y-%m-%d"
+# updated dates are compared at second precision and clocks may differ slightly, re-read a small overlap
+SYNC_OVERLAP = timedelta(seconds=60)
+
+DAY_PATTERN = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+MONTH_PATTERN = re.compile(r"^\d{4}-\d{2}$")
+
+Period = Tuple[date, date]  # first and last day, both included
+
+
+def parse_period(period: str, today: Optional[date] = None) -> Optional[Period]:
+    """
+        Resolve the YouTrack period expressions which map to whole days:
+        2023-01-01, 2023-01, 2023-01-01 .. 2023-12-31, Today, Yesterday, This week, Last week, This month, Last month
+        (with or without braces). Return None for anything else (times, relative ranges, ...).
+    """
+    today = today or date.today()
+    period = period.strip()
+    if ".." in period:
+        bounds = [bound.strip() for bound in period.split("..")]
+        if len(bounds) != 2 or not all(DAY_PATTERN.match(bound) for bound in bounds):
+            return None
+        first, last = (datetime.strptime(bound, DAY_FORMAT).date() for bound in bounds)
+        return (first, last) if first <= last else None
+    if DAY_PATTERN.match(period):
+        day = datetime.strptime(period, DAY_FORMAT).date()
+        return day, day
+    if MONTH_PATTERN.match(period):
+        return _get_month(datetime.strptime(period, "%Y-%m").date())
+
+    monday = today - timedelta(days=today.weekday())
+    match period.strip("{}").lower():
+        case "today":
+            return today, today
+        case "yesterday":
+            return today - timedelta(days=1), today - timedelta(days=1)
+        case "this week":
+            return monday, monday + timedelta(days=6)
+        case "last week":
+            return monday - timedelta(days=7), monday - timedelta(days=1)
+        case "this month":
+            return _get_month(today)
+        case "last month":
+            return _get_month(today.replace(day=1) - timedelta(days=1))
+    return None
+
+
+def _get_month(day: date) -> Period:
+    first = day.replace(day=1)
+    next_month = (first + timedelta(days=32)).replace(day=1)
+    return first, next_month - timedelta(days=1)
+
+
+def _get_day(timestamp_ms: Optional[int]) -> Optional[str]:
+    if timestamp_ms is None:
+        return None
+    return datetime.fromtimestamp(timestamp_ms / 1000).strftime(DAY_FORMAT)
+
+
+class StatsRollups:
+    """
+        Per channel, per day aggregates used to answer stats over any period by summing daily buckets:
+        created, still open, resolved among created, resolved that day, resolved that day but created before,
+        and tags of still open issues.
+        Buckets are computed from a small per-issue table (creation day, resolution day, tags)
+        kept up to date with delta queries on updated date; only the days touched by a change are recomputed.
+    """
+
+    def __init__(self, youtrack: Youtrack, file_name: str = DEFAULT_ROLLUPS_FILE_NAME,
+                 max_age_secs: int = DEFAULT_ROLLUPS_MAX_AGE_SECS, fields: str = ROLLUP_ISSUE_FIELDS) -> None:
+        self.youtrack: Youtrack = youtrack
+        self.fields: str = fields
+        self.max_age: timedelta = timedelta(seconds=max_age_secs)
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(file_name, check_same_thread=False, isolation_level=None)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS rollup_sync (
+                channel TEXT PRIMARY KEY,
+                query TEXT NOT NULL,
+                last_sync TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS rollup_issues (
+                channel TEXT NOT NULL,
+                issue_id TEXT NOT NULL,
+                created_day TEXT NOT NULL,
+                resolved_day TEXT,
+                tags TEXT NOT NULL,
+                PRIMARY KEY (channel, issue_id));
+            CREATE INDEX IF NOT EXISTS rollup_issues_created ON rollup_issues (channel, created_day);
+            CREATE INDEX IF NOT EXISTS rollup_issues_resolved ON rollup_issues (channel, resolved_day);
+            CREATE TABLE IF NOT EXISTS daily_rollups (
+                channel TEXT NOT NULL,
+                day TEXT NOT NULL,
+                created INTEGER NOT NULL,
+                open INTEGER NOT NULL,
+                resolved_from_created INTEGER NOT NULL,
+                resolved INTEGER NOT NULL,
+                resolved_from_earlier INTEGER NOT NULL,
+                tags TEXT NOT NULL,
+                PRIMARY KEY (channel, day));
+        """)
+
+    def get_stats(self, channel_name: str, query: str, period: str, days: Period) -> Stats:
+        self.refresh(channel_name, query)
+
+        stats = Stats(query, period)
+        with self.lock:
+            rows = self.connection.execute(
+                """SELECT created, open, resolved_from_created, resolved, tags FROM daily_rollups
+                   WHERE channel = ? AND day BETWEEN ? AND ?""",
+                (channel_name, days[0].strftime(DAY_FORMAT), days[1].strftime(DAY_FORMAT))).fetchall()
+            stats.all_time_unresolved_count = self.connection.execute(
+                "SELECT COUNT(*) FROM rollup_issues WHERE channel = ? AND resolved_day IS NULL", (channel_name,)).fetchone()[0]
+
+        for _, open_count, resolved_from_created, resolved, tags in rows:
+            stats.unresolved_count += open_count
+            stats.resolved_count += resolved_from_created
+            stats.resolved_other_issues_count += resolved
+            for tag, count in json.loads(tags).items():
+                stats.ticket_count_by_tag[tag] = stats.ticket_count_by_tag.get(tag, 0) + count
+
+        return stats
+
+    def refresh(self, channel_name: str, query: str):
+        with self.lock:
+            row = self.connection.execute("SELECT query, last_sync FROM rollup_sync WHERE channel = ?", (channel_name,)).fetchone()
+            now = datetime.now().replace(microsecond=0)
+            if row is None or row[0] != query:
+                self._load(channel_name, query)
+            else:
+                last_sync = datetime.strptime(row[1], STAT_YOUTRACK_DATE_FORMAT)
+                if now - last_sync < self.max_age:
+                    return
+                self._sync(channel_name, query, last_sync - SYNC_OVERLAP, now)
+            self.connection.execute("INSERT OR REPLACE INTO rollup_sync (channel, query, last_sync) VALUES (?, ?, ?)",
+                                    (channel_name, query, now.strftime(STAT_YOUTRACK_DATE_FORMAT)))
+
+    def delete_channel(self, channel_name: str):
+        with self.lock, self.connection:
+            self.connection.execute("BEGIN")
+            for table in ["rollup_sync", "rollup_issues", "daily_rollups"]:
+                self.connection.execute(f"DELETE FROM {table} WHERE channel = ?", (channel_name,))
+
+    def _load(self, channel_name: str, query: str):
+        with self.connection:
+            self.connection.execute("BEGIN")
+            for table in ["rollup_issues", "daily_rollups"]:
+                self.connection.execute(f"DELETE FROM {table} WHERE channel = ?", (channel_name,))
+            self._upsert_issues(channel_name, self.youtrack.iter_issues(query, fields=self.fields, max_issues=ROLLUP_MAX_ISSUES, cached=False))
+            days = [row[0] for row in self.connection.execute(
+                "SELECT DISTINCT created_day FROM rollup_issues WHERE channel = ? UNION SELECT DISTINCT resolved_day FROM rollup_issues WHERE channel = ? AND resolved_day IS NOT NULL",
+                (channel_name, channel_name))]
+            self._update_days(channel_name, days)
+
+    def _sync(self, channel_name: str, query: str, since: datetime, until: datetime):
+        updated_query = (f"{query} updated: {since.strftime(STAT_YOUTRACK_DATE_FORMAT)} .. "
+                         f"{until.strftime(STAT_YOUTRACK_DATE_FORMAT)}")
+        with self.connection:
+            self.connection.execute("BEGIN")
+            touched_days = self._upsert_issues(channel_name, self.youtrack.iter_issues(
+                updated_query, fields=self.fields, max_issues=ROLLUP_MAX_ISSUES, cached=False))
+
+            issue_count = self.connection.execute("SELECT COUNT(*) FROM rollup_issues WHERE channel = ?", (channel_name,)).fetchone()[0]
+            if self.youtrack.count_issues(query, cached=False) != issue_count:
+                # issues deleted or moved out of the query
+                ids = {issue["id"] for issue in self.youtrack.iter_issues(query, fields="id", max_issues=ROLLUP_MAX_ISSUES, cached=False)}
+                for issue_id, created_day, resolved_day in self.connection.execute(
+                        "SELECT issue_id, created_day, resolved_day FROM rollup_issues WHERE channel = ?", (channel_name,)).fetchall():
+                    if issue_id not in ids:
+                        touched_days.update(day for day in (created_day, resolved_day) if day is not None)
+                        self.connection.execute("DELETE FROM rollup_issues WHERE channel = ? AND issue_id = ?", (channel_name, issue_id))
+
+            self._update_days(channel_name, touched_days)
+
+    def _upsert_issues(self, channel_name: str, issues: Iterable[dict]) -> Set[str]:
+        touched_days: Set[str] = set()
+        for issue in issues:
+            previous = self.connection.execute("SELECT created_day, resolved_day FROM rollup_issues WHERE channel = ? AND issue_id = ?",
+                                               (channel_name, issue["id"])).fetchone()
+            if previous is not None:
+                touched_days.update(day for day in previous if day is not None)
+            created_day = _get_day(issue.get("created"))
+            resolved_day = _get_day(issue.get("resolved"))
+            touched_days.update(day for day in (created_day, resolved_day) if day is not None)
+            self.connection.execute("INSERT OR REPLACE INTO rollup_issues (channel, issue_id, created_day, resolved_day, tags) VALUES (?, ?, ?, ?, ?)",
+                                    (channel_name, issue["id"], created_day, resolved_day,
+                                     json.dumps([tag["name"] for tag in issue.get("tags", [])])))
+        return touched_days
+
+    def _update_days(self, channel_name: str, days: Iterable[str]):
+        for day in days:
+            created, open_count, resolved_from_created = self.connection.execute(
+                """SELECT COUNT(*), COUNT(*) - COUNT(resolved_day), COUNT(resolved_day)
+                   FROM rollup_issues WHERE channel = ? AND created_day = ?""", (channel_name, day)).fetchone()
+            resolved, resolved_from_earlier = self.connection.execute(
+                """SELECT COUNT(*), COALESCE(SUM(created_day < resolved_day), 0)
+                   FROM rollup_issues WHERE channel = ? AND resolved_day = ?""", (channel_name, day)).fetchone()
+            tags: Dict[str, int] = {}
+            for (issue_tags,) in self.connection.execute(
+                    "SELECT tags FROM rollup_issues WHERE channel = ? AND created_day = ? AND resolved_day IS NULL", (channel_name, day)):
+                for tag in json.loads(issue_tags):
+                    tags[tag] = tags.get(tag, 0) + 1
+
+            if created == 0 and resolved == 0:
+                self.connection.execute("DELETE FROM daily_rollups WHERE channel = ? AND day = ?", (channel_name, day))
+            else:
+                self.connection.execute(
+                    """INSERT OR REPLACE INTO daily_rollups
+                       (channel, day, created, open, resolved_from_created, resolved, resolved_from_earlier, tags)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                    (channel_name, day, created, open_count, resolved_from_created, resolved, resolved_from_earlier, json.dumps(tags)))
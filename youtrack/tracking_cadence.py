@@ -0,0 +1,110 @@
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from util import metrics
+from youtrack.youtrack import RateLimitedError
+
+DEFAULT_MIN_INTERVAL_SECS = 15
+DEFAULT_MAX_INTERVAL_SECS = 900
+DEFAULT_MAX_BACKOFF_SECS = 900
+# weight of the last poll in the issue arrival rate estimate
+RATE_SMOOTHING = 0.3
+# a channel is polled when about this many new issues are expected
+ISSUES_PER_POLL = 1
+JITTER_RATIO = 0.1
+
+
+class ChannelCadence:
+    __slots__ = ("rate", "interval", "next_poll", "started", "last_poll", "failures")
+
+    def __init__(self, interval: float) -> None:
+        self.rate: Optional[float] = None  # estimated new issues per second
+        self.interval: float = interval
+        self.next_poll: float = 0
+        self.started: float = 0  # start of the current poll
+        self.last_poll: Optional[float] = None  # start of the last successful poll
+        self.failures: int = 0
+
+
+class TrackingCadence:
+    """
+        Decide when each tracking channel is polled, the scheduler firing polling jobs every resolution seconds.
+        The interval of a channel follows its observed issue arrival rate, between min and max interval,
+        so that quiet channels cost few requests and busy ones are polled often.
+        Failed polls are retried with an exponential backoff, jittered so that channels failing together (YouTrack down)
+        do not retry together. A rate limit answer from YouTrack holds the polls of every channel.
+    """
+
+    def __init__(self, resolution_secs: float, initial_interval_secs: float,
+                 min_interval_secs: float = DEFAULT_MIN_INTERVAL_SECS, max_interval_secs: float = DEFAULT_MAX_INTERVAL_SECS,
+                 max_backoff_secs: float = DEFAULT_MAX_BACKOFF_SECS, clock: Callable[[], float] = time.monotonic) -> None:
+        self.clock: Callable[[], float] = clock
+        self.resolution: float = resolution_secs
+        self.min_interval: float = min_interval_secs
+        self.max_interval: float = max_interval_secs
+        self.initial_interval: float = self._clamp(initial_interval_secs)
+        self.max_backoff: float = max_backoff_secs
+        self.channels: Dict[str, ChannelCadence] = {}
+        self.hold_until: float = 0
+        self.lock = threading.Lock()
+
+    def start_poll(self, channel_name: str, now: Optional[float] = None) -> bool:
+        """
+            Return True when the channel poll is due, and record it as started.
+        """
+        now = now or self.clock()
+        with self.lock:
+            cadence = self._get_cadence(channel_name)
+            # jobs fire every resolution seconds, a poll due before the next fire runs on this one
+            if now < self.hold_until or cadence.next_poll - now >= self.resolution / 2:
+                return False
+            cadence.started = now
+            return True
+
+    def on_poll(self, channel_name: str, issue_count: int):
+        """
+            Record a successful poll which read issue_count issues created since the previous one.
+        """
+        with self.lock:
+            cadence = self._get_cadence(channel_name)
+            if cadence.last_poll is not None and cadence.started > cadence.last_poll:
+                rate = issue_count / (cadence.started - cadence.last_poll)
+                cadence.rate = rate if cadence.rate is None else RATE_SMOOTHING * rate + (1 - RATE_SMOOTHING) * cadence.rate
+                cadence.interval = self._clamp(ISSUES_PER_POLL / cadence.rate if cadence.rate > 0 else self.max_interval)
+            cadence.last_poll = cadence.started
+            cadence.failures = 0
+            cadence.next_poll = cadence.started + self._jitter(cadence.interval)
+        metrics.CHANNEL_TRACKING_INTERVAL.set(cadence.interval, channel_name)
+
+    def on_error(self, channel_name: str, exception: Exception, now: Optional[float] = None):
+        now = now or self.clock()
+        with self.lock:
+            cadence = self._get_cadence(channel_name)
+            cadence.failures += 1
+            backoff = min(self.max_backoff, self.initial_interval * 2 ** (cadence.failures - 1))
+            delay = random.uniform(backoff / 2, backoff)
+            if isinstance(exception, RateLimitedError):
+                metrics.YOUTRACK_RATE_LIMITED.inc()
+                self.hold_until = max(self.hold_until, now + (exception.retry_after_secs or delay))
+            cadence.next_poll = now + delay
+
+    def invalidate(self, channel_name: str):
+        with self.lock:
+            self.channels.pop(channel_name, None)
+        metrics.CHANNEL_TRACKING_INTERVAL.remove(channel_name)
+
+    def _get_cadence(self, channel_name: str) -> ChannelCadence:
+        cadence = self.channels.get(channel_name)
+        if cadence is None:
+            cadence = self.channels[channel_name] = ChannelCadence(self.initial_interval)
+        return cadence
+
+    def _clamp(self, interval: float) -> float:
+        return min(self.max_interval, max(self.min_interval, interval))
+
+    def _jitter(self, interval: float) -> float:
+        if self.min_interval == self.max_interval:
+            return interval  # fixed cadence, stay in step with the scheduler fires
+        return self._clamp(interval * random.uniform(1 - JITTER_RATIO, 1 + JITTER_RATIO))
@@ -1,36 +1,315 @@
-from typing import List
+from concurrent.futures import Future, ThreadPoolExecutor
+import contextvars
+from typing import Any, Callable, Iterator, List, Optional, Tuple
 import json
+import threading
+import time
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from util import metrics
+from util.json_stream import JsonArrayDecoder
+from youtrack.issue import Issue
+from youtrack.response_cache import (DEFAULT_CACHE_MAX_ENTRIES, DEFAULT_CACHE_MAX_MB, DEFAULT_CACHE_TTL_SECS, CacheKey, Fetched,
+                                     ResponseCache)
 
 REQUEST_TIMEOUT_SECS = 30
 
+DEFAULT_POOL_SIZE = 10
+DEFAULT_MAX_CONCURRENCY = DEFAULT_POOL_SIZE
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_RETRY_BACKOFF_FACTOR = 0.5
+RETRY_STATUS_CODES = [429, 500, 502, 503, 504]
+DEFAULT_PAGE_SIZE = 500
+SORT_BY_CREATED = "sort by: created asc"
+COUNT_RETRY_DELAY_SECS = 0.5
+COUNT_MAX_ATTEMPTS = 20
+STREAM_CHUNK_SIZE = 65536
+HTTP_TOO_MANY_REQUESTS = 429
+
+
+class RateLimitedError(Exception):
+    """
+        YouTrack still answered 429 once retries were exhausted, retry_after_secs is its Retry-After when sent.
+    """
+
+    def __init__(self, retry_after_secs: Optional[float]) -> None:
+        super().__init__(f"YouTrack rate limit reached, retry after {retry_after_secs or 'a while'}s")
+        self.retry_after_secs: Optional[float] = retry_after_secs
+
+
+def get_retry_after(value: Optional[str]) -> Optional[float]:
+    return float(value) if value is not None and value.isdigit() else None
+
+
+# paging, params, count and cache keys shared by Youtrack and AsyncYoutrack, which only differ by their I/O
+
+class PageCursor:
+    """
+        $skip/$top of the successive pages of a query: pages are read until one is short or max_issues were read.
+    """
+    __slots__ = ("page_size", "max_issues", "skip")
+
+    def __init__(self, page_size: int, max_issues: int) -> None:
+        self.page_size: int = min(page_size, max_issues)
+        self.max_issues: int = max_issues
+        self.skip: int = 0
+
+    def first(self) -> Tuple[int, int]:
+        return 0, self.page_size
+
+    def advance(self, page_length: int) -> Optional[Tuple[int, int]]:
+        """
+            Record a page of page_length issues, return the $skip/$top of the next one, or None after the last one.
+        """
+        self.skip += page_length
+        if page_length < self.page_size or self.skip >= self.max_issues:
+            return None
+        return self.skip, min(self.page_size, self.max_issues - self.skip)
+
+
+def get_sorted_query(query: str) -> str:
+    # issues are sorted by creation date on YouTrack side so that pages are stable, unless the query sorts them
+    if "sort by" in query.lower():
+        return query
+    return f"{query} {SORT_BY_CREATED}".strip()
+
+
+def get_page_params(query: str, fields: str, skip: int, top: int) -> dict:
+    params = {
+        "$skip": str(skip),
+        "$top": str(top),
+        "fields": fields
+    }
+    if query != "":
+        params["query"] = query
+    return params
+
+
+def get_page_key(kind: str, query: str, fields: str, skip: int, top: int) -> CacheKey:
+    return (kind, query, fields, skip, top)
+
+
+def get_count_key(query: str) -> CacheKey:
+    return ("count", query)
+
+
+def read_count(result: dict) -> Optional[int]:
+    # YouTrack answers -1 while the count is still being computed, in that case the request is repeated
+    # https://www.jetbrains.com/help/youtrack/devportal/resource-api-issuesGetter-count.html
+    count = int(result.get("count", -1))
+    return count if count >= 0 else None
+
 
 class Youtrack:
-    def __init__(self, base_url: str, authorization_header: str, api_endpoint: str, issue_id_field: str, all_issue_fields: str, max_issues: int):
+    def __init__(self, base_url: str, authorization_header: str, api_endpoint: str, issue_id_field: str, all_issue_fields: str, max_issues: int,
+                 pool_size: int = DEFAULT_POOL_SIZE, max_retries: int = DEFAULT_MAX_RETRIES, retry_backoff_factor: float = DEFAULT_RETRY_BACKOFF_FACTOR,
+                 page_size: int = DEFAULT_PAGE_SIZE, prefetch_next_page: bool = False,
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY, response_cache: bool = False,
+                 response_cache_ttl: int = DEFAULT_CACHE_TTL_SECS, response_cache_max_entries: int = DEFAULT_CACHE_MAX_ENTRIES,
+                 response_cache_max_mb: int = DEFAULT_CACHE_MAX_MB):
         self.base_url: str = base_url
         self.max_issues = max_issues
+        self.page_size = page_size
+        self.prefetch_next_page = prefetch_next_page
         self.all_issue_fields = all_issue_fields
         self.issue_id_field = issue_id_field
 
         self.headers = {
-            'Authorization': authorization_header
+            'Authorization': authorization_header,
+            'Accept': 'application/json',
+            'Accept-Encoding': 'gzip, deflate',
+            'Connection': 'keep-alive'
         }
 
         self.api_endpoint: str = api_endpoint
+        self.max_retries: int = max_retries
+        self.retry_backoff_factor: float = retry_backoff_factor
+        self.session: requests.Session = self._create_session(pool_size, max_retries)
+        self.prefetch_executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=pool_size,
+                                                                        thread_name_prefix="youtrack-prefetch")
+        # requests in flight from every module and command of this bot, whatever their worker pools
+        self.concurrency = threading.BoundedSemaphore(max_concurrency)
+        self.cache: Optional[ResponseCache] = None
+        if response_cache:
+            self.cache = ResponseCache(response_cache_ttl, response_cache_max_entries, response_cache_max_mb)
 
-    def get_issues(self, query: str, only_issue_ids: bool = False) -> List[dict]:
-        params = {
-            "$top": self.max_issues,
-            "fields": self.all_issue_fields if not only_issue_ids else self.issue_id_field
-        }
-        if query != "":
-            params["query"] = query
+    def _create_session(self, pool_size: int, max_retries: int) -> requests.Session:
+        """
+            Build a keep-alive session shared by every call made through this client.
+            Connection errors are retried right away, 429 and 5xx are retried by _send, which does not hold
+            a concurrency slot while backing off.
+            POST is retried too: the only one sent is the read-only issuesGetter/count.
+        """
+        retry = Retry(total=max_retries,
+                      status=0,
+                      allowed_methods=["GET", "HEAD", "POST"],
+                      raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=pool_size,
+                              pool_maxsize=pool_size,
+                              max_retries=retry)
+        session = requests.Session()
+        session.headers.update(self.headers)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+
+        return session
+
+    def close(self):
+        self.prefetch_executor.shutdown(wait=False)
+        self.session.close()
+
+    def iter_issues(self, query: str, only_issue_ids: bool = False, page_size: Optional[int] = None,
+                    prefetch: Optional[bool] = None, fields: Optional[str] = None,
+                    max_issues: Optional[int] = None, cached: bool = True) -> Iterator[dict]:
+        """
+            Yield issues matching the query page by page, using $skip/$top.
+            Issues are sorted by creation date on YouTrack side so that pages are stable.
+            When prefetch is enabled, the next page is requested while the current one is consumed.
+            fields overrides the projection requested to YouTrack (eg: "tags(name)").
+            max_issues overrides the configured limit (eg: to aggregate over a whole query).
+            Pages may come from the response cache unless cached is False, they are shared and must not be modified.
+        """
+        return self._iter_pages(self._get_page, "issues", query, only_issue_ids, page_size, prefetch, fields, max_issues, cached)
+
+    def iter_issue_records(self, query: str, only_issue_ids: bool = False, page_size: Optional[int] = None,
+                           prefetch: Optional[bool] = None, fields: Optional[str] = None,
+                           max_issues: Optional[int] = None, cached: bool = True) -> Iterator[Issue]:
+        """
+            Same as iter_issues, but pages are decoded from the response stream into compact Issue records,
+            for callers which only render issues.
+        """
+        return self._iter_pages(self._get_record_page, "records", query, only_issue_ids, page_size, prefetch, fields,
+                                max_issues, cached)
+
+    def get_issue_page(self, query: str, skip: int, top: int, fields: Optional[str] = None, cached: bool = True) -> List[Issue]:
+        """
+            A single page of issue records (eg: a digest page), without reading the previous ones.
+            They are sorted by creation date unless the query sorts them.
+        """
+        fields = fields or self.all_issue_fields
+        query = get_sorted_query(query)
+        return self._get_response(cached, get_page_key("records", query, fields, skip, top),
+                                  lambda: self._get_record_page(query, fields, skip, top))
+
+    def invalidate_cache(self, query: str):
+        if self.cache is not None:
+            self.cache.invalidate(query)
+
+    def _get_response(self, cached: bool, key: CacheKey, fetch: Callable[[], Fetched]):
+        if cached and self.cache is not None:
+            return self.cache.get(key, fetch)
+        return fetch()[0]
+
+    def _iter_pages(self, get_page: Callable[[str, str, int, int], Fetched], kind: str, query: str, only_issue_ids: bool,
+                    page_size: Optional[int], prefetch: Optional[bool], fields: Optional[str],
+                    max_issues: Optional[int], cached: bool) -> Iterator:
+        cursor = PageCursor(page_size or self.page_size, max_issues or self.max_issues)
+        prefetch = self.prefetch_next_page if prefetch is None else prefetch
+        if fields is None:
+            fields = self.all_issue_fields if not only_issue_ids else self.issue_id_field
+        query = get_sorted_query(query)
+
+        def get_response(skip: int, top: int) -> list:
+            return self._get_response(cached, get_page_key(kind, query, fields, skip, top),
+                                      lambda: get_page(query, fields, skip, top))
+
+        page = get_response(*cursor.first())
+        while len(page) > 0:
+            next_window = cursor.advance(len(page))
+            next_page: Optional[Future] = None
+            if prefetch and next_window is not None:
+                next_page = self.prefetch_executor.submit(contextvars.copy_context().run, get_response, *next_window)
+
+            yield from page
+
+            if next_window is None:
+                break
+            page = next_page.result() if next_page is not None else get_response(*next_window)
+
+    def _get_page(self, query: str, fields: str, skip: int, top: int) -> Fetched:
         # https://www.jetbrains.com/help/youtrack/standalone/api-howto-get-issues-with-all-values.html#summary
-        response = requests.get(f"{self.api_endpoint}/issues",
-                                params=params,
-                                headers=self.headers,
-                                timeout=REQUEST_TIMEOUT_SECS)
-        issues = json.loads(response.content)
-        if "error" in issues:
-            raise Exception(f"""{issues.get("error")}: {issues.get("error_description", "")}\n{issues.get("error_developer_message", "")}""")
-        return sorted(issues, key=lambda x: x.get("created",""))
+        return self._request("issues", "GET", "/issues", params=get_page_params(query, fields, skip, top))
+
+    def _get_record_page(self, query: str, fields: str, skip: int, top: int) -> Fetched:
+        return self._request_records("issues", "GET", "/issues", params=get_page_params(query, fields, skip, top))
+
+    def count_issues(self, query: str, cached: bool = True) -> int:
+        """
+            Count issues matching the query without downloading them.
+            The count may come from the response cache unless cached is False.
+        """
+        return self._get_response(cached, get_count_key(query), lambda: (self._count_issues(query), 0))
+
+    def _count_issues(self, query: str) -> int:
+        for _ in range(COUNT_MAX_ATTEMPTS):
+            result, _ = self._request("count", "POST", "/issuesGetter/count", params={"fields": "count"}, json={"query": query})
+            count = read_count(result)
+            if count is not None:
+                return count
+            time.sleep(COUNT_RETRY_DELAY_SECS)
+
+        raise Exception(f"YouTrack did not compute issue count for query: {query}")
+
+    def _request(self, operation: str, method: str, path: str, **kwargs) -> Fetched:
+        try:
+            content = self._send(operation, method, path, lambda response: response.content, **kwargs)
+            metrics.YOUTRACK_RESPONSE_BYTES.observe(len(content), operation)
+            payload = json.loads(content)
+            raise_on_error(payload)
+        except Exception:
+            metrics.ERRORS.inc("youtrack")
+            raise
+        return payload, len(content)
+
+    def _request_records(self, operation: str, method: str, path: str, **kwargs) -> Fetched:
+        """
+            Decode the response as it is received: each issue is turned into an Issue record and its dict dropped,
+            neither the response content nor the whole JSON tree is held.
+        """
+        try:
+            issues, size = self._send(operation, method, path, self._read_records, stream=True, **kwargs)
+            metrics.YOUTRACK_RESPONSE_BYTES.observe(size, operation)
+        except Exception:
+            metrics.ERRORS.inc("youtrack")
+            raise
+        return issues, size
+
+    def _send(self, operation: str, method: str, path: str, read: Callable[[requests.Response], Any], **kwargs):
+        """
+            Send the request and read its response, retrying 429 and 5xx with exponential backoff or the Retry-After
+            sent by YouTrack. The concurrency slot is released while backing off, as in AsyncYoutrack.
+        """
+        for attempt in range(self.max_retries + 1):
+            with self.concurrency, metrics.YOUTRACK_REQUEST_SECONDS.time(operation, metrics.current_module.get()):
+                with self.session.request(method, f"{self.api_endpoint}{path}", timeout=REQUEST_TIMEOUT_SECS, **kwargs) as response:
+                    if response.status_code not in RETRY_STATUS_CODES or attempt == self.max_retries:
+                        raise_on_rate_limit(response.status_code, response.headers.get("Retry-After"))
+                        return read(response)
+                    delay = get_retry_after(response.headers.get("Retry-After")) or self.retry_backoff_factor * (2 ** attempt)
+            time.sleep(delay)
+
+    @staticmethod
+    def _read_records(response: requests.Response) -> Fetched:
+        issues: List[Issue] = []
+        size = 0
+        decoder = JsonArrayDecoder()
+        for chunk in response.iter_content(STREAM_CHUNK_SIZE):
+            size += len(chunk)
+            issues.extend(Issue.from_json(issue) for issue in decoder.feed(chunk))
+        issues.extend(Issue.from_json(issue) for issue in decoder.close())
+        if decoder.value is not None:
+            raise_on_error(decoder.value)
+            raise Exception(f"Unexpected YouTrack response: {decoder.value}")
+        return issues, size
+
+
+def raise_on_error(payload):
+    if "error" in payload:
+        raise Exception(f"""{payload.get("error")}: {payload.get("error_description", "")}\n{payload.get("error_developer_message", "")}""")
+
+
+def raise_on_rate_limit(status: int, retry_after: Optional[str]):
+    if status == HTTP_TOO_MANY_REQUESTS:
+        raise RateLimitedError(get_retry_after(retry_after))
@@ -1,132 +1,240 @@
+from configparser import SectionProxy
 from datetime import datetime, timedelta
-import time
+import json
+import math
 import threading
-from typing import Dict, List
+from typing import Dict, Iterator, List, Optional, Tuple
 import urllib.parse
-from util import config
+from util import config, metrics
+from util.block_kit import InteractiveMessage, Message, get_button, get_static_select, to_slack_markdown
+from util.cluster import DEFAULT_HEARTBEAT_INTERVAL_SECS, DEFAULT_LEASE_TTL_SECS, Cluster
 from util.config import Config
+from util.schedule import ModuleSchedule
 from util.utils import STAT_YOUTRACK_DATE_FORMAT, get_today_timestamp
-from youtrack.youtrack import Youtrack
+from youtrack.field_profiles import FIELDS_SECTION, FieldProfile, load_field_profiles
+from youtrack.issue import Issue
+from youtrack.issue_mirror import DEFAULT_MIRROR_MAX_AGE_SECS, IssueMirrors
+from youtrack.push_tracking import DEFAULT_SWEEP_INTERVAL_SECS, PushTracking
+from youtrack.query_matcher import QueryMatcher, compile_query
+from youtrack.response_cache import DEFAULT_CACHE_MAX_ENTRIES, DEFAULT_CACHE_MAX_MB, DEFAULT_CACHE_TTL_SECS
+from youtrack.scheduler import DEFAULT_GRACE_PERIOD_SECS, DEFAULT_WORKERS, Scheduler
+from youtrack.stats_rollups import (DEFAULT_ROLLUPS_FILE_NAME, DEFAULT_ROLLUPS_MAX_AGE_SECS, ROLLUPS_FIELD_PROFILE, Period,
+                                    StatsRollups, parse_period)
+from youtrack.shared_tracking import SharedTracking
+from youtrack.tracking_cadence import DEFAULT_MAX_BACKOFF_SECS, DEFAULT_MAX_INTERVAL_SECS, DEFAULT_MIN_INTERVAL_SECS, TrackingCadence
+from youtrack.youtrack import (DEFAULT_MAX_CONCURRENCY, DEFAULT_MAX_RETRIES, DEFAULT_PAGE_SIZE, DEFAULT_POOL_SIZE,
+                               DEFAULT_RETRY_BACKOFF_FACTOR, Youtrack)
+from youtrack.youtrack_stats import DEFAULT_STATS_WORKERS, STATS_BY_TAG_FIELD_PROFILE, Stats, YoutrackStats
 
 POLLING_INTERVAL = 60  # in secs
 STAT_DATE_FORMAT = "%a %d %b %Y"
+DIGEST_HEADER = "Digest:"
+NO_TICKET = "No ticket!"
+DEFAULT_DIGEST_PAGE_SIZE = 20
+# paginated digest buttons, their value is the page to show (see get_digest_action_value)
+DIGEST_ACTION_PREVIOUS = "digest_previous"
+DIGEST_ACTION_NEXT = "digest_next"
+DIGEST_ACTION_TAG = "digest_tag"
 
+# fields read by _get_issue_markdown, digest lines do not show the reporter, tracking claims issues by id
+TRACKING_FIELD_PROFILE = FieldProfile("tracking", "id,idReadable,summary,created,reporter(email),tags(name)")
+DIGEST_FIELD_PROFILE = FieldProfile("digest", "idReadable,summary,created,tags(name)")
+FIELD_PROFILES = [TRACKING_FIELD_PROFILE, DIGEST_FIELD_PROFILE, STATS_BY_TAG_FIELD_PROFILE, ROLLUPS_FIELD_PROFILE]
+
+
+def get_youtrack_settings(youtrack_config: SectionProxy) -> dict:
+    return {
+        "base_url": youtrack_config["base_url"],
+        "authorization_header": youtrack_config["authorization_header"],
+        "api_endpoint": youtrack_config["api_endpoint"],
+        "max_issues": int(
+            youtrack_config["max_issues"]),
+        "all_issue_fields": youtrack_config.get("all_issue_fields", fallback=TRACKING_FIELD_PROFILE.required),
+        "issue_id_field": youtrack_config["issue_id_field"],
+        "pool_size": youtrack_config.getint("pool_size", fallback=DEFAULT_POOL_SIZE),
+        "max_retries": youtrack_config.getint("max_retries", fallback=DEFAULT_MAX_RETRIES),
+        "retry_backoff_factor": youtrack_config.getfloat("retry_backoff_factor", fallback=DEFAULT_RETRY_BACKOFF_FACTOR),
+        "page_size": youtrack_config.getint("page_size", fallback=DEFAULT_PAGE_SIZE),
+        "prefetch_next_page": youtrack_config.getboolean("prefetch_next_page", fallback=False),
+        "max_concurrency": youtrack_config.getint("max_concurrency", fallback=DEFAULT_MAX_CONCURRENCY),
+        "response_cache": youtrack_config.getboolean("response_cache", fallback=False),
+        "response_cache_ttl": youtrack_config.getint("response_cache_ttl", fallback=DEFAULT_CACHE_TTL_SECS),
+        "response_cache_max_entries": youtrack_config.getint("response_cache_max_entries", fallback=DEFAULT_CACHE_MAX_ENTRIES),
+        "response_cache_max_mb": youtrack_config.getint("response_cache_max_mb", fallback=DEFAULT_CACHE_MAX_MB)
+    }
+
+
+def get_digest_action_value(page: int, tag: Optional[str]) -> str:
+    # the digest state travels with the message, any replica can serve the next page
+    return json.dumps({"page": page, "tag": tag}, separators=(",", ":"))
+
+
+def parse_digest_action_value(value: str) -> Tuple[int, Optional[str]]:
+    state = json.loads(value)
+    return max(0, int(state.get("page", 0))), state.get("tag")
+
+
+def _is_polling(module_schedule: Optional[ModuleSchedule]) -> bool:
+    return module_schedule is not None and module_schedule.schedule is not None and module_schedule.schedule.is_polling
+
+
+class BaseYoutrackChecker:
+    """
+        Scheduling and rendering shared by the threaded checker and the asyncio one.
+    """
 
-class YoutrackChecker(threading.Thread):
     def __init__(self, configuration: Config, send_message_to_channel_cb) -> None:
-        super().__init__()
         self.send_message_to_channel_cb = send_message_to_channel_cb
         self.config: Config = configuration
-        self.youtrack: Youtrack = Youtrack(
-            base_url=configuration.configuration["youtrack"]["base_url"],
-            authorization_header=configuration.configuration["youtrack"]["authorization_header"],
-            api_endpoint=configuration.configuration["youtrack"]["api_endpoint"],
-            max_issues=int(
-                configuration.configuration["youtrack"]["max_issues"]),
-            all_issue_fields=configuration.configuration["youtrack"]["all_issue_fields"],
-            issue_id_field=configuration.configuration["youtrack"]["issue_id_field"]
-        )
+        self.base_url: str = configuration.configuration["youtrack"]["base_url"]
+        fields_config = configuration.configuration[FIELDS_SECTION] if configuration.configuration.has_section(FIELDS_SECTION) else None
+        self.fields: Dict[str, str] = load_field_profiles(FIELD_PROFILES, fields_config)
+        # with adaptive tracking, polling tracking jobs fire every min interval and the cadence picks the channels to poll,
+        # polling digest and stats keep the regular interval
+        adaptive = configuration.configuration.getboolean("tracking", "adaptive", fallback=False)
+        self.polling_interval: int = POLLING_INTERVAL
+        self.tracking_interval: int = POLLING_INTERVAL
+        if adaptive:
+            self.tracking_interval = configuration.configuration.getint("tracking", "min_interval", fallback=DEFAULT_MIN_INTERVAL_SECS)
+        self.tracking_cadence: TrackingCadence = TrackingCadence(
+            self.tracking_interval, POLLING_INTERVAL,
+            min_interval_secs=self.tracking_interval,
+            max_interval_secs=configuration.configuration.getint(
+                "tracking", "max_interval", fallback=DEFAULT_MAX_INTERVAL_SECS) if adaptive else POLLING_INTERVAL,
+            max_backoff_secs=configuration.configuration.getint("tracking", "max_backoff", fallback=DEFAULT_MAX_BACKOFF_SECS))
+        self.digest_paginated: bool = configuration.configuration.getboolean("digest", "paginated", fallback=False)
+        self.digest_page_size: int = configuration.configuration.getint("digest", "page_size", fallback=DEFAULT_DIGEST_PAGE_SIZE)
+        self.push_tracking: Optional[PushTracking] = None
+        if configuration.configuration.getboolean("webhook", "enabled", fallback=False):
+            self.push_tracking = PushTracking(
+                configuration,
+                sweep_interval_secs=configuration.configuration.getint("webhook", "sweep_interval", fallback=DEFAULT_SWEEP_INTERVAL_SECS))
+        self.cluster: Optional[Cluster] = None
+        if configuration.configuration.getboolean("cluster", "enabled", fallback=False):
+            self.cluster = Cluster(
+                configuration.state.file_name,
+                replica_id=configuration.configuration.get("cluster", "replica_id", fallback=None),
+                lease_ttl_secs=configuration.configuration.getint("cluster", "lease_ttl", fallback=DEFAULT_LEASE_TTL_SECS),
+                heartbeat_interval_secs=configuration.configuration.getint(
+                    "cluster", "heartbeat_interval", fallback=DEFAULT_HEARTBEAT_INTERVAL_SECS))
 
-    def run(self):
-        while True:
-            for _, channel_name in self.config.get_channel_entries():
-                for module in config.MODULES:
-                    if self.config.get_module_value_for_channel(channel_name, module) != "":
-                        frequency_config = self.config.get_module_value_for_channel(channel_name, module)
-                        frequency = frequency_config.split(" ")[0]
-                        try:
-                            match frequency:
-                                case config.FREQUENCY_POLLING:
-                                    self._polling(module, frequency, channel_name)
-                                case config.FREQUENCY_DAILY:
-                                    self._daily(module, frequency,
-                                                channel_name, " ".join(frequency_config.split(" ")[1:]))
-                                case config.FREQUENCY_WEEKLY:
-                                    self._weekly(module, frequency,
-                                                channel_name, " ".join(frequency_config.split(" ")[1:]))
-                                case _:
-                                    print(
-                                        f"Unkown frequency {frequency} for module {module} in {channel_name}")
-                            self.config.save_config()
-                        except Exception as exception:
-                            print(f"Error processing module '{module}' for frequency '{frequency}' : {str(exception)}")
-
-            time.sleep(POLLING_INTERVAL)
+    def _get_scheduled_jobs(self) -> Iterator[Tuple[str, str, ModuleSchedule]]:
+        for channel in self.config.get_channels():
+            if self.cluster is not None and not self.cluster.owns(channel.key):
+                continue
+            for module, module_schedule in list(channel.modules.items()):
+                yield channel.name, module, module_schedule
 
-    def _execute_module(self, module: str, frequency: str, channel_name: str):
-        match module:
-            case config.MODULE_TRACKING:
-                self._tracking(channel_name)
-            case config.MODULE_DIGEST:
-                self._digest(channel_name)
-            case config.MODULE_STATS:
-                self._stats(channel_name, frequency)
+    def _get_cluster_channels(self) -> List[str]:
+        self.config.reload_channels()
+        return [channel.key for channel in self.config.get_channels()]
 
-    def _polling(self, module: str, frequency: str, channel_name: str):
-        self._execute_module(module, frequency, channel_name)
+    def _set_last_check(self, channel_name: str, last_check: str):
+        """
+            In a cluster, the last check is only written while the channel lease is held, so that a replica
+            which lost it cannot move the last check of the new owner backwards.
+        """
+        if self.cluster is None or self.config.get_channel(channel_name) is None:
+            self.config.set_last_check_for_channel(channel_name, last_check)  # no-op once the channel is deleted
+        elif not self.config.set_fenced_last_check_for_channel(channel_name, last_check,
+                                                               *self.cluster.get_fence(channel_name.lower())):
+            metrics.CLUSTER_FENCED_WRITES.inc()
+            raise Exception(f"Lease on {channel_name} lost, last check not saved")
 
-    def _daily(self, module: str, frequency: str, channel_name: str, timestamp: str):
-        if datetime.now().strftime("%H:%M") in [timestamp, f"0{timestamp}"]:
-            self._execute_module(module, frequency, channel_name)
+    def _on_invalid_schedule(self, channel_name: str, module: str, module_schedule: ModuleSchedule):
+        msg = (f"Unable to parse {module} configuration: _{module_schedule.frequency_config}_.\n"
+               f"{str(module_schedule.error)}")
+        print(msg)
+        self.send_message_to_channel_cb(
+            channel_name=channel_name, message=msg)
 
-    def _weekly(self, module: str, frequency: str, channel_name: str, day_time: str):
-        try:
-            day = day_time.split(" ")[0]
-            day_number = datetime.strptime(day, "%A")
-            hour_minutes = day_time.split(" ")[1].split(":")
-            now = datetime.now()
-            if now.weekday() == day_number.weekday() and now.hour == int(hour_minutes[0]) and now.minute == int(hour_minutes[1]):
-                self._execute_module(module, frequency, channel_name)
+    def invalidate_channel(self, channel_name: str, query: str = ""):
+        """
+            Called when the channel query is set or deleted, to drop anything derived from the previous query.
+            Cached YouTrack responses of the query are dropped, so that the channel is first answered live.
+        """
+        metrics.CHANNEL_UNRESOLVED_ISSUES.remove(channel_name)
+        if query != "":
+            self.youtrack.invalidate_cache(query)
+        self.tracking_cadence.invalidate(channel_name)
+        if self.push_tracking is not None:
+            self.push_tracking.invalidate(channel_name)
 
-        except Exception as exception:
-            msg = (f"Unable to parse weekly configuration: _{day_time}_."
-                   "Expected format: weekly <day> <hour:minute> (in 24h format)"
-                   "eg: weekly friday 14:30"
-                   f"Exception: {str(exception)}")
+    def on_issue_created(self, issue: dict) -> List[str]:
+        """
+            Notify an issue pushed by YouTrack to the channels tracking by polling whose query matches it,
+            return their names. Called from the webhook server thread.
+        """
+        channels = [channel for channel in self.config.get_channels() if _is_polling(channel.modules.get(config.MODULE_TRACKING))
+                    and (self.cluster is None or self.cluster.owns(channel.key))]
+        channel_names = self.push_tracking.get_matching_channels(channels, issue)
+        if len(channel_names) > 0:
+            new_issue_msg = self._get_issue_markdown(Issue.from_json(issue))
+            for channel_name in channel_names:
+                self.send_message_to_channel_cb(
+                    channel_name=channel_name, message=new_issue_msg, coalesce=True)
+                metrics.CHANNEL_TRACKED_ISSUES.inc(channel_name)
+        return channel_names
 
-            self.send_message_to_channel_cb(
-                channel_name=channel_name, message=msg)
+    def _is_tracking_due(self, channel_name: str, frequency: str) -> bool:
+        """
+            Polling follows the channel cadence (adaptive interval, backoff after errors).
+            For channels receiving pushed issues, polling is only a reconciliation sweep run every sweep interval.
+        """
+        if frequency != config.FREQUENCY_POLLING:
+            return True
+        if not self.tracking_cadence.start_poll(channel_name):
+            return False
+        return not self._is_pushed(channel_name) or self.push_tracking.start_sweep(channel_name)
 
-    def _digest(self, channel_name: str):
-        msg = self.get_digest(channel_name)
-        self.send_message_to_channel_cb(
-            channel_name=channel_name, message=msg)
+    def _is_pushed(self, channel_name: str) -> bool:
+        if self.push_tracking is None:
+            return False
+        channel = self.config.get_channel(channel_name)
+        return channel is not None and self.push_tracking.is_pushed(channel)
 
-    def _tracking(self, channel_name: str):
+    def _on_tracking_poll(self, channel_name: str, issue_count: int):
+        self.tracking_cadence.on_poll(channel_name, issue_count)
+        if self.push_tracking is not None:
+            self.push_tracking.end_sweep(channel_name)
+
+    def _get_tracking_query(self, channel_name: str) -> Tuple[str, str]:
+        """
+            Query of the issues created since the channel last check, and the last check to save once they are notified.
+        """
         last_check: str = self.config.get_module_value_for_channel(channel_name, config.POLLING_LASTCHECK)
+        channel_query: str = self.config.get_module_value_for_channel(channel_name, config.QUERY_ENTRY)
         now: str = get_today_timestamp()
         last_poll: str = get_today_timestamp(1) #+1 sec to avoid checking the same second twice
-        query: str = f"""{self.config.get_module_value_for_channel(channel_name, config.QUERY_ENTRY)} created: {last_check} .. {now}"""
-        for issue in self.youtrack.get_issues(query):
-            new_issue_msg = self._get_issue_markdown(issue)
-            self.send_message_to_channel_cb(
-                channel_name=channel_name, message=new_issue_msg)
-        self.config.set_module_value_for_channel(channel_name, config.POLLING_LASTCHECK, last_poll)
-
-    def _get_issue_markdown(self, issue: dict, from_visible=True, creation_date_visible=False):
-        new_issue_msg: str = ""
+        return f"""{channel_query} created: {last_check} .. {now}""", last_poll
+
+    def _notify_new_issue(self, channel_name: str, issue: Issue):
+        if not self._is_new_issue(channel_name, issue):
+            return
+        new_issue_msg = self._get_issue_markdown(issue)
+        self.send_message_to_channel_cb(
+            channel_name=channel_name, message=new_issue_msg, coalesce=True)
+        metrics.CHANNEL_TRACKED_ISSUES.inc(channel_name)
+
+    def _is_new_issue(self, channel_name: str, issue: Issue) -> bool:
+        # only claimed when a push may have notified it too
+        return not self._is_pushed(channel_name) or self.push_tracking.claim(channel_name, issue.id)
+
+    def _get_issue_markdown(self, issue: Issue, from_visible=True, creation_date_visible=False) -> str:
+        parts: List[str] = []
         if creation_date_visible:
-            new_issue_msg = f"""`{datetime.fromtimestamp(issue["created"]/1000).strftime(STAT_DATE_FORMAT)}` - """
+            parts.append(f"""`{datetime.fromtimestamp(issue.created/1000).strftime(STAT_DATE_FORMAT)}` - """)
 
-        new_issue_msg += f"""<{self.youtrack.base_url}/issue/{issue["idReadable"]}|{issue["idReadable"]}> - {issue["summary"]}"""
-        for tag in issue.get("tags", []):
-            new_issue_msg += f""" `{tag.get("name", "")}`"""
+        parts.append(f"""<{self.base_url}/issue/{issue.id_readable}|{issue.id_readable}> - {issue.summary}""")
+        for tag in issue.tags:
+            parts.append(f""" `{tag}`""")
         if from_visible:
-            new_issue_msg += f"""\nFrom : {issue["reporter"]["email"]}"""
-        new_issue_msg = new_issue_msg.replace("**", "³³").replace("*", "_").replace(
-            "³³", "*").replace("##", "*").replace("\[", "[").replace("\]", "]")
+            parts.append(f"""\nFrom : {issue.reporter_email}""")
 
-        return new_issue_msg
+        return to_slack_markdown("".join(parts))
 
     def _get_markdown_query_link(self, query: str, url_label: str) -> str:
-        return f"<{self.youtrack.base_url}/issues?u=1&q={urllib.parse.quote(query)}|{url_label}>"
-
-    def _stats(self, channel_name: str, frequency: str):
-        period = self.get_beginning_end_from_frequency(frequency)
-
-        msg = self.get_stats(channel_name, period)
-        self.send_message_to_channel_cb(
-            channel_name=channel_name, message=msg)
+        return f"<{self.base_url}/issues?u=1&q={urllib.parse.quote(query)}|{url_label}>"
 
     def get_beginning_end_from_frequency(self, frequency) -> str:
         period: str = ""
@@ -143,15 +251,219 @@ class YoutrackChecker(threading.Thread):
 
         return period
 
-    def get_digest(self, channel_name: str) -> str:
-        msg: str = "No ticket!"
+    def _get_stats_markdown(self, stats: Stats, period: str) -> str:
+        ticket_count_by_tag_msg = self._get_ticket_count_by_tag(stats.ticket_count_by_tag)
+
+        return (f"Stats for period _{period}_:\n"
+                f""" 🛎️ {self._get_markdown_query_link(stats.base_query, f"{stats.created_count} tickets")} have been created.\n"""
+                f""" 🏗️ {self._get_markdown_query_link(stats.unresolved_query, f"{stats.unresolved_count} tickets")} are still opened.{ticket_count_by_tag_msg}\n"""
+                f""" ✅ {self._get_markdown_query_link(stats.resolved_query, f"{stats.resolved_count} tickets")} among created have been closed + {self._get_markdown_query_link(stats.resolved_other_issues_query, f"{stats.resolved_other_issues_count} tickets")} from previous creation period."""
+                f"""\n 🧮 {self._get_markdown_query_link(stats.all_time_unresolved_query, f"{stats.all_time_unresolved_count}")} all time unresolved tickets."""
+                )
+
+    def _get_ticket_count_by_tag(self, ticket_count_by_tag: Dict[str, int]) -> str:
+        return "".join(f"""\n  - {count} tickets `{tag}` """ for tag, count in ticket_count_by_tag.items())
+
+    @staticmethod
+    def _get_digest_header() -> List[str]:
+        return [DIGEST_HEADER, ""]
+
+    def _get_digest_line(self, issue: Issue) -> str:
+        return f" - {self._get_issue_markdown(issue, creation_date_visible=True, from_visible=False)}"
+
+    @staticmethod
+    def _get_digest_query(channel_query: str, tag: Optional[str]) -> str:
+        query = f"#Unresolved {channel_query}"
+        return f"{query} tag: {{{tag}}}" if tag is not None else query
+
+    def _get_digest_page_count(self, issue_count: int) -> int:
+        return max(1, math.ceil(issue_count / self.digest_page_size))
+
+    def _get_digest_page_message(self, issues: List[Issue], issue_count: int, page: int, tag: Optional[str]) -> Message:
+        """
+            A digest page with previous/next buttons and a tag filter built from the tags of the page.
+        """
+        if issue_count == 0 and tag is None:
+            return NO_TICKET
+        page_count = self._get_digest_page_count(issue_count)
+        tagged = f" tagged `{tag}`" if tag is not None else ""
+        lines: List[str] = [f"{DIGEST_HEADER} {issue_count} unresolved tickets{tagged}, page {page + 1}/{page_count}", ""]
+        lines.extend(self._get_digest_line(issue) for issue in issues)
+
+        elements: List[dict] = []
+        if page > 0:
+            elements.append(get_button("‹ Previous", DIGEST_ACTION_PREVIOUS, get_digest_action_value(page - 1, tag)))
+        if page + 1 < page_count:
+            elements.append(get_button("Next ›", DIGEST_ACTION_NEXT, get_digest_action_value(page + 1, tag)))
+        options = [(name, get_digest_action_value(0, name))
+                   for name in sorted({name for issue in issues for name in issue.tags} - {tag})]
+        if tag is not None:
+            options.insert(0, ("All tags", get_digest_action_value(0, None)))
+        tag_filter = get_static_select("Filter by tag", DIGEST_ACTION_TAG, options)
+        if len(tag_filter["options"]) > 0:
+            elements.append(tag_filter)
+
+        return InteractiveMessage(lines, [{"type": "actions", "elements": elements}] if len(elements) > 0 else [])
+
+
+class YoutrackChecker(BaseYoutrackChecker, threading.Thread):
+    def __init__(self, configuration: Config, send_message_to_channel_cb) -> None:
+        BaseYoutrackChecker.__init__(self, configuration, send_message_to_channel_cb)
+        threading.Thread.__init__(self)
+        youtrack_config = configuration.configuration["youtrack"]
+        self.youtrack: Youtrack = Youtrack(**get_youtrack_settings(youtrack_config))
+        if self.youtrack.cache is not None:
+            metrics.YOUTRACK_CACHE_BYTES.set_function(self.youtrack.cache.get_bytes)
+        self.stats: YoutrackStats = YoutrackStats(
+            self.youtrack, max_workers=youtrack_config.getint("stats_workers", fallback=DEFAULT_STATS_WORKERS),
+            tags_fields=self.fields[STATS_BY_TAG_FIELD_PROFILE.name])
+        self.shared_tracking: Optional[SharedTracking] = None
+        if youtrack_config.getboolean("shared_tracking", fallback=False):
+            self.shared_tracking = SharedTracking(self.youtrack, self.fields[TRACKING_FIELD_PROFILE.name], self.tracking_interval)
+        self.issue_mirrors: Optional[IssueMirrors] = None
+        if youtrack_config.getboolean("issue_mirror", fallback=False):
+            self.issue_mirrors = IssueMirrors(
+                self.youtrack, self.fields[DIGEST_FIELD_PROFILE.name],
+                max_age_secs=youtrack_config.getint("issue_mirror_max_age", fallback=DEFAULT_MIRROR_MAX_AGE_SECS))
+        self.rollups: Optional[StatsRollups] = None
+        if configuration.configuration.getboolean("rollups", "enabled", fallback=False):
+            self.rollups = StatsRollups(
+                self.youtrack,
+                file_name=configuration.configuration.get("rollups", "file_name", fallback=DEFAULT_ROLLUPS_FILE_NAME),
+                max_age_secs=configuration.configuration.getint("rollups", "max_age", fallback=DEFAULT_ROLLUPS_MAX_AGE_SECS),
+                fields=self.fields[ROLLUPS_FIELD_PROFILE.name])
+        self.scheduler: Scheduler = Scheduler(
+            jobs_provider=self._get_scheduled_jobs,
+            execute_cb=self._execute_scheduled_job,
+            invalid_schedule_cb=self._on_invalid_schedule,
+            polling_interval=self.polling_interval,
+            module_polling_intervals={config.MODULE_TRACKING: self.tracking_interval},
+            max_workers=configuration.configuration.getint("scheduler", "workers", fallback=DEFAULT_WORKERS),
+            grace_period_secs=configuration.configuration.getint("scheduler", "grace_period", fallback=DEFAULT_GRACE_PERIOD_SECS))
+
+    def run(self):
+        if self.cluster is not None:
+            self.cluster.start(self._get_cluster_channels)
+        self.scheduler.run_forever()
+
+    def invalidate_channel(self, channel_name: str, query: str = ""):
+        super().invalidate_channel(channel_name, query)
+        if self.issue_mirrors is not None:
+            self.issue_mirrors.invalidate(channel_name)
+        if self.rollups is not None:
+            self.rollups.delete_channel(channel_name.lower())
+
+    def _execute_scheduled_job(self, channel_name: str, module: str, module_schedule: ModuleSchedule):
+        frequency = module_schedule.frequency
+        token = metrics.current_module.set(module)
+        try:
+            self._execute_module(module, frequency, channel_name)
+        except Exception as exception:
+            print(f"Error processing module '{module}' for frequency '{frequency}' : {str(exception)}")
+            metrics.ERRORS.inc("module")
+        finally:
+            metrics.current_module.reset(token)
+
+    def _execute_module(self, module: str, frequency: str, channel_name: str):
+        match module:
+            case config.MODULE_TRACKING if self._is_tracking_due(channel_name, frequency):
+                self._tracking(channel_name)
+            case config.MODULE_DIGEST:
+                self._digest(channel_name)
+            case config.MODULE_STATS:
+                self._stats(channel_name, frequency)
+
+    def _digest(self, channel_name: str):
+        msg = self.get_digest(channel_name)
+        self.send_message_to_channel_cb(
+            channel_name=channel_name, message=msg)
+
+    def _tracking(self, channel_name: str):
         try:
-            issues = self.youtrack.get_issues(
-                f"""#Unresolved {self.config.get_module_value_for_channel(channel_name, config.QUERY_ENTRY)}""")
-            if len(issues) > 0:
-                msg = "Digest:\n"
-                for issue in issues:
-                    msg += f"\n - {self._get_issue_markdown(issue, creation_date_visible=True, from_visible=False)}"
+            issue_count = self._poll_new_issues(channel_name)
+        except Exception as exception:
+            self.tracking_cadence.on_error(channel_name, exception)
+            raise
+        self._on_tracking_poll(channel_name, issue_count)
+
+    def _poll_new_issues(self, channel_name: str) -> int:
+        issue_count = 0
+        channel_query: str = self.config.get_module_value_for_channel(channel_name, config.QUERY_ENTRY)
+        matcher: Optional[QueryMatcher] = compile_query(channel_query) if self.shared_tracking is not None else None
+        if matcher is not None:
+            last_check: str = self.config.get_module_value_for_channel(channel_name, config.POLLING_LASTCHECK)
+            issues, until = self.shared_tracking.get_new_issues(matcher, last_check)
+            last_poll: str = (until + timedelta(seconds=1)).strftime(STAT_YOUTRACK_DATE_FORMAT)
+        else:
+            query, last_poll = self._get_tracking_query(channel_name)
+            issues = self.youtrack.iter_issue_records(query, fields=self.fields[TRACKING_FIELD_PROFILE.name], cached=False)
+
+        for issue in issues:
+            issue_count += 1
+            self._notify_new_issue(channel_name, issue)
+        self._set_last_check(channel_name, last_poll)
+        return issue_count
+
+    def _stats(self, channel_name: str, frequency: str):
+        period = self.get_beginning_end_from_frequency(frequency)
+
+        msg = self.get_stats(channel_name, period)
+        self.send_message_to_channel_cb(
+            channel_name=channel_name, message=msg)
+
+    def get_digest(self, channel_name: str) -> Message:
+        """
+            A paginated digest only returns its first page.
+        """
+        if self.digest_paginated:
+            return self.get_digest_page(channel_name)
+        return self._iter_digest_lines(channel_name)
+
+    def _iter_digest_lines(self, channel_name: str) -> Iterator[str]:
+        """
+            The digest line by line as issues are read, the outbox renders and posts it as it goes without holding it.
+        """
+        issue_count = 0
+        try:
+            channel_query: str = self.config.get_module_value_for_channel(channel_name, config.QUERY_ENTRY)
+            if self.issue_mirrors is not None:
+                issues = self.issue_mirrors.get_mirror(channel_name, channel_query).get_issues()
+            else:
+                issues = self.youtrack.iter_issue_records(f"""#Unresolved {channel_query}""",
+                                                          fields=self.fields[DIGEST_FIELD_PROFILE.name])
+            for issue in issues:
+                if issue_count == 0:
+                    yield from self._get_digest_header()
+                issue_count += 1
+                yield self._get_digest_line(issue)
+            if issue_count == 0:
+                yield NO_TICKET
+            metrics.CHANNEL_UNRESOLVED_ISSUES.set(issue_count, channel_name)
+        except Exception as exception:
+            yield str(exception)
+
+    def get_digest_page(self, channel_name: str, page: int = 0, tag: Optional[str] = None) -> Message:
+        """
+            One page of the digest, only the issues of this page are read (or sliced from the mirror).
+        """
+        msg: Message = NO_TICKET
+        try:
+            channel_query: str = self.config.get_module_value_for_channel(channel_name, config.QUERY_ENTRY)
+            size = self.digest_page_size
+            if self.issue_mirrors is not None:
+                issues = [issue for issue in self.issue_mirrors.get_mirror(channel_name, channel_query).get_issues()
+                          if tag is None or tag in issue.tags]
+                issue_count = len(issues)
+                page = min(page, self._get_digest_page_count(issue_count) - 1)
+                issues = issues[page * size:(page + 1) * size]
+            else:
+                query = self._get_digest_query(channel_query, tag)
+                issue_count = self.youtrack.count_issues(query)
+                page = min(page, self._get_digest_page_count(issue_count) - 1)
+                issues = self.youtrack.get_issue_page(query, page * size, size, fields=self.fields[DIGEST_FIELD_PROFILE.name])
+            if tag is None:
+                metrics.CHANNEL_UNRESOLVED_ISSUES.set(issue_count, channel_name)
+            msg = self._get_digest_page_message(issues, issue_count, page, tag)
         except Exception as exception:
             msg = str(exception)
 
@@ -159,44 +471,18 @@ class YoutrackChecker(threading.Thread):
 
     def get_stats(self, channel_name: str, period: str) -> str:
         try:
-            all_time_unresolved_query: str = f"""#Unresolved {self.config.get_module_value_for_channel(channel_name, config.QUERY_ENTRY)}"""
-            all_time_unresolved_issues: List[dict] = self.youtrack.get_issues(
-                all_time_unresolved_query, only_issue_ids=True)
-
-            base_query: str = f"""{self.config.get_module_value_for_channel(channel_name, config.QUERY_ENTRY)} created: {period}"""
-            unresolved_query: str = f"#Unresolved {base_query}"
-            unresolved_issues: List[dict] = self.youtrack.get_issues(
-                unresolved_query)
-
-            ticket_count_by_tag_msg = self._get_ticket_count_by_tag(
-                unresolved_issues)
-
-            resolved_query: str = f"#Resolved {base_query}"
-            resolved_issues: List[dict] = self.youtrack.get_issues(resolved_query)
-
-            resolved_other_issues_query: str = f"""#Resolved {self.config.get_module_value_for_channel(channel_name, config.QUERY_ENTRY)} resolved date: {period}"""
-            resolved_other_issues: List[dict] = self.youtrack.get_issues(
-                (resolved_other_issues_query))
-
-            msg: str = (f"Stats for period _{period}_:\n"
-                        f""" 🛎️ {self._get_markdown_query_link(base_query, f"{len(unresolved_issues)+len(resolved_issues)} tickets")} have been created.\n"""
-                        f""" 🏗️ {self._get_markdown_query_link(unresolved_query, f"{len(unresolved_issues)} tickets")} are still opened.{ticket_count_by_tag_msg}\n"""
-                        f""" ✅ {self._get_markdown_query_link(resolved_query, f"{len(resolved_issues)} tickets")} among created have been closed + {self._get_markdown_query_link(resolved_other_issues_query, f"{len(resolved_other_issues)} tickets")} from previous creation period."""
-                        f"""\n 🧮 {self._get_markdown_query_link(all_time_unresolved_query, f"{len(all_time_unresolved_issues)}")} all time unresolved tickets."""
-                        )
+            channel_query: str = self.config.get_module_value_for_channel(channel_name, config.QUERY_ENTRY)
+            days: Optional[Period] = parse_period(period) if self.rollups is not None else None
+            if days is not None:
+                stats: Stats = self.rollups.get_stats(channel_name.lower(), channel_query, period, days)
+            else:
+                all_time_unresolved_count: Optional[int] = None
+                if self.issue_mirrors is not None:
+                    all_time_unresolved_count = self.issue_mirrors.get_mirror(channel_name, channel_query).get_count()
+                stats: Stats = self.stats.get_stats(channel_query, period, all_time_unresolved_count)
+            metrics.CHANNEL_UNRESOLVED_ISSUES.set(stats.all_time_unresolved_count, channel_name)
+            msg: str = self._get_stats_markdown(stats, period)
         except Exception as exception:
             msg = str(exception)
         
         return msg
-
-    def _get_ticket_count_by_tag(self, issues: List[dict]) -> str:
-        ticket_count_by_tag_msg: str = ""
-        ticket_count_by_tag: Dict[str, int] = {}
-        for issue in issues:
-            for tag in issue["tags"]:
-                if tag["name"] not in ticket_count_by_tag:
-                    ticket_count_by_tag[tag["name"]] = 0
-                ticket_count_by_tag[tag["name"]] += 1
-        for tag, count in ticket_count_by_tag.items():
-            ticket_count_by_tag_msg += f"""\n  - {count} tickets `{tag}` """
-        return ticket_count_by_tag_msg
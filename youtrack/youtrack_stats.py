@@ -0,0 +1,95 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+import contextvars
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from youtrack.field_profiles import FieldProfile
+from youtrack.youtrack import Youtrack
+
+DEFAULT_STATS_WORKERS = 5
+TAGS_FIELD = "tags(name)"
+# read by count_issues_by_tag
+STATS_BY_TAG_FIELD_PROFILE = FieldProfile("stats_by_tag", TAGS_FIELD)
+
+
+class Stats:
+    def __init__(self, query: str, period: str) -> None:
+        self.all_time_unresolved_query: str = f"#Unresolved {query}"
+        self.base_query: str = f"{query} created: {period}"
+        self.unresolved_query: str = f"#Unresolved {self.base_query}"
+        self.resolved_query: str = f"#Resolved {self.base_query}"
+        self.resolved_other_issues_query: str = f"#Resolved {query} resolved date: {period}"
+
+        self.all_time_unresolved_count: int = 0
+        self.unresolved_count: int = 0
+        self.resolved_count: int = 0
+        self.resolved_other_issues_count: int = 0
+        self.ticket_count_by_tag: Dict[str, int] = {}
+
+    @property
+    def created_count(self) -> int:
+        return self.unresolved_count + self.resolved_count
+
+    def get_count_queries(self, all_time_unresolved_count: Optional[int] = None) -> List[Tuple[str, str]]:
+        """
+            (count attribute, query) of every count of the stats, all time unresolved is skipped when already known.
+            The per-tag breakdown is read from the issues of unresolved_query.
+        """
+        queries: List[Tuple[str, str]] = [("unresolved_count", self.unresolved_query),
+                                          ("resolved_count", self.resolved_query),
+                                          ("resolved_other_issues_count", self.resolved_other_issues_query)]
+        if all_time_unresolved_count is None:
+            queries.insert(0, ("all_time_unresolved_count", self.all_time_unresolved_query))
+        else:
+            self.all_time_unresolved_count = all_time_unresolved_count
+        return queries
+
+    def set_counts(self, counts: Dict[str, int]):
+        for attribute, count in counts.items():
+            setattr(self, attribute, count)
+
+
+class YoutrackStats:
+    """
+        Compute channel stats with count-only queries issued concurrently,
+        so that the latency is the one of the slowest query and no issue payload is downloaded
+        except tag names for the per-tag breakdown.
+    """
+
+    def __init__(self, youtrack: Youtrack, max_workers: int = DEFAULT_STATS_WORKERS, tags_fields: str = TAGS_FIELD) -> None:
+        self.youtrack: Youtrack = youtrack
+        self.tags_fields: str = tags_fields
+        self.executor: ThreadPoolExecutor = ThreadPoolExecutor(max_workers=max_workers,
+                                                               thread_name_prefix="youtrack-stats")
+
+    def get_stats(self, query: str, period: str, all_time_unresolved_count: Optional[int] = None) -> Stats:
+        """
+            all_time_unresolved_count can be given when already known (eg: from an issue mirror) to skip its query.
+        """
+        stats = Stats(query, period)
+        counts = {attribute: self._submit(self.youtrack.count_issues, count_query)
+                  for attribute, count_query in stats.get_count_queries(all_time_unresolved_count)}
+        ticket_count_by_tag = self._submit(
+            lambda: count_issues_by_tag(self.youtrack.iter_issues(stats.unresolved_query, fields=self.tags_fields)))
+
+        stats.set_counts({attribute: count.result() for attribute, count in counts.items()})
+        stats.ticket_count_by_tag = ticket_count_by_tag.result()
+
+        return stats
+
+    def _submit(self, function, *args) -> Future:
+        # run in the caller context, so that requests are accounted to the caller module
+        return self.executor.submit(contextvars.copy_context().run, function, *args)
+
+
+def count_issues_by_tag(issues: Iterable[dict]) -> Dict[str, int]:
+    ticket_count_by_tag: Dict[str, int] = {}
+    for issue in issues:
+        add_issue_tags(ticket_count_by_tag, issue)
+
+    return ticket_count_by_tag
+
+
+def add_issue_tags(ticket_count_by_tag: Dict[str, int], issue: dict):
+    # also used by the async checker, which counts issues as they are streamed
+    for tag in issue.get("tags", []):
+        ticket_count_by_tag[tag["name"]] = ticket_count_by_tag.get(tag["name"], 0) + 1